@@ -0,0 +1,56 @@
+"""Benchmark: pandas read_csv/read_excel vs load_dataset from the columnar cache.
+
+Converts every source under datasource/ (or DATASOURCE_DIR) if needed, then times a
+plain pandas read and a cached load of each, and checks that both give equal frames.
+
+Usage:
+    python benchmarks/bench_datasets.py
+    python benchmarks/bench_datasets.py --repeat 5
+"""
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dataset_catalog import SOURCE_READERS, get_catalog  # noqa: E402
+
+
+def best_of(repeat, func):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    catalog = get_catalog()
+    for result in catalog.build():
+        if result["status"] != "ok":
+            print(f"skipped {result['source']}: {result['error']}")
+
+    for entry in catalog.stats():
+        if not entry["cached"]:
+            continue
+        relative = entry["source"]
+        path = os.path.join(catalog.source_dir, relative)
+        reader = pd.read_csv if SOURCE_READERS[os.path.splitext(path)[1].lower()] == "csv" else pd.read_excel
+        pandas_time, expected = best_of(args.repeat, lambda: reader(path))
+        cached_time, loaded = best_of(args.repeat, lambda: catalog.load(relative))
+        equal = expected.equals(loaded)
+        print(f"{relative[-60:]:60s} pandas {pandas_time * 1000:9.1f}ms  cached {cached_time * 1000:8.1f}ms  "
+              f"({pandas_time / cached_time:5.0f}x){'' if equal else '  MISMATCH'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Benchmark: Jupyter kernel pool vs fork-server execution backend.
+
+Runs the same submissions on both backends in-process, sequentially and with
+--concurrency parallel requests, prints latency percentiles per workload and checks
+that both return the same sequence of output item types.
+
+Usage:
+    python benchmarks/bench_executors.py
+    python benchmarks/bench_executors.py --requests 50 --concurrency 4
+    python benchmarks/bench_executors.py --backends forkserver
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from image_store import ImageStore  # noqa: E402
+from kernel_pool import KernelPool  # noqa: E402
+from fork_executor import ForkServerExecutor  # noqa: E402
+
+WORKLOADS = {
+    "print": "for i in range(5):\n    print(i)",
+    "numpy_pandas": (
+        "import numpy as np\nimport pandas as pd\n"
+        "df = pd.DataFrame(np.arange(100).reshape(20, 5), columns=list('abcde'))\n"
+        "print(df.describe().loc['mean'].sum())"
+    ),
+    "matplotlib": (
+        "%matplotlib inline\nimport matplotlib.pyplot as plt\n"
+        "plt.plot([1, 2, 3], [4, 1, 9])\nplt.title('bench')\nplt.show()"
+    ),
+    "error": "values = [1, 2, 3]\nvalues[10]",
+}
+
+
+def build_executor(backend, image_store, concurrency):
+    if backend == "forkserver":
+        return ForkServerExecutor(image_store)
+    # Imported here so a fork-server-only run does not need the kernel pool wiring of main
+    from main import JupyterKernelManager
+    pool = KernelPool(min_size=concurrency, max_size=concurrency)
+    return JupyterKernelManager(pool, image_store)
+
+
+def wait_until_warm(executor, concurrency, timeout=120):
+    if executor.backend != "jupyter":
+        return
+    deadline = time.monotonic() + timeout
+    while executor.pool.stats()["idle"] < concurrency and time.monotonic() < deadline:
+        time.sleep(0.2)
+
+
+def timed_run(executor, code):
+    started = time.perf_counter()
+    outputs = executor.execute_code_isolated(code, False, 1)
+    return time.perf_counter() - started, [item["type"] for item in outputs]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def bench_backend(backend, args, image_store):
+    started = time.perf_counter()
+    executor = build_executor(backend, image_store, args.concurrency)
+    executor.start()
+    wait_until_warm(executor, args.concurrency)
+    print(f"\n[{backend}] ready in {time.perf_counter() - started:.2f}s")
+
+    output_types = {}
+    try:
+        for name, code in WORKLOADS.items():
+            # Sequential: one request at a time, the latency a single student sees
+            latencies = []
+            for _ in range(args.requests):
+                elapsed, types = timed_run(executor, code)
+                latencies.append(elapsed)
+                output_types[name] = types
+            # Concurrent: a burst of requests sharing the backend
+            wait_until_warm(executor, args.concurrency)
+            burst_started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                list(pool.map(lambda _: timed_run(executor, code), range(args.requests)))
+            burst = time.perf_counter() - burst_started
+            print(f"  {name:13s} p50 {percentile(latencies, 0.5) * 1000:8.1f}ms  "
+                  f"p95 {percentile(latencies, 0.95) * 1000:8.1f}ms  "
+                  f"mean {statistics.mean(latencies) * 1000:8.1f}ms  "
+                  f"| {args.requests} x{args.concurrency} burst {args.requests / burst:6.1f} req/s")
+            wait_until_warm(executor, args.concurrency)
+    finally:
+        executor.shutdown()
+    return output_types
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20, help="requests per workload")
+    parser.add_argument("--concurrency", type=int, default=2)
+    parser.add_argument("--backends", default="jupyter,forkserver")
+    args = parser.parse_args()
+
+    image_store = ImageStore(tempfile.mkdtemp(prefix="bench-executors-"), "/storage/visualizations", gc_interval=0)
+    results = {backend: bench_backend(backend, args, image_store) for backend in args.backends.split(",")}
+    image_store.shutdown()
+
+    if len(results) > 1:
+        reference_backend, reference = next(iter(results.items()))
+        for backend, output_types in results.items():
+            for name, types in output_types.items():
+                if types != reference[name]:
+                    print(f"output mismatch for {name}: {reference_backend} {reference[name]} vs {backend} {types}")
+        print("\noutput item types compared across backends")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Benchmark: scalar calculate_fuzzy_logic per material vs the vectorized fuzzy engine.
+
+Scores a synthetic cohort both ways, checks that every score is bit-for-bit identical
+to the reference implementation and prints timings.
+
+Usage:
+    python benchmarks/bench_fuzzy.py
+    python benchmarks/bench_fuzzy.py --students 500 --materials 10
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import calculate_fuzzy_logic  # noqa: E402
+from fuzzy_engine import calculate_fuzzy_batch  # noqa: E402
+from bench_topsis import synthetic_cohort  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=5000)
+    parser.add_argument("--materials", type=int, default=20)
+    parser.add_argument("--max-questions", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    groups = synthetic_cohort(args.students, args.materials, args.max_questions, args.seed)
+    # A few all-zero rows and groups exercise the "no valid metrics" path
+    groups[0] = [[0.0] * 7]
+    groups[1] = groups[1] + [[0.0] * 7]
+    print(f"cohort: {len(groups)} groups, {sum(len(g) for g in groups)} question rows")
+
+    started = time.perf_counter()
+    reference = [calculate_fuzzy_logic(group) for group in groups]
+    reference_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    batch = calculate_fuzzy_batch(groups)
+    batch_time = time.perf_counter() - started
+
+    print(f"scalar reference:   {reference_time:8.2f}s")
+    print(f"vectorized engine:  {batch_time:8.2f}s  ({reference_time / batch_time:.0f}x)")
+
+    mismatches = sum(
+        1 for g, (level, score) in enumerate(reference)
+        if level != batch.levels[g] or score != float(batch.scores[g])
+    )
+    max_diff = max(abs(score - float(batch.scores[g])) for g, (_, score) in enumerate(reference))
+    print(f"compared {len(groups)} groups, {mismatches} mismatches, max score difference {max_diff:.3g}")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Benchmark: per-material calculate_topsis_by_material calls vs the batched TOPSIS engine.
+
+Also times the cohort-level engine (shared ideal solutions per material) on the same rows.
+
+Builds a synthetic cohort (default 5000 students x 20 materials, 1-8 questions per
+material), scores it both ways, checks that levels and scores agree and prints timings.
+
+Usage:
+    python benchmarks/bench_topsis.py
+    python benchmarks/bench_topsis.py --students 500 --materials 10
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import calculate_topsis_by_material  # noqa: E402
+from topsis_engine import calculate_topsis_batch, topsis_calculation_details, calculate_topsis_cohort  # noqa: E402
+
+
+def synthetic_cohort(students, materials, max_questions, seed):
+    rng = np.random.default_rng(seed)
+    groups = []
+    for _ in range(students * materials):
+        questions = int(rng.integers(1, max_questions + 1))
+        groups.append(np.column_stack([
+            rng.integers(0, 20, questions),          # compile_count
+            rng.uniform(0, 60, questions),           # coding_time
+            rng.integers(0, 2, questions),           # completion_status
+            rng.integers(0, 2, questions),           # trial_status
+            rng.integers(0, 8, questions),           # variable_count
+            rng.integers(0, 4, questions),           # function_count
+            rng.uniform(0, 1, questions),            # test_case_completion_rate
+        ]).astype(float).tolist())
+    return groups
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=5000)
+    parser.add_argument("--materials", type=int, default=20)
+    parser.add_argument("--max-questions", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    groups = synthetic_cohort(args.students, args.materials, args.max_questions, args.seed)
+    print(f"cohort: {args.students} students x {args.materials} materials = {len(groups)} groups, "
+          f"{sum(len(g) for g in groups)} question rows")
+
+    started = time.perf_counter()
+    per_material = [calculate_topsis_by_material(group, 1) for group in groups]
+    per_material_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    batch = calculate_topsis_batch(groups)
+    batch_scores_time = time.perf_counter() - started
+    details = [topsis_calculation_details(batch, g) for g in range(len(groups))]
+    batch_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    calculate_topsis_cohort(groups, [g % args.materials for g in range(len(groups))])
+    cohort_time = time.perf_counter() - started
+
+    print(f"per-material path:          {per_material_time:8.2f}s")
+    print(f"batched engine (scores):    {batch_scores_time:8.2f}s  ({per_material_time / batch_scores_time:.0f}x)")
+    print(f"batched engine (+details):  {batch_time:8.2f}s  ({per_material_time / batch_time:.1f}x)")
+
+    print(f"cohort engine (scores):     {cohort_time:8.2f}s")
+
+    mismatches = 0
+    for g, (level, score, _) in enumerate(per_material):
+        if level != batch.levels[g] or not np.isclose(score, batch.scores[g]):
+            mismatches += 1
+    print(f"compared {len(groups)} groups, {mismatches} mismatches")
+    assert len(details) == len(groups)
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Load test: fire N concurrent /test requests and check they run in parallel.
+
+Each request runs code that sleeps for --sleep seconds. If the service serialized
+submissions the batch would take about N * sleep seconds; with the offloaded
+execution path it should take roughly one sleep plus kernel overhead.
+
+Usage:
+    python benchmarks/load_test_concurrency.py                 # starts its own uvicorn
+    python benchmarks/load_test_concurrency.py --url http://localhost:8001 -n 16
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+FASTAPI_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(concurrency):
+    port = free_port()
+    env = dict(os.environ)
+    env.setdefault("EXECUTION_CONCURRENCY", str(concurrency))
+    env.setdefault("KERNEL_POOL_MIN_SIZE", str(concurrency))
+    env.setdefault("KERNEL_POOL_MAX_SIZE", str(concurrency))
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=FASTAPI_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            stats = requests.get(f"{url}/executor/stats", timeout=1).json()
+            # Wait for the pool to be warm (or the fork server up) so we measure execution, not cold starts
+            if stats["backend"] == "forkserver":
+                if stats["zygote_running"]:
+                    return process, url
+            elif stats["idle"] >= min(concurrency, stats["min_size"]):
+                return process, url
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError("FastAPI server did not become ready within 60s")
+
+
+def run_one(url, index, sleep):
+    code = f"import time\ntime.sleep({sleep})\nprint('done {index}')"
+    started = time.monotonic()
+    response = requests.post(f"{url}/test", json={"code": code, "type": "test", "student_id": index}, timeout=120)
+    response.raise_for_status()
+    return time.monotonic() - started, response.json()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Base URL of a running service; a local server is started when omitted")
+    parser.add_argument("-n", "--requests", type=int, default=8, help="Number of concurrent /test requests")
+    parser.add_argument("--sleep", type=float, default=2.0, help="Seconds each submission sleeps")
+    args = parser.parse_args()
+
+    process = None
+    url = args.url
+    if not url:
+        process, url = start_server(args.requests)
+
+    try:
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=args.requests) as pool:
+            results = list(pool.map(lambda i: run_one(url, i, args.sleep), range(args.requests)))
+        wall = time.monotonic() - started
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+
+    latencies = sorted(latency for latency, _ in results)
+    serial = args.requests * args.sleep
+    print(f"requests:          {args.requests}")
+    print(f"wall time:         {wall:.2f}s")
+    print(f"serialized bound:  {serial:.2f}s")
+    print(f"latency min/p50/max: {latencies[0]:.2f}s / {latencies[len(latencies) // 2]:.2f}s / {latencies[-1]:.2f}s")
+
+    for _, outputs in results:
+        if not any(output.get("type") == "text" and output["content"].startswith("done") for output in outputs):
+            print(f"FAIL: unexpected output {outputs}")
+            sys.exit(1)
+
+    # Parallel execution finishes well under the back-to-back time
+    if args.requests > 1 and wall >= serial * 0.75:
+        print("FAIL: requests were executed back-to-back")
+        sys.exit(1)
+    print("PASS: requests were executed in parallel")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# A chunk returns (classifications, recomputed, reused); the last two are None outside incremental mode
+ChunkResult = Tuple[List[Any], Optional[List[Dict[str, Any]]], Optional[List[Dict[str, Any]]]]
+
+FINISHED_STATUSES = ("completed", "failed", "cancelled")
+
+
+class TooManyJobs(Exception):
+    """max_jobs jobs are queued or running, none of them finished and evictable"""
+
+
+class ClassificationJob:
+    """A /classify request split into student chunks that run one after another in the background"""
+
+    def __init__(self, chunks: List[Callable[[], ChunkResult]], chunk_students: List[int]):
+        self.id = uuid.uuid4().hex
+        self.status = "queued"
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.classifications: List[Any] = []
+        self.recomputed: Optional[List[Dict[str, Any]]] = None
+        self.reused: Optional[List[Dict[str, Any]]] = None
+        self.completed_chunks = 0
+        self._chunks = chunks
+        self._chunk_students = chunk_students
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def total_chunks(self) -> int:
+        return len(self._chunks)
+
+    def cancel(self) -> bool:
+        """Stop the job before its next chunk; returns False when it already finished"""
+        with self._lock:
+            if self.status in FINISHED_STATUSES:
+                return False
+            self._cancelled.set()
+            if self.status == "queued":
+                self._finish("cancelled")
+            return True
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Progress plus the classifications computed so far"""
+        with self._lock:
+            total_students = sum(self._chunk_students)
+            students_done = sum(self._chunk_students[:self.completed_chunks])
+            return {
+                "job_id": self.id,
+                "status": self.status,
+                "error": self.error,
+                "progress": self.completed_chunks / self.total_chunks if self.total_chunks else 1.0,
+                "completed_chunks": self.completed_chunks,
+                "total_chunks": self.total_chunks,
+                "students_done": students_done,
+                "total_students": total_students,
+                "created_at": self.created_at,
+                "finished_at": self.finished_at,
+                "result": {
+                    "classifications": list(self.classifications),
+                    "recomputed": list(self.recomputed) if self.recomputed is not None else None,
+                    "reused": list(self.reused) if self.reused is not None else None,
+                },
+            }
+
+    def run_chunk(self, index: int) -> bool:
+        """Run one chunk; returns True when the job should continue with the next one"""
+        with self._lock:
+            if self._cancelled.is_set():
+                self._finish("cancelled")
+                return False
+            self.status = "running"
+
+        try:
+            classifications, recomputed, reused = self._chunks[index]()
+        except Exception as e:
+            with self._lock:
+                self.error = str(e)
+                self._finish("failed")
+            return False
+
+        with self._lock:
+            self.classifications.extend(classifications)
+            if recomputed is not None:
+                self.recomputed = (self.recomputed or []) + recomputed
+            if reused is not None:
+                self.reused = (self.reused or []) + reused
+            self.completed_chunks += 1
+            if self.completed_chunks == self.total_chunks:
+                self._finish("completed")
+                return False
+            if self._cancelled.is_set():
+                self._finish("cancelled")
+                return False
+            return True
+
+    def _finish(self, status: str):
+        # Must be called with the lock held
+        self.status = status
+        self.finished_at = time.time()
+        self._chunks = [None] * len(self._chunks)  # release references to the request payload
+
+
+class ClassificationJobManager:
+    """Keeps recent jobs and feeds their chunks to an executor.
+
+    Chunks of one job are submitted one at a time, so long jobs interleave with
+    synchronous /classify calls on the same executor instead of occupying it.
+    Finished jobs are kept for `ttl` seconds and at most `max_jobs` are retained;
+    when all of them are still queued or running, new submissions raise TooManyJobs.
+    """
+
+    def __init__(self, executor: Executor, max_jobs: int = 100, ttl: float = 3600):
+        self.executor = executor
+        self.max_jobs = max_jobs
+        self.ttl = ttl
+        self._jobs: "OrderedDict[str, ClassificationJob]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, chunks: List[Callable[[], ChunkResult]], chunk_students: List[int]) -> ClassificationJob:
+        with self._lock:
+            self._prune()
+            # Unfinished jobs pin their request payload, so they count against the cap too
+            if len(self._jobs) >= self.max_jobs:
+                raise TooManyJobs(f"{len(self._jobs)} classification jobs are still running, try again later")
+            job = ClassificationJob(chunks, chunk_students)
+            self._jobs[job.id] = job
+        if chunks:
+            self._schedule(job, 0)
+        else:
+            with job._lock:
+                job._finish("completed")
+        return job
+
+    def get(self, job_id: str) -> Optional[ClassificationJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return {"jobs": len(self._jobs), "by_status": counts, "max_jobs": self.max_jobs, "ttl": self.ttl}
+
+    def _schedule(self, job: ClassificationJob, index: int):
+        try:
+            future = self.executor.submit(job.run_chunk, index)
+        except RuntimeError as e:
+            # Executor shut down while the job was running
+            with job._lock:
+                job.error = str(e)
+                job._finish("failed")
+            return
+
+        def on_done(done):
+            if not done.cancelled() and done.exception() is None and done.result():
+                self._schedule(job, index + 1)
+
+        future.add_done_callback(on_done)
+
+    def _prune(self):
+        # Must be called with the lock held: drop expired finished jobs, then the oldest finished ones
+        now = time.time()
+        for job_id, job in list(self._jobs.items()):
+            if job.finished_at is not None and now - job.finished_at > self.ttl:
+                del self._jobs[job_id]
+        for job_id, job in list(self._jobs.items()):
+            if len(self._jobs) < self.max_jobs:
+                break
+            if job.finished_at is not None:
+                del self._jobs[job_id]
@@ -0,0 +1,85 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# (user_id, material_id, classification_type)
+GroupKey = Tuple[int, Optional[int], str]
+
+
+def group_fingerprint(group: Dict[str, Any], classification_type: str) -> str:
+    """Hash of everything a material's classification depends on"""
+    payload = json.dumps({
+        "type": classification_type,
+        "material_name": group["material_name"],
+        "decision_matrix": group["decision_matrix"],
+        "raw_metrics": group["raw_metrics"],
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def cohort_fingerprint(keys: Iterable[GroupKey], fingerprints: Iterable[str]) -> str:
+    """Hash of a cohort's composition: which groups it contains and what each of them holds"""
+    payload = json.dumps(sorted(
+        [key[0], key[1], fingerprint] for key, fingerprint in zip(keys, fingerprints)
+    ), default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ClassificationStore:
+    """SQLite store of the last classification of every (user_id, material_id, type).
+
+    Each entry keeps the fingerprint of the metrics it was computed from, so an
+    incremental /classify only recomputes groups whose fingerprint changed.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS classifications (user_id INTEGER NOT NULL, material_id INTEGER, "
+            "classification_type TEXT NOT NULL, fingerprint TEXT NOT NULL, result TEXT NOT NULL, "
+            "updated_at REAL NOT NULL, PRIMARY KEY (user_id, material_id, classification_type))"
+        )
+        self._db.commit()
+
+    def get_many(self, keys: Iterable[GroupKey]) -> Dict[GroupKey, Tuple[str, Dict[str, Any]]]:
+        """Return {key: (fingerprint, result)} for the keys that have a stored classification"""
+        found = {}
+        with self._lock:
+            for user_id, material_id, classification_type in keys:
+                row = self._db.execute(
+                    "SELECT fingerprint, result FROM classifications "
+                    "WHERE user_id = ? AND material_id IS ? AND classification_type = ?",
+                    (user_id, material_id, classification_type)
+                ).fetchone()
+                if row is not None:
+                    found[(user_id, material_id, classification_type)] = (row[0], json.loads(row[1]))
+        return found
+
+    def set_many(self, entries: List[Tuple[GroupKey, str, Dict[str, Any]]]):
+        """Store (key, fingerprint, result) entries, replacing older classifications"""
+        now = time.time()
+        with self._lock:
+            # material_id may be NULL, which a primary key does not deduplicate, so delete first
+            for (user_id, material_id, classification_type), fingerprint, result in entries:
+                self._db.execute(
+                    "DELETE FROM classifications WHERE user_id = ? AND material_id IS ? AND classification_type = ?",
+                    (user_id, material_id, classification_type)
+                )
+                self._db.execute(
+                    "INSERT INTO classifications (user_id, material_id, classification_type, fingerprint, result, "
+                    "updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (user_id, material_id, classification_type, fingerprint, json.dumps(result), now)
+                )
+            self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM classifications").fetchone()[0]
+        return {"path": self.path, "entries": entries}
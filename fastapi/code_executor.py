@@ -0,0 +1,278 @@
+"""Backend-independent part of code execution.
+
+A CodeExecutor runs the cells of one request in an isolated session and turns what
+the session publishes into output items ({"type": "text" | "image" | "error", ...}).
+Backends only implement how a session is acquired, how one cell runs in it and how it
+is released; input() rejection, limits, metrics, tracing and the output item schema
+are shared, so every backend returns exactly the same items.
+"""
+import functools
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from execution_limits import ExecutionLimits, ExecutionCancelled, ExecutionTimeout, OutputBudget, get_execution_limits
+from preflight import preflight
+from request_tracing import trace_span
+from service_metrics import (
+    request_type_label, KERNEL_LEASE_SECONDS, EXECUTION_PHASE_SECONDS,
+    EXECUTION_ERRORS, INPUT_REJECTIONS, EXECUTION_TIMEOUTS, EXECUTIONS_IN_FLIGHT
+)
+from test_harness import RESULT_MIME_TYPE
+
+# Longest a backend waits for session output before it re-checks the deadline and cancellation
+POLL_SECONDS = 0.25
+
+
+# Function to strip ANSI color codes
+def strip_ansi_codes(text):
+    ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
+    return ansi_escape.sub('', text)
+
+# Function to format error message
+def format_error_message(traceback_text):
+    # Strip ANSI color codes
+    clean_text = strip_ansi_codes(traceback_text)
+
+    # Split into lines for better formatting
+    lines = clean_text.split('\n')
+
+    # Format the traceback to be more readable
+    formatted_lines = [line.rstrip() for line in lines if line.rstrip()]
+    return '\n'.join(formatted_lines)
+
+# Function to detect input() usage in code
+def contains_input_function(code):
+    # input() calls found in the AST of the cached pre-flight parse
+    return preflight(code).uses_input
+
+# Error output returned when code tries to read interactive input
+def input_function_error():
+    return [{
+        "type": "error",
+        "error_type": "InputFunctionNotSupported",
+        "error_msg": "The input() function is not supported in the sandbox environment",
+        "content": "The Python sandbox doesn't support interactive input. Please modify your code to use hardcoded values instead of input() calls.\n\nExample:\n# Instead of: name = input('Enter your name: ')\n# Use: name = 'John'  # hardcoded value"
+    }]
+
+class OutputList(list):
+    """Output list that also forwards every appended item to a listener as it arrives"""
+
+    def __init__(self, listener: Optional[Callable[[Dict[str, Any]], None]] = None):
+        super().__init__()
+        self.listener = listener
+
+    def append(self, item):
+        super().append(item)
+        if self.listener:
+            self.listener(item)
+
+
+class CodeExecutor:
+    """Base class of the execution backends (see JupyterKernelManager and ForkServerExecutor).
+
+    Subclasses implement _acquire, _run_cell and _release, and may override start,
+    shutdown and stats. _run_cell feeds every message of the session, in Jupyter
+    message format (msg_type + content), to _append_message.
+    """
+
+    backend = "base"
+
+    def __init__(self, image_store):
+        self.image_store = image_store
+
+    def start(self):
+        pass
+
+    def shutdown(self):
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.backend}
+
+    def execute_code_isolated(self, code: str, is_sandbox: bool = False, student_id: Optional[int] = None,
+                              on_output: Optional[Callable[[int, Dict[str, Any]], None]] = None,
+                              limits: Optional[ExecutionLimits] = None, request_type: Optional[str] = None,
+                              cancel: Optional[threading.Event] = None):
+        """Execute code in an isolated session to prevent student interference"""
+        return self.execute_cells([code], is_sandbox, student_id, on_output, limits, request_type, cancel)[0]
+
+    def execute_code_with_tests(self, code: str, test_code: str, is_sandbox: bool = False, student_id: Optional[int] = None,
+                                on_output: Optional[Callable[[int, Dict[str, Any]], None]] = None,
+                                limits: Optional[ExecutionLimits] = None, request_type: Optional[str] = None,
+                                cancel: Optional[threading.Event] = None):
+        """Execute student code and then its test suite in the same isolated session"""
+        outputs, test_outputs = self.execute_cells([code, test_code], is_sandbox, student_id, on_output, limits,
+                                                   request_type, cancel)
+        return outputs, test_outputs
+
+    def execute_cells(self, cells: List[str], is_sandbox: bool = False, student_id: Optional[int] = None,
+                      on_output: Optional[Callable[[int, Dict[str, Any]], None]] = None,
+                      limits: Optional[ExecutionLimits] = None, request_type: Optional[str] = None,
+                      cancel: Optional[threading.Event] = None):
+        """Execute cells one after another in a single session, returning one output list per cell.
+
+        When on_output is given it is called with (cell_index, item) for every output item as soon as
+        the session publishes it. limits is the budget for the whole execution; it defaults to the
+        limits of a graded "test" submission. request_type only labels the exported metrics. Setting
+        cancel stops the execution, which then ends with an ExecutionCancelled error item.
+        """
+        limits = limits or get_execution_limits("test")
+        type_label = request_type_label(request_type)
+        results = [OutputList(functools.partial(on_output, i) if on_output else None) for i in range(len(cells))]
+
+        # Check for input() usage and reject if found
+        for i, code in enumerate(cells):
+            if contains_input_function(code):
+                INPUT_REJECTIONS.labels(type_label).inc()
+                for item in input_function_error():
+                    results[i].append(item)
+                return results
+
+        session = None
+        # Any error or unexpected state means the session must not be reused
+        dirty = False
+        # Pending visualization writes, finished before the image URLs are returned
+        image_writes = []
+        deadline: Optional[float] = None
+
+        in_flight = EXECUTIONS_IN_FLIGHT.labels(type_label)
+        in_flight.inc()
+        try:
+            if cancel is not None and cancel.is_set():
+                raise ExecutionCancelled("The execution was cancelled before it started")
+            # Lease a ready session for this request
+            with KERNEL_LEASE_SECONDS.labels(type_label).time(), trace_span("lease"):
+                session = self._acquire(student_id, limits)
+            # One wall-clock budget shared by all cells of this execution
+            deadline = time.monotonic() + limits.wall_time
+
+            for i, code in enumerate(cells):
+                phase = "code" if i == 0 else "tests"
+                try:
+                    with EXECUTION_PHASE_SECONDS.labels(phase, type_label).time(), trace_span(phase):
+                        self._run_cell(session, code, results[i], is_sandbox, student_id, limits, deadline,
+                                       image_writes, cancel, is_test_cell=i > 0)
+                except Exception as e:
+                    if isinstance(e, ExecutionTimeout):
+                        EXECUTION_TIMEOUTS.labels(type_label).inc()
+                    # The session is in an unknown state, don't run the remaining cells in it
+                    dirty = True
+                    results[i].append({
+                        "type": "error",
+                        "content": str(e),
+                        "error_type": type(e).__name__,
+                        "error_msg": str(e)
+                    })
+                    break
+
+        except Exception as e:
+            dirty = True
+            results[0].append({
+                "type": "error",
+                "content": str(e),
+                "error_type": type(e).__name__,
+                "error_msg": str(e)
+            })
+        finally:
+            # Always hand the session back; the backend recycles it unless it is clean and reusable
+            if session is not None:
+                dirty = dirty or any(output['type'] == 'error' for outputs in results for output in outputs)
+                self._release(session, dirty)
+            with trace_span("image_writes"):
+                # Within the execution's own wall-clock budget; writes left over finish in the background
+                if deadline is not None:
+                    self.image_store.wait(image_writes, timeout=max(0.0, deadline - time.monotonic()))
+                else:
+                    self.image_store.wait(image_writes)
+            in_flight.dec()
+
+        for outputs in results:
+            for output in outputs:
+                if output['type'] == 'error':
+                    EXECUTION_ERRORS.labels(type_label, output.get('error_type') or 'unknown').inc()
+        return results
+
+    def _acquire(self, student_id: Optional[int], limits: ExecutionLimits):
+        """Return a ready, isolated session with the resource limits applied"""
+        raise NotImplementedError
+
+    def _run_cell(self, session, code: str, outputs: List[Dict[str, Any]], is_sandbox: bool, student_id: Optional[int],
+                  limits: ExecutionLimits, deadline: float, image_writes: List[Any],
+                  cancel: Optional[threading.Event] = None, is_test_cell: bool = False):
+        """Execute a single cell, appending its output items, until it finished, the deadline passed or cancel was set.
+
+        Only test cells (every cell after the student's code) may publish test harness results.
+        """
+        raise NotImplementedError
+
+    def _release(self, session, dirty: bool):
+        raise NotImplementedError
+
+    def _append_message(self, msg_type: str, content: Dict[str, Any], outputs: List[Dict[str, Any]],
+                        budget: OutputBudget, is_sandbox: bool, student_id: Optional[int], image_writes: List[Any],
+                        is_test_cell: bool = False):
+        """Convert one Jupyter-format message into output items"""
+        if msg_type == 'stream':
+            # Split stream outputs by newlines to separate print statements
+            text_content = content['text'].strip()
+            if text_content:
+                lines = text_content.split('\n')
+                for line in lines:
+                    if line.strip():  # Only add non-empty lines
+                        text = budget.take_text(line.strip())
+                        if text is not None:
+                            outputs.append({
+                                "type": "text",
+                                "content": text
+                            })
+        elif msg_type in ['display_data', 'execute_result']:
+            # Structured result of the preloaded test harness: only from a test cell and only once, so student
+            # code publishing the same MIME type cannot forge test_stats; otherwise it is rendered like any output
+            if (RESULT_MIME_TYPE in content.get('data', {}) and is_test_cell
+                    and not any(item.get('type') == 'test_stats' for item in outputs)):
+                result = content['data'][RESULT_MIME_TYPE]
+                outputs.append(result['stats'])
+                outputs.append(result['results'])
+            elif 'image/png' in content.get('data', {}):
+                if not budget.take_image():
+                    return
+                image_data = content['data']['image/png']
+                # Add student_id and sandbox prefix for file isolation
+                prefix = f"sandbox_{student_id}_" if is_sandbox else f"visual_{student_id}_"
+                # Decoding and writing happen on the image writer; the name is the content hash
+                image_url, write = self.image_store.store(image_data, prefix)
+                image_writes.append(write)
+
+                outputs.append({
+                    "type": "image",
+                    "content": image_url,
+                    "is_temporary": is_sandbox
+                })
+            elif 'text/plain' in content.get('data', {}):
+                text = budget.take_text(content['data']['text/plain'])
+                if text is not None:
+                    outputs.append({
+                        "type": "text",
+                        "content": text
+                    })
+
+        elif msg_type == 'error':
+            # Check for EOFError specifically to provide a better message
+            if "EOFError" in content.get('ename', '') and "reading a line" in content.get('evalue', ''):
+                outputs.append({
+                    "type": "error",
+                    "content": "The input() function is not supported in this environment. Please modify your code to use hardcoded values instead.",
+                    "error_type": "InputFunctionNotSupported",
+                    "error_msg": "Interactive input is not supported"
+                })
+            else:
+                # Format the error message properly
+                error_content = format_error_message('\n'.join(content['traceback']))
+                outputs.append({
+                    "type": "error",
+                    "content": error_content,
+                    "error_type": content.get('ename', 'Error'),
+                    "error_msg": content.get('evalue', '')
+                })
@@ -0,0 +1,432 @@
+"""Columnar, memory-mapped cache of the exercise datasets under datasource/.
+
+Every CSV and Excel source is converted once into one .npy file per column (string
+columns as int32 codes plus their categories), keyed by the content hash of the source
+and the read options. Loading a converted dataset memory-maps the column files
+copy-on-write, so it takes milliseconds, concurrent kernels share the same page-cache
+pages, and in-place edits by student code stay private to that process.
+
+Inside a kernel:
+
+    from dataset_catalog import load_dataset
+    df = load_dataset("Students_Grading_Dataset.csv")          # file name, or path under datasource/
+    df = load_dataset("Siakad/rekapIPK-TI-2018.xlsx", sheet=0)  # Excel sheet by index or name
+
+From a shell (the service runs this in the background at startup):
+
+    python dataset_catalog.py build [--force]
+    python dataset_catalog.py list
+"""
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import re
+import shutil
+import subprocess
+import sys
+import time
+import uuid
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Union
+
+import numpy as np
+
+if TYPE_CHECKING:
+    # Imported where it is used: the service imports this module at startup but never reads a dataset itself
+    import pandas as pd
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows; concurrent first loads may then convert twice
+    fcntl = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATASOURCE_DIR = os.getenv("DATASOURCE_DIR", os.path.join(BASE_DIR, "datasource"))
+DATASET_CACHE_DIR = os.getenv("DATASET_CACHE_DIR", os.path.join(BASE_DIR, "cache", "datasets"))
+
+SOURCE_READERS = {".csv": "csv", ".xlsx": "excel", ".xls": "excel"}
+
+# Format of the converted tables; bump to invalidate every cached conversion
+CATALOG_FORMAT = 1
+
+# numpy kinds stored as plain arrays: bool, integers, floats, complex, timedelta, datetime
+ARRAY_KINDS = "biufcmM"
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _options_key(read_options: Dict[str, Any]) -> str:
+    if not read_options:
+        return "default"
+    return hashlib.sha256(repr(sorted(read_options.items())).encode("utf-8")).hexdigest()[:12]
+
+
+def _write_json(path: str, data: Dict[str, Any]):
+    temporary_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(temporary_path, "w") as f:
+        json.dump(data, f)
+    os.replace(temporary_path, path)
+
+
+def _read_json(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_table(frame: "pd.DataFrame", directory: str):
+    """Store a DataFrame as one .npy file per column plus a small pickle with labels and categories"""
+    import pandas as pd
+    os.makedirs(directory)
+    specs = []
+    for i in range(frame.shape[1]):
+        series = frame.iloc[:, i]
+        dtype = series.dtype
+        filename = f"c{i}.npy"
+        path = os.path.join(directory, filename)
+        if isinstance(dtype, np.dtype) and dtype.kind in ARRAY_KINDS:
+            np.save(path, np.ascontiguousarray(series.to_numpy()))
+            specs.append({"kind": "array", "file": filename})
+        elif isinstance(dtype, pd.CategoricalDtype):
+            np.save(path, series.cat.codes.to_numpy().astype(np.int32))
+            specs.append({"kind": "categorical", "file": filename,
+                          "categories": series.cat.categories, "ordered": dtype.ordered})
+        elif dtype == object and pd.api.types.infer_dtype(series, skipna=True) == "string":
+            # Strings are not mappable; codes are, and the distinct values are usually few
+            codes, uniques = pd.factorize(series, use_na_sentinel=True)
+            np.save(path, codes.astype(np.int32))
+            specs.append({"kind": "strings", "file": filename, "categories": np.asarray(uniques, dtype=object)})
+        else:
+            # Mixed objects and extension dtypes keep their exact values
+            filename = f"c{i}.pkl"
+            series.to_pickle(os.path.join(directory, filename))
+            specs.append({"kind": "pickle", "file": filename})
+
+    index = None if isinstance(frame.index, pd.RangeIndex) and frame.index.start == 0 and frame.index.step == 1 else frame.index
+    with open(os.path.join(directory, "table.pkl"), "wb") as f:
+        pickle.dump({"columns": frame.columns, "index": index, "rows": len(frame), "specs": specs}, f)
+
+
+def _read_table(directory: str, mmap: bool = True, categorical: bool = False) -> "pd.DataFrame":
+    import pandas as pd
+    with open(os.path.join(directory, "table.pkl"), "rb") as f:
+        table = pickle.load(f)
+    # Copy-on-write: pages are shared until the student modifies them
+    mmap_mode = "c" if mmap else None
+    arrays = {}
+    for i, spec in enumerate(table["specs"]):
+        path = os.path.join(directory, spec["file"])
+        if spec["kind"] == "array":
+            arrays[i] = np.load(path, mmap_mode=mmap_mode).view(np.ndarray)
+        elif spec["kind"] == "pickle":
+            arrays[i] = pd.read_pickle(path)
+        else:
+            codes = np.load(path, mmap_mode=mmap_mode)
+            categories = spec["categories"]
+            if spec["kind"] == "categorical" or categorical:
+                dtype = pd.CategoricalDtype(categories, ordered=spec.get("ordered", False))
+                arrays[i] = pd.Categorical.from_codes(codes, dtype=dtype, validate=False)
+            else:
+                # Strings come back as object columns, like read_csv returns them; code -1 picks the trailing NaN
+                lookup = np.empty(len(categories) + 1, dtype=object)
+                lookup[:-1] = categories
+                lookup[-1] = np.nan
+                arrays[i] = lookup.take(codes)
+    index = table["index"] if table["index"] is not None else pd.RangeIndex(table["rows"])
+    frame = pd.DataFrame(arrays, index=index, copy=False)
+    frame.columns = table["columns"]
+    return frame
+
+
+class DatasetCatalog:
+    def __init__(self, source_dir: str = DATASOURCE_DIR, cache_dir: str = DATASET_CACHE_DIR):
+        self.source_dir = os.path.abspath(source_dir)
+        self.cache_dir = os.path.abspath(cache_dir)
+
+    def sources(self) -> List[str]:
+        """Convertible source files, as paths relative to the source directory"""
+        found = []
+        for root, _, files in os.walk(self.source_dir):
+            for name in files:
+                if os.path.splitext(name)[1].lower() in SOURCE_READERS:
+                    found.append(os.path.relpath(os.path.join(root, name), self.source_dir))
+        return sorted(found)
+
+    def resolve(self, name: str) -> str:
+        """Map a file name, a path under the source directory or a path starting with datasource/ to its relative path"""
+        path = os.path.abspath(name) if os.path.isabs(name) else None
+        candidates = [path] if path else [os.path.join(self.source_dir, name), os.path.abspath(name)]
+        for candidate in candidates:
+            if candidate and os.path.isfile(candidate) and candidate.startswith(self.source_dir + os.sep):
+                return os.path.relpath(candidate, self.source_dir)
+        matches = [source for source in self.sources() if os.path.basename(source) == os.path.basename(name)]
+        if len(matches) == 1:
+            return matches[0]
+        if matches:
+            raise ValueError(f"Dataset name {name!r} is ambiguous, use one of: {', '.join(matches)}")
+        raise FileNotFoundError(f"No dataset named {name!r} in {self.source_dir}")
+
+    def load(self, name: str, sheet: Union[int, str, None] = None, mmap: bool = True,
+             categorical: bool = False, **read_options) -> "pd.DataFrame":
+        """Load a dataset as a DataFrame backed by the memory-mapped columnar cache.
+
+        read_options are passed to pandas.read_csv / read_excel for the conversion; each
+        distinct set of options is cached separately. sheet selects an Excel sheet by index
+        or name (the first sheet by default, like read_excel).
+        """
+        relative = self.resolve(name)
+        try:
+            version_dir, manifest = self.ensure(relative, **read_options)
+        except OSError as e:
+            # Read-only or full cache volume: still serve the data, just without the cache
+            print(f"Dataset cache unavailable ({str(e)}), reading {relative} directly", file=sys.stderr)
+            frames = self._read_source(relative, read_options)
+            return list(frames.values())[self._sheet_position(list(frames), sheet)]
+        position = self._sheet_position(manifest["sheets"], sheet)
+        return _read_table(os.path.join(version_dir, str(position)), mmap=mmap, categorical=categorical)
+
+    def ensure(self, relative: str, force: bool = False, **read_options):
+        """Return (version directory, manifest) of an up-to-date conversion, converting the source if needed"""
+        if "sheet_name" in read_options:
+            raise ValueError("Select Excel sheets with sheet=..., not sheet_name")
+        source = os.path.join(self.source_dir, relative)
+        index_path = self._index_path(relative, read_options)
+
+        current = None if force else self._fresh_version(source, index_path)
+        if current:
+            return current
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with self._lock(index_path):
+            # Another process may have converted it while we waited for the lock
+            current = None if force else self._fresh_version(source, index_path)
+            if current:
+                return current
+            return self._convert(relative, read_options, index_path, force)
+
+    def build(self, force: bool = False) -> List[Dict[str, Any]]:
+        """Convert every source whose cached conversion is missing or stale"""
+        results = []
+        for relative in self.sources():
+            started = time.perf_counter()
+            try:
+                _, manifest = self.ensure(relative, force=force)
+                results.append({"source": relative, "status": "ok", "sheets": manifest["sheets"],
+                                "seconds": round(time.perf_counter() - started, 3)})
+            except Exception as e:
+                results.append({"source": relative, "status": "error", "error": f"{type(e).__name__}: {str(e)}"})
+        self.collect_garbage()
+        return results
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Cache state of every source, without converting anything"""
+        entries = []
+        for relative in self.sources():
+            source = os.path.join(self.source_dir, relative)
+            index = _read_json(self._index_path(relative, {}))
+            manifest = _read_json(os.path.join(self.cache_dir, index["version"], "manifest.json")) if index else None
+            stat = os.stat(source)
+            entry = {"source": relative, "source_bytes": stat.st_size, "cached": manifest is not None}
+            if manifest:
+                entry.update({
+                    "stale": (index["size"], index["mtime_ns"]) != (stat.st_size, stat.st_mtime_ns),
+                    "sheets": manifest["sheets"],
+                    "rows": manifest["rows"],
+                    "cache_bytes": manifest["bytes"],
+                    "convert_seconds": manifest["convert_seconds"],
+                })
+            entries.append(entry)
+        return entries
+
+    def collect_garbage(self) -> int:
+        """Remove conversions no index points to any more (mapped files stay valid for running kernels)"""
+        if not os.path.isdir(self.cache_dir):
+            return 0
+        referenced = set()
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".json"):
+                index = _read_json(os.path.join(self.cache_dir, name))
+                if index:
+                    referenced.add(index["version"])
+        removed = 0
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if os.path.isdir(path) and name not in referenced and not name.endswith(".tmp"):
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+        return removed
+
+    def _index_path(self, relative: str, read_options: Dict[str, Any]) -> str:
+        slug = re.sub(r"[^A-Za-z0-9._-]+", "_", relative.replace(os.sep, "__"))
+        return os.path.join(self.cache_dir, f"{slug}.{_options_key(read_options)}.json")
+
+    def _fresh_version(self, source: str, index_path: str):
+        """(version dir, manifest) if the index matches the source, re-hashing only when its stat changed"""
+        index = _read_json(index_path)
+        if not index or index.get("format") != CATALOG_FORMAT:
+            return None
+        version_dir = os.path.join(self.cache_dir, index["version"])
+        manifest = _read_json(os.path.join(version_dir, "manifest.json"))
+        if manifest is None:
+            return None
+        stat = os.stat(source)
+        if (index["size"], index["mtime_ns"]) == (stat.st_size, stat.st_mtime_ns):
+            return version_dir, manifest
+        # Touched but not changed (checkout, copy): keep the conversion and remember the new stat
+        if index["size"] == stat.st_size and _file_sha256(source) == index["sha256"]:
+            index.update(mtime_ns=stat.st_mtime_ns)
+            _write_json(index_path, index)
+            return version_dir, manifest
+        return None
+
+    def _convert(self, relative: str, read_options: Dict[str, Any], index_path: str, force: bool = False):
+        source = os.path.join(self.source_dir, relative)
+        stat = os.stat(source)
+        sha256 = _file_sha256(source)
+        version = hashlib.sha256(f"{sha256}:{_options_key(read_options)}:{CATALOG_FORMAT}".encode()).hexdigest()[:20]
+        if force:
+            # A new directory, so kernels reading the current conversion are not disturbed
+            version = f"{version}-{uuid.uuid4().hex[:8]}"
+        version_dir = os.path.join(self.cache_dir, version)
+
+        if _read_json(os.path.join(version_dir, "manifest.json")) is None:
+            started = time.perf_counter()
+            frames = self._read_source(relative, read_options)
+            temporary_dir = f"{version_dir}.{uuid.uuid4().hex}.tmp"
+            os.makedirs(temporary_dir)
+            try:
+                for position, frame in enumerate(frames.values()):
+                    _write_table(frame, os.path.join(temporary_dir, str(position)))
+                size = sum(os.path.getsize(os.path.join(root, name))
+                           for root, _, files in os.walk(temporary_dir) for name in files)
+                _write_json(os.path.join(temporary_dir, "manifest.json"), {
+                    "source": relative,
+                    "sha256": sha256,
+                    "read_options": repr(sorted(read_options.items())),
+                    "sheets": [name if isinstance(name, str) else str(name) for name in frames],
+                    "rows": [len(frame) for frame in frames.values()],
+                    "bytes": size,
+                    "convert_seconds": round(time.perf_counter() - started, 3),
+                })
+                # Left over by an interrupted conversion
+                if os.path.isdir(version_dir):
+                    shutil.rmtree(version_dir, ignore_errors=True)
+                os.rename(temporary_dir, version_dir)
+            except BaseException:
+                shutil.rmtree(temporary_dir, ignore_errors=True)
+                raise
+
+        _write_json(index_path, {"format": CATALOG_FORMAT, "source": relative, "size": stat.st_size,
+                                 "mtime_ns": stat.st_mtime_ns, "sha256": sha256, "version": version})
+        return version_dir, _read_json(os.path.join(version_dir, "manifest.json"))
+
+    def _read_source(self, relative: str, read_options: Dict[str, Any]) -> Dict[Any, "pd.DataFrame"]:
+        import pandas as pd
+        source = os.path.join(self.source_dir, relative)
+        if SOURCE_READERS[os.path.splitext(source)[1].lower()] == "csv":
+            return {"0": pd.read_csv(source, **read_options)}
+        # Parsing the workbook dominates, so every sheet is converted in the same pass
+        return pd.read_excel(source, sheet_name=None, **read_options)
+
+    @staticmethod
+    def _sheet_position(sheets: List[Any], sheet: Union[int, str, None]) -> int:
+        if sheet is None:
+            return 0
+        if isinstance(sheet, int):
+            if not -len(sheets) <= sheet < len(sheets):
+                raise IndexError(f"Sheet index {sheet} is out of range, the workbook has {len(sheets)} sheets")
+            return sheet % len(sheets)
+        names = [str(name) for name in sheets]
+        if sheet not in names:
+            raise KeyError(f"Worksheet named {sheet!r} not found, available sheets: {', '.join(names)}")
+        return names.index(sheet)
+
+    def _lock(self, index_path: str):
+        return _FileLock(f"{index_path[:-5]}.lock")
+
+
+class _FileLock:
+    """Exclusive lock between processes converting the same source"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self._file = open(self.path, "a")
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+_catalog: Optional[DatasetCatalog] = None
+
+
+def get_catalog() -> DatasetCatalog:
+    global _catalog
+    if _catalog is None:
+        _catalog = DatasetCatalog()
+    return _catalog
+
+
+def load_dataset(name: str, sheet: Union[int, str, None] = None, mmap: bool = True,
+                 categorical: bool = False, **read_options) -> "pd.DataFrame":
+    """Load a dataset from datasource/ through the shared columnar cache (see DatasetCatalog.load)"""
+    return get_catalog().load(name, sheet=sheet, mmap=mmap, categorical=categorical, **read_options)
+
+
+def list_datasets() -> List[str]:
+    return get_catalog().sources()
+
+
+def start_background_build() -> subprocess.Popen:
+    """Convert missing or stale datasets in a separate, low-priority process.
+
+    Parsing large workbooks takes a lot of memory, which a subprocess returns to the
+    system when it exits instead of growing the service process.
+    """
+    nice = getattr(os, "nice", None)
+    return subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "build"],
+        cwd=BASE_DIR,
+        preexec_fn=(lambda: nice(10)) if nice else None
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert the datasource/ files into the columnar cache")
+    parser.add_argument("command", choices=["build", "list"])
+    parser.add_argument("--force", action="store_true", help="convert again even if the cache is up to date")
+    args = parser.parse_args()
+
+    catalog = get_catalog()
+    if args.command == "build":
+        for result in catalog.build(force=args.force):
+            if result["status"] == "ok":
+                print(f"ok     {result['source']} ({result['seconds']:.2f}s)")
+            else:
+                print(f"error  {result['source']}: {result['error']}")
+    else:
+        for entry in catalog.stats():
+            state = "stale" if entry.get("stale") else ("cached" if entry["cached"] else "missing")
+            print(f"{state:8s} {entry['source']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+import os
+from typing import Optional, Dict
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows; kernels then only get the wall-clock and output limits
+    resource = None
+
+
+class ExecutionLimits:
+    """Resource budget for a single execution (all cells of one request)"""
+
+    def __init__(self, wall_time: float, cpu_time: int, memory_mb: int,
+                 max_output_lines: int, max_output_bytes: int, max_images: int,
+                 test_case_timeout: float = 0):
+        self.wall_time = wall_time                # seconds before the kernel is interrupted
+        self.cpu_time = cpu_time                  # CPU seconds (RLIMIT_CPU), 0 disables
+        self.memory_mb = memory_mb                # address space (RLIMIT_AS), 0 disables
+        self.max_output_lines = max_output_lines  # text lines kept per cell
+        self.max_output_bytes = max_output_bytes  # text bytes kept per cell
+        self.max_images = max_images              # images saved per cell
+        self.test_case_timeout = test_case_timeout  # wall seconds per test case, 0 disables
+
+
+# Default budgets per request type. Interactive sandbox runs get the most room,
+# bulk re-sync traffic the least. Every field can be overridden with an
+# EXECUTION_LIMITS_<TYPE>_<FIELD> environment variable, e.g. EXECUTION_LIMITS_SYNC_WALL_TIME=10
+DEFAULT_EXECUTION_LIMITS = {
+    "sandbox": dict(wall_time=30, cpu_time=30, memory_mb=2048, max_output_lines=1000, max_output_bytes=1024 * 1024, max_images=10,
+                    test_case_timeout=10.0),
+    "test": dict(wall_time=30, cpu_time=20, memory_mb=2048, max_output_lines=500, max_output_bytes=512 * 1024, max_images=10,
+                 test_case_timeout=10.0),
+    "sync": dict(wall_time=20, cpu_time=15, memory_mb=1536, max_output_lines=200, max_output_bytes=256 * 1024, max_images=5,
+                 test_case_timeout=5.0),
+}
+
+# Extra CPU seconds between the soft limit (SIGXCPU) and the hard limit (SIGKILL)
+CPU_LIMIT_GRACE = 5
+
+_limits_cache: Dict[str, ExecutionLimits] = {}
+
+
+def get_execution_limits(request_type: Optional[str]) -> ExecutionLimits:
+    """Resolve the limits for a request type; unknown or missing types use the "test" budget"""
+    key = request_type if request_type in DEFAULT_EXECUTION_LIMITS else "test"
+    if key not in _limits_cache:
+        values = {}
+        for field, default in DEFAULT_EXECUTION_LIMITS[key].items():
+            env_value = os.getenv(f"EXECUTION_LIMITS_{key.upper()}_{field.upper()}")
+            values[field] = type(default)(float(env_value)) if env_value else default
+        _limits_cache[key] = ExecutionLimits(**values)
+    return _limits_cache[key]
+
+
+def _process_cpu_seconds(pid: int) -> float:
+    # utime + stime from /proc/<pid>/stat (fields 14 and 15), in clock ticks
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+def apply_kernel_rlimits(pid: Optional[int], limits: ExecutionLimits):
+    """Cap CPU time and address space of a running kernel process.
+
+    The CPU limit is relative to what the (possibly pre-started) kernel has already
+    used, so warm kernels get the same budget as fresh ones. Hard limits can only be
+    lowered, so a reused kernel keeps the tighter of its old and new limits.
+    """
+    if resource is None or not hasattr(resource, 'prlimit') or not pid:
+        return
+
+    if limits.cpu_time > 0:
+        try:
+            soft = int(_process_cpu_seconds(pid)) + limits.cpu_time
+            _lower_limit(pid, resource.RLIMIT_CPU, soft, soft + CPU_LIMIT_GRACE)
+        except (OSError, ValueError) as e:
+            print(f"Could not apply CPU limit to kernel {pid}: {str(e)}")
+
+    if limits.memory_mb > 0:
+        try:
+            memory = limits.memory_mb * 1024 * 1024
+            _lower_limit(pid, resource.RLIMIT_AS, memory, memory)
+        except (OSError, ValueError) as e:
+            print(f"Could not apply memory limit to kernel {pid}: {str(e)}")
+
+
+def _lower_limit(pid: int, which: int, soft: int, hard: int):
+    current_soft, current_hard = resource.prlimit(pid, which)
+    if current_hard != resource.RLIM_INFINITY:
+        hard = min(hard, current_hard)
+    soft = min(soft, hard)
+    resource.prlimit(pid, which, (soft, hard))
+
+
+class ExecutionTimeout(Exception):
+    """The execution ran past its wall-clock budget and was interrupted"""
+
+
+class ExecutionCancelled(Exception):
+    """The execution was stopped because its result is no longer wanted (e.g. a newer sandbox run replaced it)"""
+
+
+class KernelDied(Exception):
+    """The kernel process exited mid-execution, usually after hitting a CPU or memory limit"""
+
+
+class OutputBudget:
+    """Tracks how much text and how many images a cell may still emit"""
+
+    def __init__(self, limits: ExecutionLimits):
+        self.limits = limits
+        self.lines = 0
+        self.bytes = 0
+        self.images = 0
+        self.truncated = False
+        self._text_exhausted = False
+        self._marker_sent = False
+
+    def take_text(self, text: str) -> Optional[str]:
+        """Return the part of a text line that fits in the budget, or None once it is used up"""
+        if self._text_exhausted:
+            return None
+        if self.lines >= self.limits.max_output_lines:
+            self.truncated = self._text_exhausted = True
+            return None
+
+        encoded = text.encode('utf-8')
+        remaining = self.limits.max_output_bytes - self.bytes
+        if len(encoded) > remaining:
+            self.truncated = self._text_exhausted = True
+            if remaining <= 0:
+                return None
+            text = encoded[:remaining].decode('utf-8', errors='ignore')
+            encoded = encoded[:remaining]
+
+        self.lines += 1
+        self.bytes += len(encoded)
+        return text
+
+    def take_image(self) -> bool:
+        if self.images >= self.limits.max_images:
+            self.truncated = True
+            return False
+        self.images += 1
+        return True
+
+    def truncation_marker(self) -> Optional[Dict]:
+        """Output item telling the student their output was cut, returned only once"""
+        if not self.truncated or self._marker_sent:
+            return None
+        self._marker_sent = True
+        return {
+            "type": "text",
+            "content": (f"[Output truncated: limit is {self.limits.max_output_lines} lines, "
+                        f"{self.limits.max_output_bytes} bytes and {self.limits.max_images} images]"),
+            "truncated": True
+        }
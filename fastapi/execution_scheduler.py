@@ -0,0 +1,204 @@
+"""Scheduler in front of the execution executor.
+
+Every execution takes one of EXECUTION_CONCURRENCY slots. When all slots are busy, requests
+wait in a bounded queue per request type (sandbox, test, sync). A freed slot goes to the
+type with the smallest virtual start time (start-time fair queuing), so each backlogged type
+gets slots in proportion to its weight. Ties go to sandbox, then test, then sync. Sync runs
+are also capped at a share of the slots, so a class-wide re-sync cannot occupy every slot a
+student typing in the sandbox needs. A request whose queue is full is rejected with
+SchedulerOverloaded, which the endpoints answer with 429 and a Retry-After estimate.
+"""
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from concurrent.futures import Executor
+from typing import Any, Dict, Optional
+
+from service_metrics import (
+    SCHEDULER_QUEUE_LENGTH, SCHEDULER_RUNNING, SCHEDULER_REJECTIONS, SCHEDULER_WAIT_SECONDS, request_type_label
+)
+
+# Per request type: relative share of the slots while backlogged, queue depth before 429,
+# and the fraction of all slots it may hold at once. Every field can be overridden with a
+# SCHEDULER_<TYPE>_<FIELD> environment variable, e.g. SCHEDULER_SYNC_MAX_QUEUE=5000
+DEFAULT_SCHEDULER_CLASSES = {
+    "sandbox": dict(weight=8, max_queue=64, max_share=1.0),
+    "test": dict(weight=4, max_queue=256, max_share=1.0),
+    "sync": dict(weight=1, max_queue=1024, max_share=0.75),
+}
+
+# Bounds of the Retry-After estimate, in seconds
+RETRY_AFTER_MIN = 1
+RETRY_AFTER_MAX = 60
+
+
+class SchedulerOverloaded(Exception):
+    """The queue for a request type is full; retry_after is the suggested wait in seconds"""
+
+    def __init__(self, request_type: str, retry_after: int):
+        super().__init__(f"Too many queued {request_type} executions, retry in {retry_after} seconds")
+        self.request_type = request_type
+        self.retry_after = retry_after
+
+
+class _SchedulingClass:
+    def __init__(self, name: str, weight: float, max_queue: int, max_running: int):
+        self.name = name
+        self.weight = weight
+        self.max_queue = max_queue
+        self.max_running = max_running
+        self.queue: deque = deque()
+        self.running = 0
+        self.finish_tag = 0.0
+        self.started = 0
+        self.rejected = 0
+        self.wait_seconds_total = 0.0
+        # Moving average of execution time, for the Retry-After estimate
+        self.avg_execution_seconds = 1.0
+
+
+def load_scheduler_classes(concurrency: int) -> Dict[str, _SchedulingClass]:
+    classes = {}
+    for name, defaults in DEFAULT_SCHEDULER_CLASSES.items():
+        values = {}
+        for field, default in defaults.items():
+            env_value = os.getenv(f"SCHEDULER_{name.upper()}_{field.upper()}")
+            values[field] = type(default)(float(env_value)) if env_value else default
+        max_running = max(1, min(concurrency, int(concurrency * values["max_share"])))
+        classes[name] = _SchedulingClass(name, values["weight"], values["max_queue"], max_running)
+    return classes
+
+
+class ExecutionScheduler:
+    """Weighted fair admission of executions to a fixed number of slots; used from the event loop only"""
+
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self.classes = load_scheduler_classes(concurrency)
+        self.running = 0
+        self.virtual_time = 0.0
+
+    def admit(self, request_type: Optional[str]):
+        """Raise SchedulerOverloaded if a request of this type would be rejected right now"""
+        scheduling_class = self.classes[request_type_label(request_type)]
+        if not self._can_start(scheduling_class) and len(scheduling_class.queue) >= scheduling_class.max_queue:
+            scheduling_class.rejected += 1
+            SCHEDULER_REJECTIONS.labels(scheduling_class.name).inc()
+            raise SchedulerOverloaded(scheduling_class.name, self._retry_after(scheduling_class))
+
+    async def acquire(self, request_type: Optional[str]) -> str:
+        """Wait for a slot, returning the class to release it to"""
+        self.admit(request_type)
+        scheduling_class = self.classes[request_type_label(request_type)]
+        if self._can_start(scheduling_class):
+            self._start(scheduling_class, 0.0)
+            return scheduling_class.name
+
+        entry = (asyncio.get_running_loop().create_future(), time.monotonic())
+        scheduling_class.queue.append(entry)
+        SCHEDULER_QUEUE_LENGTH.labels(scheduling_class.name).set(len(scheduling_class.queue))
+        try:
+            await entry[0]
+        except asyncio.CancelledError:
+            if entry[0].done() and not entry[0].cancelled():
+                # The slot was granted just as the caller went away
+                self.release(scheduling_class.name, None)
+            else:
+                try:
+                    scheduling_class.queue.remove(entry)
+                except ValueError:
+                    pass
+                SCHEDULER_QUEUE_LENGTH.labels(scheduling_class.name).set(len(scheduling_class.queue))
+            raise
+        return scheduling_class.name
+
+    def release(self, name: str, execution_seconds: Optional[float]):
+        scheduling_class = self.classes[name]
+        scheduling_class.running -= 1
+        self.running -= 1
+        SCHEDULER_RUNNING.labels(name).set(scheduling_class.running)
+        if execution_seconds is not None:
+            scheduling_class.avg_execution_seconds += 0.2 * (execution_seconds - scheduling_class.avg_execution_seconds)
+        self._dispatch()
+
+    async def run(self, request_type: Optional[str], executor: Executor, func, *args, **kwargs) -> Any:
+        """Run func(*args, **kwargs) on executor once a slot is free"""
+        loop = asyncio.get_running_loop()
+        name = await self.acquire(request_type)
+        started = time.monotonic()
+
+        def finished(_):
+            # The slot is held until the thread is done, even when the awaiting request was cancelled
+            try:
+                loop.call_soon_threadsafe(self.release, name, time.monotonic() - started)
+            except RuntimeError:
+                pass  # event loop already closed at shutdown
+
+        try:
+            future = executor.submit(func, *args, **kwargs)
+        except Exception:
+            self.release(name, None)
+            raise
+        future.add_done_callback(finished)
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "concurrency": self.concurrency,
+            "running": self.running,
+            "queued": sum(len(c.queue) for c in self.classes.values()),
+            "classes": {
+                name: {
+                    "weight": c.weight,
+                    "max_queue": c.max_queue,
+                    "max_running": c.max_running,
+                    "queued": len(c.queue),
+                    "running": c.running,
+                    "started": c.started,
+                    "rejected": c.rejected,
+                    "avg_wait_ms": c.wait_seconds_total / c.started * 1000 if c.started else 0.0,
+                    "oldest_wait_seconds": now - c.queue[0][1] if c.queue else 0.0,
+                    "avg_execution_seconds": c.avg_execution_seconds,
+                }
+                for name, c in self.classes.items()
+            },
+        }
+
+    def _can_start(self, scheduling_class: _SchedulingClass) -> bool:
+        # Queued requests of this class go first; other classes are only queued when they can't start
+        return (self.running < self.concurrency and scheduling_class.running < scheduling_class.max_running
+                and not scheduling_class.queue)
+
+    def _start(self, scheduling_class: _SchedulingClass, waited: float):
+        # Start-time fair queuing: an idle class does not bank credit, it restarts at the current virtual time
+        start_tag = max(self.virtual_time, scheduling_class.finish_tag)
+        self.virtual_time = start_tag
+        scheduling_class.finish_tag = start_tag + 1.0 / scheduling_class.weight
+        scheduling_class.running += 1
+        scheduling_class.started += 1
+        scheduling_class.wait_seconds_total += waited
+        self.running += 1
+        SCHEDULER_RUNNING.labels(scheduling_class.name).set(scheduling_class.running)
+        SCHEDULER_WAIT_SECONDS.labels(scheduling_class.name).observe(waited)
+
+    def _dispatch(self):
+        while self.running < self.concurrency:
+            candidates = [c for c in self.classes.values() if c.queue and c.running < c.max_running]
+            if not candidates:
+                return
+            # min() keeps the first of equal tags, so ties go to the higher-priority class
+            scheduling_class = min(candidates, key=lambda c: max(self.virtual_time, c.finish_tag))
+            future, enqueued = scheduling_class.queue.popleft()
+            SCHEDULER_QUEUE_LENGTH.labels(scheduling_class.name).set(len(scheduling_class.queue))
+            if future.done():
+                continue
+            self._start(scheduling_class, time.monotonic() - enqueued)
+            future.set_result(None)
+
+    def _retry_after(self, scheduling_class: _SchedulingClass) -> int:
+        # Time to drain the queue ahead at this class's slot count
+        estimate = len(scheduling_class.queue) * scheduling_class.avg_execution_seconds / scheduling_class.max_running
+        return int(min(RETRY_AFTER_MAX, max(RETRY_AFTER_MIN, math.ceil(estimate))))
@@ -0,0 +1,211 @@
+"""Fork-server execution backend.
+
+A zygote process (fork_server.py) imports numpy, pandas and matplotlib once and forks
+an isolated child per execution, so a submission starts in a few milliseconds instead
+of waiting for a Jupyter kernel. Children publish Jupyter-format messages over a Unix
+socket, which go through the same conversion as kernel messages, so the output items
+are identical to the Jupyter backend's. Select it with EXECUTOR_BACKEND=forkserver.
+"""
+import json
+import os
+import select
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from code_executor import CodeExecutor, POLL_SECONDS
+from execution_limits import ExecutionLimits, ExecutionCancelled, ExecutionTimeout, KernelDied, OutputBudget
+
+FORK_SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fork_server.py")
+
+# Modules imported by the zygote before it starts forking
+DEFAULT_PRELOAD = "numpy,pandas,matplotlib,matplotlib.pyplot"
+
+# BLAS thread pools in the zygote would not survive fork and only inflate the address space
+SINGLE_THREAD_ENV = {
+    "OMP_NUM_THREADS": "1",
+    "OPENBLAS_NUM_THREADS": "1",
+    "MKL_NUM_THREADS": "1",
+    "MPLBACKEND": "Agg",
+}
+
+
+class ForkedChild:
+    """Connection to one forked child, the session of a single execution"""
+
+    def __init__(self, sock: socket.socket, pid: int):
+        self.sock = sock
+        self.pid = pid
+        self.buffer = b""
+        self.exited = False
+
+    def send(self, message: Dict[str, Any]):
+        self.sock.sendall((json.dumps(message) + "\n").encode("utf-8"))
+
+    def receive(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """Next message, None when the timeout passed; raises KernelDied once the child is gone"""
+        while b"\n" not in self.buffer:
+            readable, _, _ = select.select([self.sock], [], [], max(0.0, timeout))
+            if not readable:
+                return None
+            data = self.sock.recv(1 << 20)
+            if not data:
+                self.exited = True
+                raise KernelDied("The execution process stopped unexpectedly, most likely because the code exceeded its CPU or memory limit")
+            self.buffer += data
+        line, self.buffer = self.buffer.split(b"\n", 1)
+        return json.loads(line)
+
+    def kill(self):
+        # Only while the child is known to be alive: it was reaped by the zygote otherwise and its pid may be reused
+        if not self.exited:
+            try:
+                os.kill(self.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            self.exited = True
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class ForkServerExecutor(CodeExecutor):
+    """Executes requests in children forked from a zygote with the heavy libraries preloaded"""
+
+    backend = "forkserver"
+
+    def __init__(self, image_store, preload: str = DEFAULT_PRELOAD, socket_path: Optional[str] = None,
+                 start_timeout: float = 60, connect_timeout: float = 10):
+        super().__init__(image_store)
+        self.preload = [name.strip() for name in preload.split(",") if name.strip()]
+        # One zygote per service process (uvicorn workers each get their own)
+        self.socket_path = socket_path or os.path.join(tempfile.gettempdir(), f"codeasy-forkserver-{os.getpid()}.sock")
+        self.start_timeout = start_timeout
+        self.connect_timeout = connect_timeout
+
+        self._lock = threading.Lock()
+        self._zygote: Optional[subprocess.Popen] = None
+        self.preload_seconds: Optional[float] = None
+        self.zygote_starts = 0
+        self.forks = 0
+        self.active = 0
+        self.fork_seconds_total = 0.0
+
+    def start(self):
+        with self._lock:
+            self._ensure_zygote()
+
+    def shutdown(self):
+        with self._lock:
+            zygote, self._zygote = self._zygote, None
+        if zygote is None:
+            return
+        # Closing its stdin tells the zygote to exit
+        try:
+            zygote.stdin.close()
+            zygote.wait(timeout=5)
+        except Exception:
+            zygote.kill()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            running = self._zygote is not None and self._zygote.poll() is None
+            return {
+                "backend": self.backend,
+                "zygote_running": running,
+                "zygote_pid": self._zygote.pid if running else None,
+                "zygote_starts": self.zygote_starts,
+                "preload": self.preload,
+                "preload_seconds": self.preload_seconds,
+                "forks": self.forks,
+                "active": self.active,
+                "avg_fork_ms": self.fork_seconds_total / self.forks * 1000 if self.forks else None,
+            }
+
+    def _ensure_zygote(self):
+        """Start the zygote if it is not running (first use or after it died); caller holds the lock"""
+        if self._zygote is not None and self._zygote.poll() is None:
+            return
+        env = {**os.environ, **SINGLE_THREAD_ENV}
+        zygote = subprocess.Popen(
+            [sys.executable, FORK_SERVER_SCRIPT, "--socket", self.socket_path, "--preload", ",".join(self.preload)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=env
+        )
+        readable, _, _ = select.select([zygote.stdout], [], [], self.start_timeout)
+        line = zygote.stdout.readline() if readable else b""
+        if not line:
+            zygote.kill()
+            raise RuntimeError("The fork server did not start")
+        ready = json.loads(line)
+        self.preload_seconds = ready.get("preload_seconds")
+        self._zygote = zygote
+        self.zygote_starts += 1
+        print(f"🍴 Fork server {zygote.pid} ready, preloaded {', '.join(self.preload)} in {self.preload_seconds:.2f}s")
+
+    def _acquire(self, student_id: Optional[int], limits: ExecutionLimits) -> ForkedChild:
+        started = time.perf_counter()
+        with self._lock:
+            self._ensure_zygote()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(self.connect_timeout)
+            sock.connect(self.socket_path)
+            sock.settimeout(None)
+            child = ForkedChild(sock, 0)
+            hello = child.receive(self.connect_timeout)
+            if hello is None:
+                raise RuntimeError("The fork server did not answer")
+            child.pid = hello["pid"]
+            child.send({"cpu_time": limits.cpu_time, "memory_mb": limits.memory_mb})
+        except Exception:
+            sock.close()
+            raise
+        with self._lock:
+            self.forks += 1
+            self.active += 1
+            self.fork_seconds_total += time.perf_counter() - started
+        return child
+
+    def _release(self, child: ForkedChild, dirty: bool):
+        # Children are never reused; closing the connection makes the child exit
+        child.close()
+        with self._lock:
+            self.active -= 1
+
+    def _run_cell(self, child: ForkedChild, code: str, outputs: List[Dict[str, Any]], is_sandbox: bool,
+                  student_id: Optional[int], limits: ExecutionLimits, deadline: float, image_writes: List[Any],
+                  cancel: Optional[threading.Event] = None, is_test_cell: bool = False):
+        """Execute a single cell in the child and append its output to outputs"""
+        budget = OutputBudget(limits)
+        child.send({"code": code})
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    child.kill()
+                    raise ExecutionTimeout(f"Execution exceeded the time limit of {limits.wall_time:g} seconds and was stopped")
+                if cancel is not None and cancel.is_set():
+                    child.kill()
+                    raise ExecutionCancelled("Execution was cancelled and stopped")
+                msg = child.receive(min(remaining, POLL_SECONDS))
+                if msg is None:
+                    continue
+                msg_type = msg['msg_type']
+                content = msg['content']
+                self._append_message(msg_type, content, outputs, budget, is_sandbox, student_id, image_writes,
+                                     is_test_cell)
+
+                if msg_type == 'status' and content['execution_state'] == 'idle':
+                    break
+        finally:
+            marker = budget.truncation_marker()
+            if marker:
+                outputs.append(marker)
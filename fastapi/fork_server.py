@@ -0,0 +1,341 @@
+"""Zygote process of the fork-server execution backend.
+
+Started by ForkServerExecutor as `python fork_server.py --socket PATH --preload numpy,...`.
+The zygote imports the heavy libraries once, then forks a fresh child for every
+connection on its Unix socket, so each submission starts in an isolated process that
+already has numpy, pandas and matplotlib (Agg backend) loaded.
+
+Protocol (newline-delimited JSON on the connection):
+    child   -> {"pid": ...}
+    service -> {"cpu_time": ..., "memory_mb": ...}      resource limits
+    service -> {"code": ...}                            one per cell
+    child   -> {"msg_type": ..., "content": {...}}      Jupyter-format messages,
+                                                        ending with status idle
+The child exits when the service closes the connection.
+"""
+import argparse
+import ast
+import base64
+import codecs
+import functools
+import io
+import json
+import linecache
+import os
+import random
+import select
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+import uuid
+
+# Figures are rendered off-screen; must be set before matplotlib is imported
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+from execution_limits import CPU_LIMIT_GRACE  # noqa: E402
+import test_harness  # noqa: E402
+
+_transformer = None
+
+
+class UnsupportedMagic(Exception):
+    pass
+
+
+class _Shell:
+    """Minimal get_ipython() for IPython syntax translated by the TransformerManager"""
+
+    def run_line_magic(self, name, line, _stack_depth=1):
+        # Figures are always captured, like with %matplotlib inline
+        if name == "matplotlib":
+            return None
+        raise UnsupportedMagic(f"The %{name} magic is not supported in this environment")
+
+    def run_cell_magic(self, name, line, cell):
+        raise UnsupportedMagic(f"The %%{name} magic is not supported in this environment")
+
+    def system(self, command):
+        raise UnsupportedMagic("Shell commands are not supported in this environment")
+
+    getoutput = system
+
+
+def _to_python(code):
+    global _transformer
+    if _transformer is None:
+        try:
+            from IPython.core.inputtransformer2 import TransformerManager
+        except ImportError:
+            return code
+        _transformer = TransformerManager()
+    return _transformer.transform_cell(code)
+
+
+class ChildSession:
+    """Runs the cells of one submission in this (forked) process"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.reader = conn.makefile("rb")
+        self.send_lock = threading.Lock()
+        shell = _Shell()
+        self.namespace = {"__name__": "__main__", "__builtins__": __builtins__, "get_ipython": lambda: shell}
+        self.execution_count = 0
+        # stdout/stderr go through a pipe drained by a thread, so output of C code and
+        # subprocesses is captured too; the sentinel marks "everything written so far was read"
+        self.sentinel = f"\x00{uuid.uuid4().hex}\x00"
+        self.drained = threading.Event()
+        self._redirect_output()
+
+    def _redirect_output(self):
+        read_fd, write_fd = os.pipe()
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(devnull, 0)  # input() raises EOFError
+        os.close(devnull)
+        os.dup2(write_fd, 1)
+        os.dup2(write_fd, 2)
+        os.close(write_fd)
+        sys.stdin = io.TextIOWrapper(io.FileIO(0, "r", closefd=False))
+        sys.stdout = io.TextIOWrapper(io.FileIO(1, "w", closefd=False), encoding="utf-8", line_buffering=True)
+        sys.stderr = io.TextIOWrapper(io.FileIO(2, "w", closefd=False), encoding="utf-8", line_buffering=True)
+        threading.Thread(target=self._pump_output, args=(read_fd,), daemon=True).start()
+
+    def _pump_output(self, fd):
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        pending = ""
+        while True:
+            data = os.read(fd, 65536)
+            if not data:
+                return
+            pending += decoder.decode(data)
+            index = pending.find(self.sentinel)
+            while index >= 0:
+                self._send_stream(pending[:index])
+                pending = pending[index + len(self.sentinel):]
+                self.drained.set()
+                index = pending.find(self.sentinel)
+            # Hold back what could be the start of a sentinel split across reads
+            hold = pending.rfind("\x00")
+            if hold < 0:
+                self._send_stream(pending)
+                pending = ""
+            else:
+                self._send_stream(pending[:hold])
+                pending = pending[hold:]
+
+    def _send_stream(self, text):
+        if text:
+            self.send({"msg_type": "stream", "content": {"name": "stdout", "text": text}})
+
+    def send(self, message):
+        data = (json.dumps(message) + "\n").encode("utf-8")
+        with self.send_lock:
+            self.conn.sendall(data)
+
+    def send_output(self, message):
+        """Send a non-stream message after all output printed before it"""
+        self.drain()
+        self.send(message)
+
+    def drain(self):
+        for stream in (sys.stdout, sys.stderr):
+            try:
+                stream.flush()
+            except Exception:
+                pass
+        self.drained.clear()
+        os.write(1, self.sentinel.encode("utf-8"))
+        self.drained.wait()
+
+    def receive(self):
+        line = self.reader.readline()
+        return json.loads(line) if line else None
+
+    def apply_limits(self, limits):
+        try:
+            import resource
+        except ImportError:
+            return
+        cpu_time = int(limits.get("cpu_time") or 0)
+        memory_mb = int(limits.get("memory_mb") or 0)
+        # A forked child starts with zero CPU time, the limit is the whole budget
+        if cpu_time > 0:
+            resource.setrlimit(resource.RLIMIT_CPU, (cpu_time, cpu_time + CPU_LIMIT_GRACE))
+        if memory_mb > 0:
+            memory = memory_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+
+    def run(self):
+        self.send({"pid": os.getpid()})
+        limits = self.receive()
+        if limits is None:
+            return
+        self.apply_limits(limits)
+        while True:
+            request = self.receive()
+            if request is None:
+                return
+            self.run_cell(request["code"])
+
+    def run_cell(self, code):
+        self.execution_count += 1
+        filename = f"Cell In[{self.execution_count}]"
+        try:
+            source = _to_python(code)
+            # Register the source so tracebacks show the offending lines
+            linecache.cache[filename] = (len(source), None, source.splitlines(True), filename)
+            tree = ast.parse(source, filename)
+            last_expression = None
+            if tree.body and isinstance(tree.body[-1], ast.Expr):
+                last_expression = ast.Expression(tree.body.pop().value)
+            exec(compile(tree, filename, "exec"), self.namespace)
+            if last_expression is not None:
+                value = eval(compile(last_expression, filename, "eval"), self.namespace)
+                if value is not None:
+                    self.send_output({"msg_type": "execute_result", "content": {"data": {"text/plain": repr(value)}}})
+        except BaseException as e:
+            # SystemExit and KeyboardInterrupt included, like the kernel reports them
+            self.send_output({"msg_type": "error", "content": {
+                "ename": type(e).__name__,
+                "evalue": str(e),
+                "traceback": self._traceback_lines(e),
+            }})
+        try:
+            self.flush_figures()
+        except Exception:
+            pass
+        self.drain()
+        self.send({"msg_type": "status", "content": {"execution_state": "idle"}})
+
+    def flush_figures(self):
+        """Publish every open matplotlib figure as a PNG and close it, like the inline backend"""
+        pyplot = sys.modules.get("matplotlib.pyplot")
+        if pyplot is None:
+            return
+        for number in pyplot.get_fignums():
+            figure = pyplot.figure(number)
+            buffer = io.BytesIO()
+            figure.savefig(buffer, format="png", bbox_inches="tight")
+            self.send_output({"msg_type": "display_data", "content": {"data": {
+                "image/png": base64.b64encode(buffer.getvalue()).decode("ascii"),
+                "text/plain": repr(figure),
+            }}})
+        pyplot.close("all")
+
+    @staticmethod
+    def _traceback_lines(error):
+        # Drop the frames of this module, the student only sees their own code
+        frames = [frame for frame in traceback.extract_tb(error.__traceback__) if frame.filename != __file__]
+        lines = traceback.format_list(frames) + traceback.format_exception_only(type(error), error)
+        if frames:
+            lines.insert(0, "Traceback (most recent call last):\n")
+        return "".join(lines).rstrip("\n").split("\n")
+
+
+def _patch_pyplot_show(session):
+    pyplot = sys.modules.get("matplotlib.pyplot")
+    if pyplot is not None:
+        pyplot.show = lambda *args, **kwargs: session.flush_figures()
+
+
+def _child_main(conn):
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    # Every child would otherwise produce the zygote's random sequence
+    random.seed()
+    numpy = sys.modules.get("numpy")
+    if numpy is not None:
+        numpy.random.seed()
+    session = ChildSession(conn)
+    _patch_pyplot_show(session)
+    # Test results go out as display_data, like publish_display_data does in a kernel
+    test_harness.set_publisher(functools.partial(_publish_test_result, session))
+    session.run()
+
+
+def _publish_test_result(session, data):
+    # Checked against the harness imported here in the zygote, so a substitute harness
+    # the student code put in sys.modules cannot publish through this session either
+    problems = test_harness.integrity_problems()
+    if problems:
+        error = test_harness.HarnessIntegrityError("Test results cannot be trusted: " + "; ".join(problems))
+        session.send_output({"msg_type": "error", "content": {
+            "ename": type(error).__name__, "evalue": str(error), "traceback": [f"{type(error).__name__}: {error}"],
+        }})
+        return
+    session.send_output({"msg_type": "display_data", "content": {"data": data}})
+
+
+def _preload(modules):
+    for name in modules:
+        try:
+            __import__(name)
+        except ImportError as e:
+            print(f"fork server: could not preload {name}: {e}", file=sys.stderr)
+    pyplot = sys.modules.get("matplotlib.pyplot")
+    if pyplot is not None:
+        pyplot.switch_backend("Agg")
+        # Render one figure so fonts and the Agg renderer are loaded once, not in every child
+        figure = pyplot.figure()
+        pyplot.plot([0, 1], [0, 1])
+        pyplot.title("warm-up")
+        figure.savefig(io.BytesIO(), format="png", bbox_inches="tight")
+        pyplot.close("all")
+    # Warm the IPython syntax translation used by every cell
+    _to_python("pass")
+
+
+def serve(socket_path, preload):
+    started = time.perf_counter()
+    _preload(preload)
+    preload_seconds = time.perf_counter() - started
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    os.chmod(socket_path, 0o600)
+    server.listen(128)
+    # Children are reaped automatically
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+
+    sys.stdout.write(json.dumps({"ready": True, "pid": os.getpid(), "preload_seconds": preload_seconds}) + "\n")
+    sys.stdout.flush()
+
+    # The service holds our stdin open; EOF means it went away and we exit with it
+    stdin_fd = sys.stdin.fileno()
+    while True:
+        readable, _, _ = select.select([server, stdin_fd], [], [])
+        if stdin_fd in readable and not os.read(stdin_fd, 4096):
+            break
+        if server in readable:
+            conn, _ = server.accept()
+            pid = os.fork()
+            if pid == 0:
+                server.close()
+                try:
+                    _child_main(conn)
+                finally:
+                    os._exit(0)
+            conn.close()
+    server.close()
+    try:
+        os.unlink(socket_path)
+    except FileNotFoundError:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Codeasy fork-server zygote")
+    parser.add_argument("--socket", required=True)
+    parser.add_argument("--preload", default="numpy,pandas,matplotlib.pyplot")
+    args = parser.parse_args()
+    serve(args.socket, [name.strip() for name in args.preload.split(",") if name.strip()])
+
+
+if __name__ == "__main__":
+    main()
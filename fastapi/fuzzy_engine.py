@@ -0,0 +1,150 @@
+"""Vectorized fuzzy-logic classification for a whole cohort.
+
+Each (student, material) group is reduced to the averages of its non-empty question
+rows. Membership degrees, rule strengths and the weighted-average defuzzification are
+then evaluated for every group at once. The membership functions and the rule base are
+plain tables (FUZZY_TERMS, FUZZY_RULES), and the results are identical to the scalar
+calculate_fuzzy_logic in main.py, which is kept as the reference implementation.
+"""
+from typing import Any, Dict, List
+
+import numpy as np
+
+from topsis_engine import pack_groups, scores_to_levels
+
+# Decision matrix columns (see classify_students) averaged into fuzzy inputs
+INPUT_COLUMNS = {
+    "completion": 2,
+    "trial": 3,
+    "compile": 0,
+    "coding_time": 1,
+    "variables": 4,
+    "functions": 5,
+}
+
+# Inputs normalized to 0-1 before fuzzification: (input, divisor), clipped at 1
+NORMALIZED_INPUTS = {
+    "norm_compile": ("compile", 20.0),      # assume max 20 compiles
+    "norm_coding_time": ("coding_time", 60.0),  # assume max 60 minutes
+}
+
+# Membership functions. "linear" terms are intercept + sign * (x * multiplier / divisor)
+# clipped to [low, high] (None leaves that side open); "triangle" terms are 1 - |2x - 1|,
+# peaking at x = 0.5. Multipliers and divisors are kept apart so the arithmetic is the
+# same as the reference implementation, bit for bit.
+FUZZY_TERMS = {
+    # name: ("linear", input, intercept, sign, multiplier, divisor, low, high)
+    "completion_low": ("linear", "completion", 1.0, -1.0, 2.5, 1.0, 0.0, None),
+    "completion_high": ("linear", "completion", 0.0, 1.0, 2.5, 1.0, None, 1.0),
+    "trial_low": ("linear", "trial", 1.0, -1.0, 1.0, 1.0, None, None),
+    "trial_high": ("linear", "trial", 0.0, 1.0, 1.0, 1.0, None, None),
+    "compile_low": ("linear", "norm_compile", 1.0, -1.0, 1.0, 1.0, None, None),
+    "compile_high": ("linear", "norm_compile", 0.0, 1.0, 1.0, 1.0, None, None),
+    "time_low": ("linear", "norm_coding_time", 1.0, -1.0, 2.5, 1.0, 0.0, None),
+    "time_medium": ("triangle", "norm_coding_time"),
+    "time_high": ("linear", "norm_coding_time", -1.0, 1.0, 2.5, 1.0, 0.0, None),
+    "vars_low": ("linear", "variables", 1.0, -1.0, 1.0, 5.0, 0.0, None),
+    "vars_high": ("linear", "variables", 0.0, 1.0, 1.0, 5.0, None, 1.0),
+    "funcs_low": ("linear", "functions", 1.0, -1.0, 1.0, 3.0, 0.0, None),
+    "funcs_high": ("linear", "functions", 0.0, 1.0, 1.0, 3.0, None, 1.0),
+}
+
+# Rule base: (level, weight, operator, [(term, factor), ...]). A rule's strength is the
+# min (AND) or max (OR) of its terms, each multiplied by its factor.
+FUZZY_RULES = [
+    ("Create", 0.95, "min", [("completion_high", 1.0), ("vars_high", 1.0), ("funcs_high", 1.0)]),
+    ("Evaluate", 0.75, "min", [("completion_high", 1.0), ("vars_high", 1.0)]),
+    ("Analyze", 0.6, "min", [("completion_high", 1.0), ("compile_low", 1.0)]),
+    ("Apply", 0.45, "min", [("time_medium", 1.0), ("trial_high", 1.0)]),
+    ("Understand", 0.3, "min", [("trial_high", 1.0), ("completion_low", 1.0)]),
+    ("Remember", 0.1, "max", [("trial_low", 1.0), ("completion_low", 2.0)]),
+]
+
+# Score used when no rule fires at all
+NO_RULE_SCORE = 0.25
+
+
+class FuzzyBatchResult:
+    """Per-group scores and levels plus the inputs, memberships and rule strengths behind them"""
+
+    def __init__(self, inputs, memberships, rule_strengths, valid, scores):
+        self.inputs = inputs
+        self.memberships = memberships
+        self.rule_strengths = rule_strengths
+        self.valid = valid
+        self.scores = scores
+        self.levels = scores_to_levels(scores)
+
+    def __len__(self):
+        return len(self.scores)
+
+
+def _membership(term, inputs: Dict[str, np.ndarray]) -> np.ndarray:
+    if term[0] == "triangle":
+        return 1 - np.abs(2 * inputs[term[1]] - 1)
+    _, name, intercept, sign, multiplier, divisor, low, high = term
+    degree = intercept + sign * (inputs[name] * multiplier / divisor)
+    if low is not None:
+        degree = np.maximum(low, degree)
+    if high is not None:
+        degree = np.minimum(high, degree)
+    return degree
+
+
+def calculate_fuzzy_batch(groups: List[List[List[float]]]) -> FuzzyBatchResult:
+    """Score many groups with the fuzzy rule base in a few array passes.
+
+    Rows whose metrics are all zero are ignored when averaging; groups without any
+    other row score 0.0, like the scalar implementation.
+    """
+    values, mask, _ = pack_groups(groups)
+    rows = mask & (values != 0).any(axis=2)
+    counts = rows.sum(axis=1)
+    valid = counts > 0
+
+    # Average the inputs over the non-empty rows of each group
+    totals = np.where(rows[:, :, None], values, 0).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        averages = totals / counts[:, None]
+    averages[~valid] = 0.0
+
+    inputs = {name: averages[:, column] for name, column in INPUT_COLUMNS.items()}
+    for name, (source, divisor) in NORMALIZED_INPUTS.items():
+        inputs[name] = np.minimum(1.0, inputs[source] / divisor)
+
+    memberships = {name: _membership(term, inputs) for name, term in FUZZY_TERMS.items()}
+
+    strengths = np.zeros((len(groups), len(FUZZY_RULES)))
+    for r, (_, _, operator, terms) in enumerate(FUZZY_RULES):
+        degrees = [memberships[name] * factor if factor != 1.0 else memberships[name] for name, factor in terms]
+        strengths[:, r] = (np.minimum if operator == "min" else np.maximum).reduce(degrees)
+
+    # Weighted average defuzzification, summed rule by rule in table order
+    numerator = np.zeros(len(groups))
+    denominator = np.zeros(len(groups))
+    for r, (_, weight, _, _) in enumerate(FUZZY_RULES):
+        numerator = numerator + strengths[:, r] * weight
+        denominator = denominator + strengths[:, r]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        scores = np.where(denominator == 0, NO_RULE_SCORE, numerator / denominator)
+    scores = np.clip(scores, 0.0, 1.0)
+    scores[~valid] = 0.0
+
+    return FuzzyBatchResult(inputs, memberships, strengths, valid, scores)
+
+
+def fuzzy_calculation_details(result: FuzzyBatchResult, g: int) -> Dict[str, Any]:
+    """calculation_details of one group: averaged inputs, memberships and rule strengths"""
+    if not result.valid[g]:
+        return {"method": "fuzzy_logic"}
+    return {
+        "method": "fuzzy_logic",
+        "inputs": {name: float(values[g]) for name, values in result.inputs.items()},
+        "memberships": {name: float(values[g]) for name, values in result.memberships.items()},
+        "rules": [
+            {"level": level, "weight": weight, "strength": float(result.rule_strengths[g, r])}
+            for r, (level, weight, _, _) in enumerate(FUZZY_RULES)
+        ],
+        "final_score": float(result.scores[g]),
+        "final_level": result.levels[g]
+    }
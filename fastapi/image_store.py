@@ -0,0 +1,272 @@
+"""Background writer and garbage collector for kernel visualizations.
+
+Images are named by the hash of their content. The bytes are stored once under
+objects/<hash>.png and every student-facing name (sandbox_<student>_<hash>.png,
+visual_<student>_<hash>.png) is a hard link to that object, so identical plots take
+disk space once while the per-student prefixes Laravel relies on keep working.
+Decoding, optional recompression and writing happen on writer threads; callers get
+the public URL right away plus a future to wait on before the URL is handed out.
+"""
+import base64
+import hashlib
+import io
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional
+
+from service_metrics import IMAGE_WRITE_SECONDS
+
+TEMPORARY_PREFIX = "sandbox_"
+
+
+def _completed_future() -> Future:
+    future = Future()
+    future.set_result(None)
+    return future
+
+
+class ImageStore:
+    def __init__(self, directory: str, url_prefix: str, writer_threads: int = 2,
+                 recompress: bool = False, max_dimension: int = 0,
+                 temporary_ttl: float = 2 * 24 * 3600, temporary_quota_bytes: int = 0,
+                 gc_interval: float = 600):
+        self.directory = directory
+        self.objects_directory = os.path.join(directory, "objects")
+        self.url_prefix = url_prefix.rstrip("/")
+        self.recompress = recompress
+        self.max_dimension = max_dimension
+        self.temporary_ttl = temporary_ttl
+        self.temporary_quota_bytes = temporary_quota_bytes
+        self.gc_interval = gc_interval
+
+        self._writer = ThreadPoolExecutor(max_workers=writer_threads, thread_name_prefix="image-writer")
+        self._lock = threading.Lock()
+        # Held while an object is checked and linked, and while the GC decides to remove an orphaned one
+        self._objects_lock = threading.Lock()
+        self._in_flight: Dict[str, Future] = {}
+        self._directories_ready = False
+        self._stop = threading.Event()
+        self._gc_thread: Optional[threading.Thread] = None
+
+        self.writes = 0
+        self.dedup_hits = 0
+        self.bytes_written = 0
+        self.write_errors = 0
+        self.gc_runs = 0
+        self.gc_removed = 0
+        self.gc_freed_bytes = 0
+
+    def store(self, image_b64: str, prefix: str):
+        """Queue an image for writing; returns (public_url, future done once the file exists)"""
+        digest = hashlib.sha256(image_b64.encode("ascii")).hexdigest()[:32]
+        filename = f"{prefix}{digest}.png"
+        path = os.path.join(self.directory, filename)
+        url = f"{self.url_prefix}/{filename}"
+
+        with self._lock:
+            future = self._in_flight.get(filename)
+            if future is not None:
+                self.dedup_hits += 1
+                return url, future
+            if os.path.exists(path):
+                self.dedup_hits += 1
+                # Restart the TTL of a reused sandbox image
+                try:
+                    os.utime(path)
+                except OSError:
+                    pass
+                return url, _completed_future()
+            future = self._writer.submit(self._write, filename, digest, image_b64)
+            self._in_flight[filename] = future
+        future.add_done_callback(lambda _: self._forget(filename))
+        return url, future
+
+    def wait(self, futures: List[Future], timeout: float = 10.0):
+        """Block until the given writes finished (or the timeout passed; they still finish in the background)"""
+        if futures:
+            wait(futures, timeout=timeout)
+
+    def start(self):
+        if self.gc_interval > 0 and self._gc_thread is None:
+            self._gc_thread = threading.Thread(target=self._gc_loop, name="image-gc", daemon=True)
+            self._gc_thread.start()
+
+    def shutdown(self):
+        self._stop.set()
+        self._writer.shutdown(wait=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "directory": self.directory,
+                "in_flight": len(self._in_flight),
+                "writes": self.writes,
+                "dedup_hits": self.dedup_hits,
+                "bytes_written": self.bytes_written,
+                "write_errors": self.write_errors,
+                "recompress": self.recompress,
+                "temporary_ttl": self.temporary_ttl,
+                "temporary_quota_bytes": self.temporary_quota_bytes,
+                "gc_runs": self.gc_runs,
+                "gc_removed": self.gc_removed,
+                "gc_freed_bytes": self.gc_freed_bytes,
+            }
+
+    def _forget(self, filename: str):
+        with self._lock:
+            self._in_flight.pop(filename, None)
+
+    def _ensure_directories(self):
+        if not self._directories_ready:
+            os.makedirs(self.objects_directory, exist_ok=True)
+            self._directories_ready = True
+
+    def _write(self, filename: str, digest: str, image_b64: str):
+        with IMAGE_WRITE_SECONDS.time():
+            self._write_files(filename, digest, image_b64)
+
+    def _write_files(self, filename: str, digest: str, image_b64: str):
+        try:
+            self._ensure_directories()
+            object_path = os.path.join(self.objects_directory, f"{digest}.png")
+            path = os.path.join(self.directory, filename)
+            # Linked under the objects lock, so the GC cannot remove the object between the check and the link
+            with self._objects_lock:
+                exists = os.path.exists(object_path)
+                if exists:
+                    self._link(object_path, path)
+            if exists:
+                with self._lock:
+                    self.dedup_hits += 1
+                return
+
+            # Decoding and writing happen outside the lock; only the rename and link are serialized with the GC
+            image_bytes = base64.b64decode(image_b64)
+            if self.recompress:
+                image_bytes = self._recompress(image_bytes)
+            temporary_path = f"{object_path}.{threading.get_ident()}.tmp"
+            with open(temporary_path, "wb") as f:
+                f.write(image_bytes)
+            with self._objects_lock:
+                os.replace(temporary_path, object_path)
+                self._link(object_path, path)
+            with self._lock:
+                self.writes += 1
+                self.bytes_written += len(image_bytes)
+        except Exception as e:
+            with self._lock:
+                self.write_errors += 1
+            print(f"Could not store visualization {filename}: {str(e)}")
+            raise
+
+    @staticmethod
+    def _link(object_path: str, path: str):
+        try:
+            os.link(object_path, path)
+        except FileExistsError:
+            pass
+        except OSError:
+            # Hard links unsupported on this volume, fall back to a copy
+            shutil.copyfile(object_path, path)
+
+    def _recompress(self, image_bytes: bytes) -> bytes:
+        """Downscale to max_dimension and re-encode with PNG optimization, keeping the smaller result"""
+        try:
+            from PIL import Image
+        except ImportError:
+            return image_bytes
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            if self.max_dimension and max(image.size) > self.max_dimension:
+                image.thumbnail((self.max_dimension, self.max_dimension))
+            output = io.BytesIO()
+            image.save(output, format="PNG", optimize=True)
+        recompressed = output.getvalue()
+        return recompressed if len(recompressed) < len(image_bytes) else image_bytes
+
+    def _gc_loop(self):
+        while not self._stop.wait(self.gc_interval):
+            try:
+                self.collect_garbage()
+            except Exception as e:
+                print(f"Visualization garbage collection failed: {str(e)}")
+
+    def collect_garbage(self, now: Optional[float] = None) -> Dict[str, int]:
+        """Evict temporary sandbox images past their TTL or over the quota, then orphaned objects"""
+        now = now or time.time()
+        removed = freed = 0
+        if not os.path.isdir(self.directory):
+            return {"removed": 0, "freed_bytes": 0}
+
+        temporary = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.startswith(TEMPORARY_PREFIX) and entry.name.endswith(".png") and entry.is_file():
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    temporary.append((stat.st_mtime, entry.path, stat.st_ino, stat.st_size))
+
+        # Oldest first; names past the TTL go unconditionally
+        temporary.sort()
+        kept = []
+        for mtime, path, inode, size in temporary:
+            if self.temporary_ttl > 0 and now - mtime > self.temporary_ttl:
+                removed += self._unlink(path)
+            else:
+                kept.append((mtime, path, inode, size))
+
+        # Then the oldest remaining ones until the distinct images fit in the quota
+        if self.temporary_quota_bytes > 0:
+            sizes = {inode: size for _, _, inode, size in kept}
+            references = {}
+            for _, _, inode, _ in kept:
+                references[inode] = references.get(inode, 0) + 1
+            total = sum(sizes.values())
+            for mtime, path, inode, size in kept:
+                if total <= self.temporary_quota_bytes:
+                    break
+                removed += self._unlink(path)
+                references[inode] -= 1
+                if references[inode] == 0:
+                    total -= size
+
+        # Objects no longer linked from any name only hold their own link
+        if os.path.isdir(self.objects_directory):
+            in_flight = self._in_flight_digests()
+            with os.scandir(self.objects_directory) as entries:
+                for entry in entries:
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    if entry.name.endswith(".png") and stat.st_nlink <= 1 and entry.name[:-4] not in in_flight:
+                        # Checked again under the objects lock: a writer may have linked it since the scan
+                        with self._objects_lock:
+                            try:
+                                stat = os.stat(entry.path)
+                            except FileNotFoundError:
+                                continue
+                            if stat.st_nlink <= 1 and self._unlink(entry.path):
+                                freed += stat.st_size
+
+        with self._lock:
+            self.gc_runs += 1
+            self.gc_removed += removed
+            self.gc_freed_bytes += freed
+        return {"removed": removed, "freed_bytes": freed}
+
+    def _in_flight_digests(self):
+        with self._lock:
+            return {filename.rsplit("_", 1)[-1][:-4] for filename in self._in_flight}
+
+    @staticmethod
+    def _unlink(path: str) -> int:
+        try:
+            os.unlink(path)
+            return 1
+        except FileNotFoundError:
+            return 0
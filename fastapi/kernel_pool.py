@@ -0,0 +1,316 @@
+import threading
+import time
+from typing import Optional, List, Dict, Any
+
+from jupyter_client import KernelManager
+
+from service_metrics import KERNEL_START_SECONDS, KERNEL_READY_SECONDS
+
+# Code used to wipe the user namespace when a kernel is handed back for reuse
+RESET_NAMESPACE_CODE = "get_ipython().reset(new_session=False, aggressive=True)"
+
+# Upper bounds (seconds) of the lease wait histogram buckets
+LEASE_WAIT_BUCKETS = [0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]
+
+
+class PooledKernel:
+    """A started kernel plus its client channels and usage bookkeeping"""
+
+    def __init__(self, km: KernelManager, kc):
+        self.km = km
+        self.kc = kc
+        self.uses = 0
+        self.owner: Optional[int] = None
+        self.created_at = time.monotonic()
+
+    @property
+    def client(self):
+        return self.kc
+
+    @property
+    def pid(self) -> Optional[int]:
+        provisioner = getattr(self.km, 'provisioner', None)
+        return getattr(provisioner, 'pid', None)
+
+    def is_alive(self) -> bool:
+        try:
+            return self.km.is_alive()
+        except Exception:
+            return False
+
+
+class KernelPool:
+    """Pool of pre-started, ready-to-run kernels leased out one execution at a time.
+
+    Kernels are recycled (shut down and replaced) after `max_uses` executions or as
+    soon as a lease is released dirty. A kernel that has been used is only ever leased
+    again to the same student, so student code never shares a process with another
+    student's code. With the default `max_uses=1` every execution gets a brand new
+    kernel, the pool only removes the cold start from the request path.
+    """
+
+    def __init__(self, min_size: int = 2, max_size: int = 8, max_uses: int = 1,
+                 kernel_name: str = 'python3', ready_timeout: float = 30,
+                 lease_timeout: float = 60, warmup_code: str = ""):
+        self.min_size = max(0, min_size)
+        self.max_size = max(1, max_size, self.min_size)
+        self.max_uses = max(1, max_uses)
+        self.kernel_name = kernel_name
+        self.ready_timeout = ready_timeout
+        self.lease_timeout = lease_timeout
+        self.warmup_code = warmup_code
+
+        self._idle: List[PooledKernel] = []
+        # Kernels that exist or are being started (idle + leased + starting)
+        self._total = 0
+        self._leased = 0
+        self._cond = threading.Condition()
+        self._running = False
+        self._refill_thread: Optional[threading.Thread] = None
+
+        # Metrics
+        self._hits = 0
+        self._misses = 0
+        self._recycled = 0
+        self._start_failures = 0
+        self._lease_wait_total = 0.0
+        self._lease_wait_max = 0.0
+        self._lease_wait_buckets = [0] * (len(LEASE_WAIT_BUCKETS) + 1)
+
+    def start(self):
+        """Start the background refill thread"""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._refill_thread = threading.Thread(target=self._refill_loop, name="kernel-pool-refill", daemon=True)
+        self._refill_thread.start()
+
+    def shutdown(self):
+        """Stop refilling and shut down every idle kernel"""
+        with self._cond:
+            self._running = False
+            idle = self._idle
+            self._idle = []
+            self._total -= len(idle)
+            self._cond.notify_all()
+        for kernel in idle:
+            self._shutdown_kernel(kernel)
+
+    def lease(self, student_id: Optional[int] = None) -> PooledKernel:
+        """Take a ready kernel out of the pool, starting one if none is available"""
+        started = time.monotonic()
+        deadline = started + self.lease_timeout
+        hit = True
+
+        with self._cond:
+            while True:
+                kernel = self._take_idle(student_id)
+                if kernel is not None:
+                    break
+
+                if self._total < self.max_size:
+                    # Nothing idle but we have capacity: start a kernel for this caller
+                    self._total += 1
+                    kernel = None
+                    hit = False
+                    break
+
+                hit = False
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"No kernel available within {self.lease_timeout}s (pool size {self.max_size})")
+                self._cond.wait(remaining)
+
+        if kernel is None:
+            try:
+                kernel = self._start_kernel()
+            except Exception:
+                with self._cond:
+                    self._total -= 1
+                    self._start_failures += 1
+                    self._cond.notify_all()
+                raise
+
+        self._record_lease(hit, time.monotonic() - started)
+        kernel.uses += 1
+        kernel.owner = student_id
+        # Ask the refill thread to top the pool back up
+        with self._cond:
+            self._leased += 1
+            self._cond.notify_all()
+        return kernel
+
+    def release(self, kernel: PooledKernel, dirty: bool = False):
+        """Hand a kernel back; it is reused only if it is clean and under its use budget"""
+        with self._cond:
+            self._leased -= 1
+
+        reusable = (
+            not dirty
+            and kernel.owner is not None
+            and kernel.uses < self.max_uses
+            and kernel.is_alive()
+        )
+        if reusable:
+            reusable = self._reset_namespace(kernel)
+
+        if reusable:
+            with self._cond:
+                if self._running:
+                    self._idle.append(kernel)
+                    self._cond.notify_all()
+                    return
+
+        # Recycle in the background so the caller does not wait for the shutdown
+        with self._cond:
+            self._recycled += 1
+        threading.Thread(target=self._dispose, args=(kernel,), daemon=True).start()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            leases = self._hits + self._misses
+            buckets = {}
+            cumulative = 0
+            for bound, count in zip(LEASE_WAIT_BUCKETS + [float('inf')], self._lease_wait_buckets):
+                cumulative += count
+                buckets["+Inf" if bound == float('inf') else str(bound)] = cumulative
+            return {
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "max_uses": self.max_uses,
+                "idle": len(self._idle),
+                "total": self._total,
+                "leased": self._leased,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / leases if leases else 0.0,
+                "recycled": self._recycled,
+                "start_failures": self._start_failures,
+                "lease_wait_seconds": {
+                    "count": leases,
+                    "sum": self._lease_wait_total,
+                    "avg": self._lease_wait_total / leases if leases else 0.0,
+                    "max": self._lease_wait_max,
+                    "buckets": buckets
+                }
+            }
+
+    def _take_idle(self, student_id: Optional[int]) -> Optional[PooledKernel]:
+        # Must be called with the lock held
+        for i, kernel in enumerate(self._idle):
+            # Used kernels are only handed back to the student that used them
+            if kernel.uses == 0 or (student_id is not None and kernel.owner == student_id):
+                del self._idle[i]
+                if kernel.is_alive():
+                    return kernel
+                self._total -= 1
+                threading.Thread(target=self._shutdown_kernel, args=(kernel,), daemon=True).start()
+                return self._take_idle(student_id)
+        return None
+
+    def _record_lease(self, hit: bool, waited: float):
+        with self._cond:
+            if hit:
+                self._hits += 1
+            else:
+                self._misses += 1
+            self._lease_wait_total += waited
+            self._lease_wait_max = max(self._lease_wait_max, waited)
+            for i, bound in enumerate(LEASE_WAIT_BUCKETS):
+                if waited <= bound:
+                    self._lease_wait_buckets[i] += 1
+                    break
+            else:
+                self._lease_wait_buckets[-1] += 1
+
+    def _start_kernel(self) -> PooledKernel:
+        started = time.monotonic()
+        km = KernelManager(kernel_name=self.kernel_name)
+        km.start_kernel()
+        kc = km.client()
+        try:
+            kc.start_channels()
+            KERNEL_START_SECONDS.observe(time.monotonic() - started)
+            with KERNEL_READY_SECONDS.time():
+                kc.wait_for_ready(timeout=self.ready_timeout)
+            kernel = PooledKernel(km, kc)
+            if self.warmup_code:
+                self._run_silent(kernel, self.warmup_code)
+            return kernel
+        except Exception:
+            try:
+                kc.stop_channels()
+            finally:
+                km.shutdown_kernel(now=True)
+            raise
+
+    def _run_silent(self, kernel: PooledKernel, code: str) -> bool:
+        """Run bookkeeping code on a kernel, returning whether it finished cleanly"""
+        kc = kernel.kc
+        msg_id = kc.execute(code, silent=True, store_history=False)
+        reply = kc.get_shell_msg(timeout=self.ready_timeout)
+        while reply['parent_header'].get('msg_id') != msg_id:
+            reply = kc.get_shell_msg(timeout=self.ready_timeout)
+        # Drain whatever the execution published so the next lease starts clean
+        while True:
+            try:
+                kc.get_iopub_msg(timeout=0.05)
+            except Exception:
+                break
+        return reply['content'].get('status') == 'ok'
+
+    def _reset_namespace(self, kernel: PooledKernel) -> bool:
+        try:
+            if not self._run_silent(kernel, RESET_NAMESPACE_CODE):
+                return False
+            # The aggressive reset drops the modules imported since kernel start, so preload them again
+            # before the next lease instead of letting its own code import them first
+            return not self.warmup_code or self._run_silent(kernel, self.warmup_code)
+        except Exception:
+            return False
+
+    def _refill_loop(self):
+        while True:
+            with self._cond:
+                while self._running and not (len(self._idle) < self.min_size and self._total < self.max_size):
+                    self._cond.wait(1.0)
+                if not self._running:
+                    return
+                self._total += 1
+
+            try:
+                kernel = self._start_kernel()
+            except Exception as e:
+                print(f"Kernel pool refill failed: {str(e)}")
+                with self._cond:
+                    self._total -= 1
+                    self._start_failures += 1
+                # Back off before retrying so a broken kernel spec does not spin
+                time.sleep(1.0)
+                continue
+
+            with self._cond:
+                if self._running:
+                    self._idle.append(kernel)
+                    self._cond.notify_all()
+                    continue
+                self._total -= 1
+            self._shutdown_kernel(kernel)
+
+    def _dispose(self, kernel: PooledKernel):
+        self._shutdown_kernel(kernel)
+        with self._cond:
+            self._total -= 1
+            self._cond.notify_all()
+
+    @staticmethod
+    def _shutdown_kernel(kernel: PooledKernel):
+        try:
+            kernel.kc.stop_channels()
+        except:
+            pass
+        try:
+            kernel.km.shutdown_kernel(now=True)
+        except:
+            pass
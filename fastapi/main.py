@@ -1,21 +1,55 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from jupyter_client import KernelManager
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Callable
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
+import threading
 import os
-import uuid
-import base64
+import queue
+import time
+import hashlib
 import json
-import re
-import ast
+import logging
 import numpy as np
-from sklearn.neural_network import MLPClassifier
-from sklearn.preprocessing import MinMaxScaler
-import skfuzzy as fuzz
-from skfuzzy import control as ctrl
+# sklearn is heavy and only needed by some classification methods,
+# they are imported on first use through startup_profile.lazy_import
+from startup_profile import startup_profile, HEAVY_MODULES, IMPORT_ONLY_ENV
+from kernel_pool import KernelPool
+from preflight import preflight, preflight_stats, skipped_test_outputs, warm_up as warm_up_preflight
+from image_store import ImageStore
+from service_metrics import CLASSIFY_SECONDS
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+from request_tracing import start_request_trace, trace_span, code_fingerprint, stop_trace_logging
+from topsis_engine import (calculate_topsis_batch, topsis_calculation_details, calculate_topsis_cohort,
+                           cohort_calculation_details, SINGLE_ROW_VARIATION)
+from result_cache import ResultCache, make_cache_key, is_cacheable
+from classification_store import ClassificationStore, group_fingerprint, cohort_fingerprint
+from classification_jobs import ClassificationJobManager, TooManyJobs
+from neural_classifier import load_model as load_neural_model, features_matrix, METRIC_COLUMNS
+from fuzzy_engine import calculate_fuzzy_batch, fuzzy_calculation_details
+from test_harness import TestCaseCompiler, build_test_cell, PRELOAD_CODE as TEST_HARNESS_PRELOAD_CODE
+from dataset_catalog import get_catalog as get_dataset_catalog, start_background_build as build_dataset_catalog
+from execution_limits import (
+    ExecutionLimits, ExecutionCancelled, ExecutionTimeout, KernelDied, OutputBudget,
+    get_execution_limits, apply_kernel_rlimits
+)
+from code_executor import CodeExecutor, OutputList, POLL_SECONDS
+from fork_executor import ForkServerExecutor, DEFAULT_PRELOAD as FORK_SERVER_DEFAULT_PRELOAD
+from execution_scheduler import ExecutionScheduler, SchedulerOverloaded
+from sandbox_runs import SandboxRunTracker, RunSuperseded
 
 app = FastAPI()
 
+# Request-path events; per-request traces go to codeasy.trace (see request_tracing)
+logger = logging.getLogger("codeasy")
+
+startup_profile.mark("main_imported")
+
+# Only the import graph is being profiled (see startup_profile.importtime_report): no stores, no startup work
+IMPORT_ONLY = os.getenv(IMPORT_ONLY_ENV) == "1"
+
 class CodeInput(BaseModel):
     code: str
     testcases: Optional[List[str]] = None
@@ -24,6 +58,10 @@ class CodeInput(BaseModel):
     question_id: Optional[int] = None
     student_id: Optional[int] = None  # Add student ID for isolation
 
+class BatchTestInput(BaseModel):
+    jobs: List[CodeInput]
+    parallelism: Optional[int] = None  # Defaults to BATCH_MAX_PARALLELISM
+
 class QuestionData(BaseModel):
     question_id: int
     question_name: str
@@ -42,6 +80,8 @@ class StudentData(BaseModel):
 class ClassificationRequest(BaseModel):
     student_data: List[StudentData]
     classification_type: str = "topsis"
+    # Only recompute materials whose metrics changed since the last incremental run
+    incremental: bool = False
 
 class ClassificationResult(BaseModel):
     user_id: int
@@ -52,474 +92,934 @@ class ClassificationResult(BaseModel):
 
 class ClassificationResponse(BaseModel):
     classifications: List[ClassificationResult]
+    # Incremental mode only: {user_id, material_id} of the entries recomputed and reused
+    recomputed: Optional[List[Dict[str, Any]]] = None
+    reused: Optional[List[Dict[str, Any]]] = None
 
 # Function to count variables and functions in Python code
 def analyze_code_complexity(code: str):
-    try:
-        # Parse the code into an abstract syntax tree
-        tree = ast.parse(code)
-        
-        # Initialize counters
-        variable_count = 0
-        function_count = 0
-        
-        # Keep track of variable names to avoid counting duplicates
-        variable_names = set()
-        
-        # Count variable assignments and function definitions
-        for node in ast.walk(tree):
-            # Count variable assignments
-            if isinstance(node, ast.Assign):
-                for target in node.targets:
-                    # Handle simple variable assignments (a = 1)
-                    if isinstance(target, ast.Name):
-                        if target.id not in variable_names:
-                            variable_names.add(target.id)
-                            variable_count += 1
-                    # Handle tuple unpacking assignments (a, b, c = 1, 2, 3)
-                    elif isinstance(target, ast.Tuple):
-                        for elt in target.elts:
-                            if isinstance(elt, ast.Name):
-                                if elt.id not in variable_names:
-                                    variable_names.add(elt.id)
-                                    variable_count += 1
-            
-            # Count variable declarations in for loops
-            elif isinstance(node, ast.For):
-                # Handle simple loop variable (for i in range(10))
-                if isinstance(node.target, ast.Name):
-                    if node.target.id not in variable_names:
-                        variable_names.add(node.target.id)
-                        variable_count += 1
-                # Handle tuple unpacking in loops (for i, j in enumerate(items))
-                elif isinstance(node.target, ast.Tuple):
-                    for elt in node.target.elts:
-                        if isinstance(elt, ast.Name):
-                            if elt.id not in variable_names:
-                                variable_names.add(elt.id)
-                                variable_count += 1
-            
-            # Count function definitions
-            elif isinstance(node, ast.FunctionDef):
-                function_count += 1
-        
-        return {
-            "variable_count": variable_count,
-            "function_count": function_count
-        }
-    except SyntaxError:
-        # If code has syntax errors, return default values
-        return {
-            "variable_count": 0,
-            "function_count": 0
-        }
+    # Counts come from the cached pre-flight parse; code with syntax errors counts as 0/0
+    result = preflight(code)
+    return {
+        "variable_count": result.variable_count,
+        "function_count": result.function_count
+    }
 
-# Function to strip ANSI color codes
-def strip_ansi_codes(text):
-    ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
-    return ansi_escape.sub('', text)
+class JupyterKernelManager(CodeExecutor):
+    """Executes requests in Jupyter kernels leased from a pool of pre-started kernels"""
 
-# Function to format error message
-def format_error_message(traceback_text):
-    # Strip ANSI color codes
-    clean_text = strip_ansi_codes(traceback_text)
-    
-    # Split into lines for better formatting
-    lines = clean_text.split('\n')
-    
-    # Format the traceback to be more readable
-    formatted_lines = [line.rstrip() for line in lines if line.rstrip()]
-    return '\n'.join(formatted_lines)
-
-# Function to detect input() usage in code
-def contains_input_function(code):
-    # Check for input() call patterns using regex
-    input_pattern = re.compile(r'(?<![a-zA-Z0-9_])input\s*\(')
-    return bool(input_pattern.search(code))
-
-class JupyterKernelManager:
-    def __init__(self):
-        # Remove shared kernel - we'll create per-request kernels
-        pass
-
-    def execute_code_isolated(self, code: str, is_sandbox: bool = False, student_id: Optional[int] = None):
-        """Execute code in an isolated kernel instance to prevent student interference"""
-        outputs = []
-        
-        # Check for input() usage and reject if found
-        if contains_input_function(code):
-            outputs.append({
-                "type": "error",
-                "error_type": "InputFunctionNotSupported",
-                "error_msg": "The input() function is not supported in the sandbox environment",
-                "content": "The Python sandbox doesn't support interactive input. Please modify your code to use hardcoded values instead of input() calls.\n\nExample:\n# Instead of: name = input('Enter your name: ')\n# Use: name = 'John'  # hardcoded value"
-            })
-            return outputs
-        
-        # Create a new isolated kernel for this request
-        km = None
-        kc = None
+    backend = "jupyter"
+
+    def __init__(self, pool: KernelPool, image_store: ImageStore):
+        super().__init__(image_store)
+        # Kernels are leased from a pool of pre-started kernels instead of being cold-started per request
+        self.pool = pool
+
+    def start(self):
+        self.pool.start()
+
+    def shutdown(self):
+        self.pool.shutdown()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.backend, **self.pool.stats()}
+
+    def _acquire(self, student_id: Optional[int], limits: ExecutionLimits):
+        kernel = self.pool.lease(student_id)
+        apply_kernel_rlimits(kernel.pid, limits)
+        return kernel
+
+    def _release(self, kernel, dirty: bool):
+        self.pool.release(kernel, dirty=dirty)
+
+    def _run_cell(self, kernel, code: str, outputs: List[Dict[str, Any]], is_sandbox: bool, student_id: Optional[int],
+                  limits: ExecutionLimits, deadline: float, image_writes: List[Any],
+                  cancel: Optional[threading.Event] = None, is_test_cell: bool = False):
+        """Execute a single cell and append its parsed iopub output to outputs"""
+        kc = kernel.client
+        budget = OutputBudget(limits)
+        # stop_on_error=False: an error in one cell must not abort the cells queued after it
+        msg_id = kc.execute(code, stop_on_error=False)
         
         try:
-            # Create fresh kernel instance
-            km = KernelManager(kernel_name='python3')
-            km.start_kernel()
-            kc = km.client()
-            kc.start_channels()
-            
-            # Wait for kernel to be ready
-            kc.wait_for_ready(timeout=30)
-            
-            # Execute the code in the isolated kernel
-            msg_id = kc.execute(code)
-            
             while True:
-                msg = kc.get_iopub_msg(timeout=10)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._interrupt(kernel, msg_id)
+                    raise ExecutionTimeout(f"Execution exceeded the time limit of {limits.wall_time:g} seconds and was stopped")
+                if cancel is not None and cancel.is_set():
+                    self._interrupt(kernel, msg_id)
+                    raise ExecutionCancelled("Execution was cancelled and stopped")
+                
+                try:
+                    msg = kc.get_iopub_msg(timeout=min(remaining, POLL_SECONDS))
+                except queue.Empty:
+                    # A kernel killed by its CPU or memory limit never goes idle
+                    if not kernel.is_alive():
+                        raise KernelDied("The kernel stopped unexpectedly, most likely because the code exceeded its CPU or memory limit")
+                    continue
+                
+                # Ignore messages left over from other executions on this kernel
+                if msg['parent_header'].get('msg_id') != msg_id:
+                    continue
                 msg_type = msg['msg_type']
                 content = msg['content']
-
-                if msg_type == 'stream':
-                    # Split stream outputs by newlines to separate print statements
-                    text_content = content['text'].strip()
-                    if text_content:
-                        lines = text_content.split('\n')
-                        for line in lines:
-                            if line.strip():  # Only add non-empty lines
-                                outputs.append({
-                                    "type": "text",
-                                    "content": line.strip()
-                                })
-                elif msg_type in ['display_data', 'execute_result']:
-                    if 'image/png' in content.get('data', {}):
-                        image_data = content['data']['image/png']
-                        # Add student_id and sandbox prefix for file isolation
-                        prefix = f"sandbox_{student_id}_" if is_sandbox else f"visual_{student_id}_"
-                        image_filename = f"{prefix}{uuid.uuid4().hex}.png"
-
-                        # Create visualization directory if it doesn't exist
-                        visualization_dir = "/var/www/html/storage/app/public/visualizations"
-                        if not os.path.exists(visualization_dir):
-                            os.makedirs(visualization_dir, exist_ok=True)
-
-                        image_path = f"/var/www/html/storage/app/public/visualizations/{image_filename}"
-                        
-                        # Decode base64 image data correctly
-                        image_bytes = base64.b64decode(image_data)
-                        with open(image_path, 'wb') as f:
-                            f.write(image_bytes)
-                        
-                        outputs.append({
-                            "type": "image",
-                            "content": f"/storage/visualizations/{image_filename}",
-                            "is_temporary": is_sandbox
-                        })
-                    elif 'text/plain' in content.get('data', {}):
-                        outputs.append({
-                            "type": "text",
-                            "content": content['data']['text/plain']
-                        })
-
-                elif msg_type == 'error':
-                    # Check for EOFError specifically to provide a better message
-                    if "EOFError" in content.get('ename', '') and "reading a line" in content.get('evalue', ''):
-                        outputs.append({
-                            "type": "error",
-                            "content": "The input() function is not supported in this environment. Please modify your code to use hardcoded values instead.",
-                            "error_type": "InputFunctionNotSupported",
-                            "error_msg": "Interactive input is not supported"
-                        })
-                    else:
-                        # Format the error message properly
-                        error_content = format_error_message('\n'.join(content['traceback']))
-                        outputs.append({
-                            "type": "error",
-                            "content": error_content,
-                            "error_type": content.get('ename', 'Error'),
-                            "error_msg": content.get('evalue', '')
-                        })
+                self._append_message(msg_type, content, outputs, budget, is_sandbox, student_id, image_writes,
+                                     is_test_cell)
 
                 if msg_type == 'status' and content['execution_state'] == 'idle':
                     break
+        finally:
+            marker = budget.truncation_marker()
+            if marker:
+                outputs.append(marker)
+
+    def _interrupt(self, kernel, msg_id: str, grace: float = 2.0):
+        """Interrupt a runaway execution and wait briefly for the kernel to settle"""
+        try:
+            kernel.km.interrupt_kernel()
+            grace_deadline = time.monotonic() + grace
+            while time.monotonic() < grace_deadline:
+                msg = kernel.client.get_iopub_msg(timeout=max(0.01, grace_deadline - time.monotonic()))
+                if (msg['parent_header'].get('msg_id') == msg_id and msg['msg_type'] == 'status'
+                        and msg['content']['execution_state'] == 'idle'):
+                    break
+        except Exception:
+            # The kernel is recycled after a timeout anyway, which restarts it
+            pass
+
+kernel_pool = KernelPool(
+    min_size=int(os.getenv("KERNEL_POOL_MIN_SIZE", "2")),
+    max_size=int(os.getenv("KERNEL_POOL_MAX_SIZE", "8")),
+    max_uses=int(os.getenv("KERNEL_POOL_MAX_USES", "1")),
+    ready_timeout=float(os.getenv("KERNEL_POOL_READY_TIMEOUT", "30")),
+    lease_timeout=float(os.getenv("KERNEL_POOL_LEASE_TIMEOUT", "60")),
+    # The test harness is imported into every kernel before it is leased
+    warmup_code="\n".join(filter(None, [TEST_HARNESS_PRELOAD_CODE, os.getenv("KERNEL_POOL_WARMUP_CODE", "")]))
+)
+# Visualizations are written in the background, deduplicated by content and garbage collected
+image_store = ImageStore(
+    directory=os.getenv("VISUALIZATION_DIR", "/var/www/html/storage/app/public/visualizations"),
+    url_prefix=os.getenv("VISUALIZATION_URL_PREFIX", "/storage/visualizations"),
+    writer_threads=int(os.getenv("VISUALIZATION_WRITER_THREADS", "2")),
+    recompress=os.getenv("VISUALIZATION_RECOMPRESS", "false").lower() in ("1", "true", "yes"),
+    max_dimension=int(os.getenv("VISUALIZATION_MAX_DIMENSION", "0")),
+    temporary_ttl=float(os.getenv("VISUALIZATION_TEMPORARY_TTL", str(2 * 24 * 3600))),
+    temporary_quota_bytes=int(float(os.getenv("VISUALIZATION_TEMPORARY_QUOTA_MB", "0")) * 1024 * 1024),
+    gc_interval=float(os.getenv("VISUALIZATION_GC_INTERVAL", "600"))
+)
+
+# Execution backend: "jupyter" (pooled kernels) or "forkserver" (children forked from a preloaded zygote)
+EXECUTOR_BACKEND = os.getenv("EXECUTOR_BACKEND", "jupyter").lower()
+if EXECUTOR_BACKEND == "forkserver":
+    kernel_mgr = ForkServerExecutor(
+        image_store,
+        preload=os.getenv("FORK_SERVER_PRELOAD", FORK_SERVER_DEFAULT_PRELOAD),
+        socket_path=os.getenv("FORK_SERVER_SOCKET") or None,
+        start_timeout=float(os.getenv("FORK_SERVER_START_TIMEOUT", "60"))
+    )
+elif EXECUTOR_BACKEND == "jupyter":
+    kernel_mgr = JupyterKernelManager(kernel_pool, image_store)
+else:
+    raise ValueError(f"Unknown EXECUTOR_BACKEND {EXECUTOR_BACKEND!r}, expected 'jupyter' or 'forkserver'")
+
+# Compiled test cases per (question_id, test case hash), shipped to the kernels with each test run
+test_case_compiler = TestCaseCompiler(max_entries=int(os.getenv("TEST_HARNESS_CACHE_SIZE", "2048")))
+# Request types whose test suites stop at the first failing test case. Off by default: sync and test
+# results are stored as the student's passed_test_case_ids, which must include every passing test case
+TEST_FAIL_FAST_TYPES = {t.strip() for t in os.getenv("TEST_FAIL_FAST_TYPES", "").split(",") if t.strip()}
+
+# Bounded executors so blocking kernel I/O and classification math never run on the event loop.
+# Their sizes are the hard concurrency limits for each kind of work.
+EXECUTION_CONCURRENCY = int(os.getenv("EXECUTION_CONCURRENCY", os.getenv("KERNEL_POOL_MAX_SIZE", "8")))
+CLASSIFICATION_CONCURRENCY = int(os.getenv("CLASSIFICATION_CONCURRENCY", "2"))
+execution_executor = ThreadPoolExecutor(
+    max_workers=EXECUTION_CONCURRENCY,
+    thread_name_prefix="execution"
+)
+classification_executor = ThreadPoolExecutor(
+    max_workers=CLASSIFICATION_CONCURRENCY,
+    thread_name_prefix="classification"
+)
+
+# Executions queue here per request type instead of in the executor, so sandbox runs are not stuck behind a re-sync
+execution_scheduler = ExecutionScheduler(EXECUTION_CONCURRENCY)
 
+# A new sandbox run cancels the in-flight run of the same student and question, identical ones are shared
+SANDBOX_LATEST_WINS = os.getenv("SANDBOX_LATEST_WINS", "true").lower() in ("1", "true", "yes")
+sandbox_runs = SandboxRunTracker()
+
+async def run_blocking(executor: ThreadPoolExecutor, func, *args, **kwargs):
+    """Run a blocking function on one of the bounded executors and await its result"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+# Import the classification libraries in the background after startup instead of on the first request
+CLASSIFICATION_WARMUP = os.getenv("CLASSIFICATION_WARMUP", "false").lower() in ("1", "true", "yes")
+
+# Convert the datasource/ files into the memory-mapped cache kernels load them from (see dataset_catalog.py)
+DATASET_CATALOG_PREBUILD = os.getenv("DATASET_CATALOG_PREBUILD", "true").lower() in ("1", "true", "yes")
+
+# Trained model for classification_type="neural" (see train_neural_classifier.py)
+NEURAL_MODEL_PATH = os.getenv("NEURAL_MODEL_PATH", "models/neural_classifier.joblib")
+neural_model = None
+
+@app.on_event("startup")
+def start_kernel_pool():
+    global neural_model
+    if IMPORT_ONLY:
+        return
+    startup_profile.mark("app_startup_begin")
+    warm_up_preflight()
+    kernel_mgr.start()
+    image_store.start()
+    try:
+        neural_model = load_neural_model(NEURAL_MODEL_PATH)
+        if neural_model:
+            print(f"🧠 Loaded neural classifier from {NEURAL_MODEL_PATH} ({neural_model.metadata.get('samples')} samples)")
+    except Exception as e:
+        print(f"Could not load neural classifier from {NEURAL_MODEL_PATH}: {str(e)}")
+    if CLASSIFICATION_WARMUP:
+        startup_profile.start_warmup(HEAVY_MODULES)
+    if DATASET_CATALOG_PREBUILD:
+        try:
+            build_dataset_catalog()
         except Exception as e:
-            outputs.append({
-                "type": "error",
-                "content": str(e),
-                "error_type": type(e).__name__,
-                "error_msg": str(e)
-            })
-        finally:
-            # Always clean up the kernel to prevent resource leaks
-            if kc:
-                try:
-                    kc.stop_channels()
-                except:
-                    pass
-            if km:
-                try:
-                    km.shutdown_kernel()
-                except:
-                    pass
+            print(f"Could not start the dataset catalog build: {str(e)}")
+    startup_profile.mark("app_startup_complete")
 
-        return outputs
+@app.on_event("shutdown")
+def stop_kernel_pool():
+    if IMPORT_ONLY:
+        return
+    kernel_mgr.shutdown()
+    image_store.shutdown()
+    stop_trace_logging()
+    execution_executor.shutdown(wait=False, cancel_futures=True)
+    classification_executor.shutdown(wait=False, cancel_futures=True)
 
-kernel_mgr = JupyterKernelManager()
+@app.get("/kernel-pool/stats")
+async def kernel_pool_stats():
+    # Kept for existing dashboards; reports whichever execution backend is active, like /executor/stats
+    return kernel_mgr.stats()
+
+@app.get("/scheduler/stats")
+async def scheduler_stats():
+    return execution_scheduler.stats()
+
+@app.get("/sandbox-runs/stats")
+async def sandbox_runs_stats():
+    return {"enabled": SANDBOX_LATEST_WINS, **sandbox_runs.stats()}
+
+@app.get("/executor/stats")
+async def executor_stats():
+    return kernel_mgr.stats()
+
+@app.get("/metrics")
+async def metrics():
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/preflight/stats")
+async def preflight_cache_stats():
+    return preflight_stats()
+
+@app.get("/image-store/stats")
+async def image_store_stats():
+    return image_store.stats()
+
+@app.get("/test-harness/stats")
+async def test_harness_stats():
+    return test_case_compiler.stats()
+
+@app.get("/datasets")
+async def dataset_catalog_stats():
+    # Walks and stats the datasource and cache directories
+    return await run_blocking(classification_executor, get_dataset_catalog().stats)
+
+@app.get("/debug/startup")
+async def startup_report(importtime: bool = False, refresh: bool = False, top: int = 30):
+    """Time-to-ready breakdown; importtime=true adds a `python -X importtime` profile of `import main`"""
+    report = startup_profile.report()
+    report["executor_backend"] = kernel_mgr.backend
+    report["executor"] = kernel_mgr.stats()
+    if importtime:
+        report["importtime"] = await run_blocking(
+            classification_executor, startup_profile.importtime_report, "main", top, refresh
+        )
+    return report
+
+# Optional cache of /test results keyed by a hash of the normalized code, test cases and type
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+result_cache = ResultCache(
+    max_entries=int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "5000")),
+    ttl=float(os.getenv("RESULT_CACHE_TTL", str(24 * 3600))),
+    path=None if IMPORT_ONLY else os.getenv("RESULT_CACHE_PATH", "cache/test_results.sqlite3") or None
+) if RESULT_CACHE_ENABLED else None
+
+@app.get("/result-cache/stats")
+async def result_cache_stats():
+    if not result_cache:
+        return {"enabled": False}
+    return {"enabled": True, **result_cache.stats()}
+
+# Function to build the unittest suite that runs the test cases against the student code
+def build_test_code(code: str, testcases: List[str], testcase_ids: Optional[List[int]] = None,
+                    question_id: Optional[int] = None, test_case_timeout: float = 0, fail_fast: bool = False):
+    # The test suite runs in the same kernel session right after the student code,
+    # so the student's functions and variables are available to the test cases.
+    # The preloaded harness receives the tests as data and publishes test_stats itself.
+    payload = test_case_compiler.build_payload(code, testcases, testcase_ids, question_id,
+                                               timeout=test_case_timeout, fail_fast=fail_fast)
+    return build_test_cell(payload)
 
 @app.post("/test")
-async def test_code(input: CodeInput):
+async def test_code(input: CodeInput, response: Response):
     try:
-        is_sandbox = input.type == "sandbox"
-        
-        # Simple console logging for request tracking
-        print("=" * 80)
-        print(f"📝 FASTAPI REQUEST - Student ID: {input.student_id or 'unknown'}")
-        print(f"🔧 Type: {input.type or 'normal'}")
-        print(f"❓ Question ID: {input.question_id or 'unknown'}")
-        print(f"📄 Code Length: {len(input.code)} characters")
-        print(f"🧪 Test Cases Count: {len(input.testcases) if input.testcases else 0}")
-        print(f"💻 Student Code:")
-        print("-" * 40)
-        print(input.code)
-        print("-" * 40)
-        if input.testcases:
-            print(f"🧪 Test Cases:")
-            for i, tc in enumerate(input.testcases):
-                print(f"  Test {i+1}: {tc}")
-        print("=" * 80)
-        
-        # Analyze code complexity
-        code_analysis = analyze_code_complexity(input.code)
-        
-        # Execute the code with proper isolation using student_id
-        outputs = kernel_mgr.execute_code_isolated(
-            input.code, 
-            is_sandbox, 
-            input.student_id
+        outputs, cache_status = await execute_test_request(input)
+        # hit, miss, bypass or coalesced (joined an identical sandbox run in flight)
+        response.headers["X-Result-Cache"] = cache_status
+        return outputs
+    except SchedulerOverloaded as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except RunSuperseded as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        logger.exception("Test request failed", extra={"student_id": input.student_id, "question_id": input.question_id})
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def execute_test_request(input: CodeInput):
+    """Serve a /test request from the result cache or execute it, returning (outputs, cache_status)"""
+    if is_tracked_sandbox_run(input):
+        run, joined = sandbox_runs.submit(
+            sandbox_run_key(input),
+            make_cache_key(input.code, input.testcases, input.testcase_ids, input.type),
+            lambda cancel: execution_scheduler.run(input.type, execution_executor, run_test_request, input, None, cancel)
         )
-        
-        # Add code complexity metrics
+        return await run.result(), "coalesced" if joined else "bypass"
+
+    if not result_cache or input.type == "sandbox":
+        return await execution_scheduler.run(input.type, execution_executor, run_test_request, input), "bypass"
+    
+    cache_key = make_cache_key(input.code, input.testcases, input.testcase_ids, input.type)
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        logger.info("Result cache hit", extra={"student_id": input.student_id, "question_id": input.question_id})
+        return cached, "hit"
+    
+    outputs = await execution_scheduler.run(input.type, execution_executor, run_test_request, input)
+    if is_cacheable(input.type, outputs):
+        result_cache.set(cache_key, outputs)
+    return outputs, "miss"
+
+def is_tracked_sandbox_run(input: CodeInput) -> bool:
+    return SANDBOX_LATEST_WINS and input.type == "sandbox" and input.student_id is not None
+
+def sandbox_run_key(input: CodeInput):
+    return (input.student_id, input.question_id)
+
+BATCH_MAX_JOBS = int(os.getenv("BATCH_MAX_JOBS", "1000"))
+BATCH_MAX_PARALLELISM = int(os.getenv("BATCH_MAX_PARALLELISM", str(EXECUTION_CONCURRENCY)))
+
+@app.post("/test/batch")
+async def test_code_batch(input: BatchTestInput):
+    """Run many /test jobs in parallel, streaming one JSON line per job as it finishes"""
+    if len(input.jobs) > BATCH_MAX_JOBS:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds the maximum of {BATCH_MAX_JOBS} jobs")
+    
+    parallelism = min(input.parallelism or BATCH_MAX_PARALLELISM, BATCH_MAX_PARALLELISM)
+    parallelism = max(1, parallelism)
+    
+    logger.info("Batch request", extra={"jobs": len(input.jobs), "parallelism": parallelism})
+    
+    return StreamingResponse(
+        stream_batch_results(input.jobs, parallelism),
+        media_type="application/x-ndjson"
+    )
+
+async def stream_batch_results(jobs: List[CodeInput], parallelism: int):
+    semaphore = asyncio.Semaphore(parallelism)
+    
+    async def run_job(index: int, job: CodeInput):
+        async with semaphore:
+            result = {
+                "index": index,
+                "student_id": job.student_id,
+                "question_id": job.question_id,
+                "key": f"{job.student_id}:{job.question_id}"
+            }
+            try:
+                result["status"] = "ok"
+                while True:
+                    try:
+                        result["outputs"], result["cache"] = await execute_test_request(job)
+                        break
+                    except SchedulerOverloaded as e:
+                        # The batch is already bounded by its parallelism, so wait for room instead of failing the job
+                        await asyncio.sleep(e.retry_after)
+            except Exception as e:
+                logger.exception("Batch job failed", extra={"student_id": job.student_id, "question_id": job.question_id})
+                result["status"] = "error"
+                result["error"] = str(e)
+                result["outputs"] = []
+            return result
+    
+    tasks = [asyncio.create_task(run_job(i, job)) for i, job in enumerate(jobs)]
+    try:
+        # Yield results in completion order so the caller can process them as they arrive
+        for next_result in asyncio.as_completed(tasks):
+            result = await next_result
+            yield json.dumps(result) + "\n"
+    finally:
+        # Client went away: don't start jobs nobody will read
+        for task in tasks:
+            task.cancel()
+
+@app.post("/test/stream")
+async def test_code_stream(input: CodeInput):
+    """Server-Sent Events variant of /test: one `output` event per output item as it arrives"""
+    # Rejected before the stream starts, so overload is still a plain 429
+    try:
+        execution_scheduler.admit(input.type)
+    except SchedulerOverloaded as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    return StreamingResponse(
+        stream_test_events(input),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Function to format a single Server-Sent Event
+def format_sse(event: str, data: Dict[str, Any]):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def stream_test_events(input: CodeInput):
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    
+    # Called from the execution thread, hand each item over to the event loop
+    def on_output(item):
+        loop.call_soon_threadsafe(queue.put_nowait, item)
+    
+    run = None
+    if is_tracked_sandbox_run(input):
+        # Output already streamed can't be shared, so a stream supersedes but never joins another run
+        run, _ = sandbox_runs.submit(
+            sandbox_run_key(input),
+            make_cache_key(input.code, input.testcases, input.testcase_ids, input.type),
+            lambda cancel: execution_scheduler.run(input.type, execution_executor, run_test_request, input,
+                                                   on_output, cancel),
+            coalesce=False
+        )
+        future = run.task
+    else:
+        future = asyncio.ensure_future(
+            execution_scheduler.run(input.type, execution_executor, run_test_request, input, on_output)
+        )
+    # Items are queued with call_soon_threadsafe before the future resolves, so None always comes last
+    future.add_done_callback(lambda _: queue.put_nowait(None))
+    
+    while True:
+        item = await queue.get()
+        if item is None:
+            break
+        yield format_sse("output", item)
+    
+    if run is not None and run.superseded:
+        yield format_sse("error", {"detail": str(RunSuperseded())})
+    else:
+        try:
+            future.result()
+        except Exception as e:
+            logger.exception("Streamed test request failed",
+                             extra={"student_id": input.student_id, "question_id": input.question_id})
+            yield format_sse("error", {"detail": str(e)})
+    
+    yield format_sse("end", {})
+
+# Function to execute a /test request; blocking, runs on the execution executor.
+# on_output, when given, receives every response item as soon as it is available; setting cancel stops it.
+def run_test_request(input: CodeInput, on_output: Optional[Callable[[Dict[str, Any]], None]] = None,
+                     cancel: Optional[threading.Event] = None):
+    # One structured trace record per request instead of printing the full code
+    with start_request_trace(
+        "test_request",
+        student_id=input.student_id,
+        question_id=input.question_id,
+        type=input.type or "normal",
+        testcase_count=len(input.testcases) if input.testcases else 0,
+        **code_fingerprint(input.code)
+    ) as trace:
+        try:
+            outputs = execute_traced_test_request(input, on_output, cancel)
+        except Exception as e:
+            # Requests that fail with an exception are the ones the trace matters most for
+            trace.set(exception_type=type(e).__name__, exception=str(e))
+            trace.finish("error", payload={"code": input.code, "testcases": input.testcases or []})
+            raise
+        
+        error_types = sorted({output.get('error_type') or 'unknown' for output in outputs if output.get('type') == 'error'})
+        if "ExecutionTimeout" in error_types:
+            outcome = "timeout"
+        elif "InputFunctionNotSupported" in error_types:
+            outcome = "rejected"
+        elif error_types:
+            outcome = "error"
+        else:
+            outcome = "ok"
+        trace.set(
+            outputs=len(outputs),
+            error_types=error_types,
+            test_stats=next(({"success": output.get('success', 0), "total_tests": output.get('total_tests', 0)}
+                             for output in outputs if output.get('type') == 'test_stats'), None)
+        )
+        # Full code and test cases only for sampled requests and failures
+        trace.finish(outcome, payload={"code": input.code, "testcases": input.testcases or []})
+    return outputs
+
+def execute_traced_test_request(input: CodeInput, on_output: Optional[Callable[[Dict[str, Any]], None]] = None,
+                                cancel: Optional[threading.Event] = None):
+    is_sandbox = input.type == "sandbox"
+    
+    # Everything appended to the student code's output list is streamed, including the
+    # code_metrics/test_stats/test_result items added below. The raw test suite output is not.
+    stream_code_output = None
+    if on_output:
+        stream_code_output = lambda cell, item: on_output(item) if cell == 0 else None
+    
+    # Analyze code complexity
+    with trace_span("analyze"):
+        code_analysis = analyze_code_complexity(input.code)
+        syntax_error = preflight(input.code).syntax_error
+    
+    if syntax_error:
+        # Code that does not compile is answered without leasing a kernel
+        outputs = OutputList(on_output)
+        outputs.append(dict(syntax_error))
+        if input.testcases:
+            for item in skipped_test_outputs(input.testcases, f"{syntax_error['error_type']} in the submitted code",
+                                             input.testcase_ids):
+                outputs.append(item)
         outputs.append({
             "type": "code_metrics",
             "variable_count": code_analysis["variable_count"],
             "function_count": code_analysis["function_count"]
         })
-        
-        if input.testcases:
-            # Build complete test code that runs in a single isolated kernel
-            # This ensures all test setup, test methods, and execution happen in the same context
-            
-            # Escape the student code properly
-            escaped_code = input.code.replace("\\", "\\\\").replace("'", "\\'").replace('"', '\\"')
-            
-            # Build test methods dynamically with tracking
-            test_methods = []
-            test_case_ids = input.testcase_ids if input.testcase_ids else list(range(len(input.testcases)))
-            
-            for i, tc in enumerate(input.testcases):
-                test_case_id = test_case_ids[i] if i < len(test_case_ids) else i
-                test_method = f"""
-    def test_{i}(self):
-        # The test case can access student_code directly
-        # student_code contains the raw code as a string for string-based assertions
-        global passed_test_case_ids
-        try:
-            {tc}
-            # If test passes, record the test case ID
-            passed_test_case_ids.append({test_case_id})
-        except Exception as e:
-            # Test failed, don't add to passed list
-            raise e"""
-                test_methods.append(test_method)
-            
-            # Combine all test code into a single execution block
-            complete_test_code = f"""
-import unittest
-import io
-import sys
-import json
-
-# Global list to track passed test case IDs
-passed_test_case_ids = []
-
-# Store student code in a variable for tests to access
-student_code = '''{escaped_code}'''
-
-class TestUserCode(unittest.TestCase):
-{''.join(test_methods)}
-
-# Run tests
-stream = io.StringIO()
-runner = unittest.TextTestRunner(stream=stream)
-result = runner.run(unittest.makeSuite(TestUserCode))
-
-# Combine test stats and results
-test_output = stream.getvalue()
-combined_results = {{
-    "stats": {{
-        "type": "test_stats", 
-        "total_tests": result.testsRun,
-        "success": result.testsRun - len(result.failures) - len(result.errors),
-        "fail": len(result.failures) + len(result.errors),
-        "passed_test_case_ids": passed_test_case_ids
-    }},
-    "results": {{
-        "type": "test_result",
-        "status": "passed" if result.wasSuccessful() else "failed",
-        "content": test_output
-    }}
-}}
-
-# Print as single JSON string
-print("TEST_OUTPUT:" + json.dumps(combined_results))
-"""
-            
-            # Execute all test code in a single isolated kernel
-            test_outputs = kernel_mgr.execute_code_isolated(complete_test_code, is_sandbox, input.student_id)
-            
-            # Process outputs
-            test_stats = None
-            for output in test_outputs:
-                if output['type'] == 'text' and output['content'].startswith('TEST_OUTPUT:'):
-                    results = json.loads(output['content'][12:])  # Skip "TEST_OUTPUT:"
-                    test_stats = results['stats']
-                    outputs.append(results['stats'])
-                    outputs.append(results['results'])
-            
-            # Log test results
-            if test_stats:
-                print(f"✅ TEST RESULTS - Student {input.student_id or 'unknown'}: "
-                      f"{test_stats.get('success', 0)}/{test_stats.get('total_tests', 0)} passed")
-        
-        # Log final response summary
-        error_count = sum(1 for output in outputs if output.get('type') == 'error')
-        text_count = sum(1 for output in outputs if output.get('type') == 'text')
-        print(f"📤 RESPONSE - Student {input.student_id or 'unknown'}: "
-              f"{len(outputs)} outputs, {text_count} text, {error_count} errors")
-        
         return outputs
-        
-    except Exception as e:
-        print(f"❌ ERROR - Student {input.student_id or 'unknown'}: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+    
+    # Resource budget depends on the request type (sandbox, test or sync)
+    limits = get_execution_limits(input.type)
+    
+    if input.testcases:
+        # Run the student code and its test suite in the same isolated kernel session
+        complete_test_code = build_test_code(
+            input.code, input.testcases, input.testcase_ids, input.question_id,
+            test_case_timeout=limits.test_case_timeout,
+            fail_fast=input.type in TEST_FAIL_FAST_TYPES
+        )
+        outputs, test_outputs = kernel_mgr.execute_code_with_tests(
+            input.code,
+            complete_test_code,
+            is_sandbox,
+            input.student_id,
+            stream_code_output,
+            limits,
+            input.type,
+            cancel
+        )
+    else:
+        # Execute the code with proper isolation using student_id
+        outputs = kernel_mgr.execute_code_isolated(
+            input.code, 
+            is_sandbox, 
+            input.student_id,
+            stream_code_output,
+            limits,
+            input.type,
+            cancel
+        )
+        test_outputs = []
+    
+    # Add code complexity metrics
+    outputs.append({
+        "type": "code_metrics",
+        "variable_count": code_analysis["variable_count"],
+        "function_count": code_analysis["function_count"]
+    })
+    
+    if input.testcases:
+        # The harness publishes test_stats and test_result as structured items
+        for output in test_outputs:
+            if output['type'] in ('test_stats', 'test_result'):
+                outputs.append(output)
+        if not any(output['type'] == 'test_stats' for output in test_outputs):
+            # The harness refused to run (integrity check) or never got to publish: every test fails
+            errors = [f"{output['error_type']}: {output['error_msg']}" for output in test_outputs if output['type'] == 'error']
+            reason = errors[0] if errors else "the test harness did not report a result"
+            for item in skipped_test_outputs(input.testcases, reason, input.testcase_ids):
+                outputs.append(item)
+    
+    return outputs
+
+# Classification is a pure function of the request payload, so results are memoized by its hash
+CLASSIFICATION_CACHE_ENABLED = os.getenv("CLASSIFICATION_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+classification_cache = ResultCache(
+    max_entries=int(os.getenv("CLASSIFICATION_CACHE_MAX_ENTRIES", "256")),
+    ttl=float(os.getenv("CLASSIFICATION_CACHE_TTL", str(24 * 3600)))
+) if CLASSIFICATION_CACHE_ENABLED else None
+
+@app.get("/classification-cache/stats")
+async def classification_cache_stats():
+    if not classification_cache:
+        return {"enabled": False}
+    return {"enabled": True, **classification_cache.stats()}
+
+def make_classification_key(request: ClassificationRequest) -> str:
+    payload = json.dumps(request.dict(), sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+# Store of the last classification per (user_id, material_id, type), used by incremental /classify
+CLASSIFICATION_STORE_PATH = os.getenv("CLASSIFICATION_STORE_PATH", "cache/classifications.sqlite3")
+_classification_store = None
+_classification_store_lock = threading.Lock()
+
+def get_classification_store() -> ClassificationStore:
+    global _classification_store
+    with _classification_store_lock:
+        if _classification_store is None:
+            _classification_store = ClassificationStore(CLASSIFICATION_STORE_PATH)
+        return _classification_store
 
 @app.post("/classify", response_model=ClassificationResponse)
-async def classify_students(request: ClassificationRequest):
+async def classify_students(request: ClassificationRequest, response: Response):
     try:
         # Extract all student data
         student_data = request.student_data
         classification_type = request.classification_type
         
-        # Prepare the result
-        classifications = []
+        if request.incremental:
+            classifications, recomputed, reused = await run_blocking(
+                classification_executor,
+                classify_student_data_incremental,
+                student_data,
+                classification_type
+            )
+            response.headers["X-Classification-Cache"] = "bypass"
+            return ClassificationResponse(
+                classifications=classifications,
+                recomputed=recomputed,
+                reused=reused
+            )
+        
+        cache_key = make_classification_key(request) if classification_cache else None
+        cached = classification_cache.get(cache_key) if cache_key else None
+        if cached is not None:
+            # hit, miss or bypass
+            response.headers["X-Classification-Cache"] = "hit"
+            return ClassificationResponse(
+                classifications=[ClassificationResult(**item) for item in cached]
+            )
+        
+        # TOPSIS/fuzzy math is CPU bound, keep it off the event loop
+        classifications = await run_blocking(
+            classification_executor,
+            classify_student_data,
+            student_data,
+            classification_type
+        )
         
-        # Process each student
-        for student in student_data:
-            user_id = student.user_id
-            materials = student.materials
-            
-            # Process each material separately (Revision 1)
-            for material in materials:
-                material_id = material.get('material_id')
-                material_name = material.get('material_name')
-                questions = material.get('questions', [])
-                
-                # Create a matrix with rows for each question in this material
-                decision_matrix = []
-                raw_metrics = []
-                
-                for question in questions:
-                    question_id = question.get('question_id')
-                    question_name = question.get('question_name', f"Question {question.get('order_number', 0)}")
-                    metrics = question.get('metrics', {})
-                    
-                    # Add a row for this question with all its metrics
-                    row = [
-                        float(metrics.get('compile_count', 0)),
-                        float(metrics.get('coding_time', 0)),
-                        float(metrics.get('completion_status', 0)),
-                        float(metrics.get('trial_status', 0)),
-                        float(metrics.get('variable_count', 0)),
-                        float(metrics.get('function_count', 0)),
-                        float(metrics.get('test_case_completion_rate', 0))
-                    ]
-                    
-                    decision_matrix.append(row)
-                    raw_metrics.append({
-                        'question_id': question_id,
-                        'question_name': question_name,
-                        'order_number': question.get('order_number', 0),
-                        'compile_count': metrics.get('compile_count', 0),
-                        'coding_time': metrics.get('coding_time', 0),
-                        'completion_status': metrics.get('completion_status', 0),
-                        'trial_status': metrics.get('trial_status', 0),
-                        'variable_count': metrics.get('variable_count', 0),
-                        'function_count': metrics.get('function_count', 0),
-                        'test_case_complete_count': metrics.get('test_case_complete_count', 0),
-                        'test_case_total_count': metrics.get('test_case_total_count', 0),
-                        'test_case_completion_rate': metrics.get('test_case_completion_rate', 0)
-                    })
-                
-                # Skip empty materials
-                if not decision_matrix:
-                    continue
-                
-                # Get classification results for this material
-                calculation_details = {}
-                if classification_type == "topsis":
-                    # Note: Here we pass 1 as the question_count since we've restructured the data
-                    # Each row is a question, not a material, so we don't need to multiply by question count
-                    level, score, calculation_details = calculate_topsis_by_material(decision_matrix, 1)
-                elif classification_type == "neural":
-                    level, score = calculate_neural_network(decision_matrix)
-                    calculation_details = {"method": "neural_network"}
-                elif classification_type == "fuzzy":
-                    level, score = calculate_fuzzy_logic(decision_matrix)
-                    calculation_details = {"method": "fuzzy_logic"}
-                else:
-                    level, score, calculation_details = calculate_topsis_by_material(decision_matrix, 1)
-                
-                # Final sanity check for JSON serialization
-                if np.isnan(score) or np.isinf(score):
-                    score = 0.0
-                
-                # Generate recommendations based on metrics
-                recommendations = generate_recommendations(raw_metrics, level, score)
-                
-                # Identify weak areas for targeted improvement
-                weak_areas = identify_weak_areas(raw_metrics)
-                
-                # Create raw data with question-level metrics for generating recommendations
-                raw_data = {
-                    "material_id": material_id,
-                    "material_name": material_name,
-                    "question_metrics": raw_metrics,
-                    "method": classification_type,
-                    "classification_level": level,
-                    "classification_score": float(score),
-                    "calculation_details": calculation_details,
-                    "recommendations": recommendations,
-                    "weak_areas": weak_areas
-                }
-                
-                # Create classification result for this material
-                classifications.append(
-                    ClassificationResult(
-                        user_id=user_id,
-                        material_id=material_id,  # New field for material ID
-                        level=level,
-                        score=float(score),
-                        raw_data=raw_data
-                    )
-                )
+        if cache_key:
+            classification_cache.set(cache_key, [classification.dict() for classification in classifications])
+        response.headers["X-Classification-Cache"] = "miss" if cache_key else "bypass"
         
         return ClassificationResponse(
             classifications=classifications
         )
         
     except Exception as e:
-        print(f"Classification error: {str(e)}")
+        logger.exception("Classification failed")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Background classification jobs for cohorts too large for one synchronous request
+CLASSIFICATION_JOB_CHUNK_SIZE = int(os.getenv("CLASSIFICATION_JOB_CHUNK_SIZE", "50"))
+classification_jobs = ClassificationJobManager(
+    classification_executor,
+    max_jobs=int(os.getenv("CLASSIFICATION_JOB_MAX", "100")),
+    ttl=float(os.getenv("CLASSIFICATION_JOB_TTL", "3600"))
+)
+
+@app.post("/classify/jobs", status_code=202)
+async def create_classification_job(request: ClassificationRequest):
+    """Start classifying a cohort in the background and return the job id right away"""
+    student_data = request.student_data
+    classification_type = request.classification_type
+    
+    # Cohort TOPSIS needs every student at once to build the shared references
+    chunk_size = len(student_data) if classification_type == "topsis_cohort" else CLASSIFICATION_JOB_CHUNK_SIZE
+    student_chunks = [student_data[i:i + chunk_size] for i in range(0, len(student_data), max(chunk_size, 1))]
+    
+    def make_chunk(students):
+        if request.incremental:
+            return lambda: classify_student_data_incremental(students, classification_type)
+        return lambda: (classify_student_data(students, classification_type), None, None)
+    
+    try:
+        job = classification_jobs.submit([make_chunk(students) for students in student_chunks],
+                                         [len(students) for students in student_chunks])
+    except TooManyJobs as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    logger.info("Classification job submitted",
+                extra={"job_id": job.id, "students": len(student_data), "chunks": job.total_chunks})
+    return {"job_id": job.id, "status": job.status, "total_chunks": job.total_chunks}
+
+@app.get("/classify/jobs/{job_id}")
+async def get_classification_job(job_id: str):
+    """Progress of a job plus the classifications of the chunks finished so far"""
+    job = classification_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Classification job not found")
+    return job.snapshot()
+
+@app.delete("/classify/jobs/{job_id}")
+async def cancel_classification_job(job_id: str):
+    """Cancel a job; the chunk in progress finishes and its results are kept"""
+    job = classification_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Classification job not found")
+    if not job.cancel():
+        raise HTTPException(status_code=409, detail=f"Classification job already {job.status}")
+    return {"job_id": job.id, "status": job.status}
+
+@app.get("/classify/jobs-stats")
+async def classification_jobs_stats():
+    return classification_jobs.stats()
+
+CLASSIFICATION_METHODS = ("topsis", "topsis_cohort", "neural", "fuzzy")
+
+# Decorator recording the duration of a classification call by method (unknown methods fall back to TOPSIS)
+def timed_classification(func):
+    @functools.wraps(func)
+    def wrapper(student_data, classification_type, *args, **kwargs):
+        method = classification_type if classification_type in CLASSIFICATION_METHODS else "topsis"
+        with CLASSIFY_SECONDS.labels(method).time():
+            return func(student_data, classification_type, *args, **kwargs)
+    return wrapper
+
+# Function to classify every material of every student; blocking, runs on the classification executor
+@timed_classification
+def classify_student_data(student_data: List[StudentData], classification_type: str):
+    # Build one decision matrix per (student, material)
+    groups = collect_material_groups(student_data)
+    
+    # Get classification results for every material
+    scored = score_material_groups(groups, classification_type)
+    
+    # Prepare the result
+    classifications = []
+    for group, (level, score, calculation_details) in zip(groups, scored):
+        classifications.append(build_classification_result(group, level, score, calculation_details, classification_type))
+    
+    return classifications
+
+# Function to classify only the materials whose metrics changed since they were last stored
+@timed_classification
+def classify_student_data_incremental(student_data: List[StudentData], classification_type: str):
+    groups = collect_material_groups(student_data)
+    store = get_classification_store()
+    
+    keys = [(group["user_id"], group["material_id"], classification_type) for group in groups]
+    # A retrained neural model invalidates the stored neural classifications
+    model_tag = classification_type
+    if classification_type == "neural" and neural_model is not None:
+        model_tag = f"neural@{neural_model.metadata.get('trained_at')}"
+    fingerprints = [group_fingerprint(group, model_tag) for group in groups]
+    if classification_type == "topsis_cohort":
+        # Scores depend on the ideal and anti-ideal points of the whole cohort, so a stored score
+        # is only valid for the same cohort: same groups with the same rows
+        model_tag = f"topsis_cohort@{cohort_fingerprint(keys, fingerprints)}"
+        fingerprints = [group_fingerprint(group, model_tag) for group in groups]
+    stored = store.get_many(keys)
+    changed = [stored.get(key, (None,))[0] != fingerprint for key, fingerprint in zip(keys, fingerprints)]
+    
+    # Cohort TOPSIS scores every group against shared references, so any change invalidates all of them
+    if classification_type == "topsis_cohort" and any(changed):
+        changed = [True] * len(groups)
+    
+    stale = [g for g in range(len(groups)) if changed[g]]
+    scored = score_material_groups([groups[g] for g in stale], classification_type) if stale else []
+    
+    classifications = [None] * len(groups)
+    updates = []
+    for g, (level, score, calculation_details) in zip(stale, scored):
+        classification = build_classification_result(groups[g], level, score, calculation_details, classification_type)
+        classifications[g] = classification
+        updates.append((keys[g], fingerprints[g], classification.dict()))
+    for g in range(len(groups)):
+        if not changed[g]:
+            classifications[g] = ClassificationResult(**stored[keys[g]][1])
+    
+    if updates:
+        store.set_many(updates)
+    
+    recomputed = [{"user_id": keys[g][0], "material_id": keys[g][1]} for g in range(len(groups)) if changed[g]]
+    reused = [{"user_id": keys[g][0], "material_id": keys[g][1]} for g in range(len(groups)) if not changed[g]]
+    logger.info("Incremental classification", extra={"recomputed": len(recomputed), "reused": len(reused)})
+    return classifications, recomputed, reused
+
+# Function to turn the request payload into one group of question rows per (student, material)
+def collect_material_groups(student_data: List[StudentData]):
+    groups = []
+    
+    # Process each student
+    for student in student_data:
+        user_id = student.user_id
+        materials = student.materials
+        
+        # Process each material separately (Revision 1)
+        for material in materials:
+            material_id = material.get('material_id')
+            material_name = material.get('material_name')
+            questions = material.get('questions', [])
+            
+            # Create a matrix with rows for each question in this material
+            decision_matrix = []
+            raw_metrics = []
+            
+            for question in questions:
+                question_id = question.get('question_id')
+                question_name = question.get('question_name', f"Question {question.get('order_number', 0)}")
+                metrics = question.get('metrics', {})
+                
+                # Add a row for this question with all its metrics
+                row = [
+                    float(metrics.get('compile_count', 0)),
+                    float(metrics.get('coding_time', 0)),
+                    float(metrics.get('completion_status', 0)),
+                    float(metrics.get('trial_status', 0)),
+                    float(metrics.get('variable_count', 0)),
+                    float(metrics.get('function_count', 0)),
+                    float(metrics.get('test_case_completion_rate', 0))
+                ]
+                
+                decision_matrix.append(row)
+                raw_metrics.append({
+                    'question_id': question_id,
+                    'question_name': question_name,
+                    'order_number': question.get('order_number', 0),
+                    'compile_count': metrics.get('compile_count', 0),
+                    'coding_time': metrics.get('coding_time', 0),
+                    'completion_status': metrics.get('completion_status', 0),
+                    'trial_status': metrics.get('trial_status', 0),
+                    'variable_count': metrics.get('variable_count', 0),
+                    'function_count': metrics.get('function_count', 0),
+                    'test_case_complete_count': metrics.get('test_case_complete_count', 0),
+                    'test_case_total_count': metrics.get('test_case_total_count', 0),
+                    'test_case_completion_rate': metrics.get('test_case_completion_rate', 0)
+                })
+            
+            # Skip empty materials
+            if not decision_matrix:
+                continue
+            
+            groups.append({
+                "user_id": user_id,
+                "material_id": material_id,
+                "material_name": material_name,
+                "decision_matrix": decision_matrix,
+                "raw_metrics": raw_metrics
+            })
+    
+    return groups
+
+# Function to score every group with the requested method, returning (level, score, calculation_details) per group
+def score_material_groups(groups, classification_type: str):
+    if classification_type == "topsis_cohort":
+        # Cohort TOPSIS: shared column norms and ideal solutions per material across all students
+        result = calculate_topsis_cohort(
+            [group["decision_matrix"] for group in groups],
+            [group["material_id"] for group in groups]
+        )
+        return [
+            (result.levels[g], float(result.scores[g]), cohort_calculation_details(result, g))
+            for g in range(len(groups))
+        ]
+    
+    if classification_type not in ("neural", "fuzzy"):
+        # TOPSIS (also the fallback): score the whole cohort in one vectorized pass
+        result = calculate_topsis_batch([group["decision_matrix"] for group in groups])
+        return [
+            (result.levels[g], float(result.scores[g]), topsis_calculation_details(result, g))
+            for g in range(len(groups))
+        ]
+    
+    if classification_type == "neural" and neural_model is not None:
+        # One batched predict_proba over every (student, material) feature vector
+        features = features_matrix([group["decision_matrix"] for group in groups])
+        levels, scores, probabilities = neural_model.predict(features)
+        classes = neural_model.classes
+        return [
+            (levels[g], float(scores[g]), {
+                "method": "neural_network",
+                "model": neural_model.metadata,
+                "features": dict(zip(neural_model.metadata.get("features", []), features[g].tolist())),
+                "probabilities": dict(zip(classes, probabilities[g].tolist()))
+            })
+            for g in range(len(groups))
+        ]
+    
+    if classification_type == "fuzzy":
+        # Fuzzy rule base evaluated for the whole cohort in one pass
+        result = calculate_fuzzy_batch([group["decision_matrix"] for group in groups])
+        return [
+            (result.levels[g], float(result.scores[g]), fuzzy_calculation_details(result, g))
+            for g in range(len(groups))
+        ]
+    
+    # No trained neural model yet: fall back to the untrained heuristic
+    scored = []
+    for group in groups:
+        level, score = calculate_neural_network(group["decision_matrix"])
+        scored.append((level, score, {"method": "neural_network", "model": None}))
+    return scored
+
+# Function to build the classification result (with recommendations) for one group
+def build_classification_result(group, level, score, calculation_details, classification_type: str):
+    user_id = group["user_id"]
+    material_id = group["material_id"]
+    material_name = group["material_name"]
+    raw_metrics = group["raw_metrics"]
+    
+    # Final sanity check for JSON serialization
+    if np.isnan(score) or np.isinf(score):
+        score = 0.0
+    
+    # Generate recommendations based on metrics
+    recommendations = generate_recommendations(raw_metrics, level, score)
+    
+    # Identify weak areas for targeted improvement
+    weak_areas = identify_weak_areas(raw_metrics)
+    
+    # Create raw data with question-level metrics for generating recommendations
+    raw_data = {
+        "material_id": material_id,
+        "material_name": material_name,
+        "question_metrics": raw_metrics,
+        "method": classification_type,
+        "classification_level": level,
+        "classification_score": float(score),
+        "calculation_details": calculation_details,
+        "recommendations": recommendations,
+        "weak_areas": weak_areas
+    }
+    
+    # Create classification result for this material
+    return ClassificationResult(
+        user_id=user_id,
+        material_id=material_id,  # New field for material ID
+        level=level,
+        score=float(score),
+        raw_data=raw_data
+    )
+
 # Function to generate recommendations based on metrics
 def generate_recommendations(raw_metrics, level, score):
     recommendations = []
@@ -651,12 +1151,12 @@ def calculate_topsis_by_material(decision_matrix, question_count):
         single_row_case = len(decision_matrix) == 1
         if single_row_case:
             row_copy = decision_matrix[0].copy()
-            small_variation = np.random.uniform(0.01, 0.05, size=row_copy.shape)
-            row_copy = np.maximum(0, row_copy - small_variation)
+            # Fixed variation keeps the score reproducible across runs
+            row_copy = np.maximum(0, row_copy - SINGLE_ROW_VARIATION)
             decision_matrix = np.vstack([decision_matrix, row_copy])
             calculation_details["steps"].append({
                 "name": "Handle Single Row Case",
-                "description": "Duplicated the single row with slight variation to enable TOPSIS calculation",
+                "description": f"Duplicated the single row lowered by a fixed {SINGLE_ROW_VARIATION} to enable TOPSIS calculation",
                 "duplicated_matrix": decision_matrix.tolist()
             })
             
@@ -798,7 +1298,7 @@ def calculate_topsis_by_material(decision_matrix, question_count):
         
         return level, float(avg_performance), calculation_details
     except Exception as e:
-        print(f"TOPSIS calculation error: {str(e)}")
+        logger.exception("TOPSIS calculation failed")
         return "Remember", 0.0, {"error": str(e)}
 
 # Also update the original calculate_topsis function for backward compatibility
@@ -840,12 +1340,12 @@ def calculate_topsis(metrics_list):
         single_row_case = len(decision_matrix) == 1
         if single_row_case:
             row_copy = decision_matrix[0].copy()
-            small_variation = np.random.uniform(0.01, 0.05, size=row_copy.shape)
-            row_copy = np.maximum(0, row_copy - small_variation)
+            # Fixed variation keeps the score reproducible across runs
+            row_copy = np.maximum(0, row_copy - SINGLE_ROW_VARIATION)
             decision_matrix = np.vstack([decision_matrix, row_copy])
             calculation_details["steps"].append({
                 "name": "Handle Single Row Case",
-                "description": "Duplicated the single row with slight variation to enable TOPSIS calculation",
+                "description": f"Duplicated the single row lowered by a fixed {SINGLE_ROW_VARIATION} to enable TOPSIS calculation",
                 "duplicated_matrix": decision_matrix.tolist()
             })
         
@@ -957,13 +1457,17 @@ def calculate_topsis(metrics_list):
         })
         return level, float(avg_performance), calculation_details
     except Exception as e:
-        print(f"TOPSIS calculation error: {str(e)}")
+        logger.exception("TOPSIS calculation failed")
         return "Remember", 0.0, {"error": str(e)}
 
 def calculate_neural_network(metrics_list):
     try:
         if not metrics_list:
             return "Remember", 0.0
+        
+        # Decision matrix rows are lists in METRIC_COLUMNS order
+        metrics_list = [metrics if isinstance(metrics, dict) else dict(zip(METRIC_COLUMNS, metrics))
+                        for metrics in metrics_list]
             
         # Extract benefit and cost criteria
         benefits = ['completion_status', 'trial_status', 'variable_count', 'function_count']
@@ -997,7 +1501,7 @@ def calculate_neural_network(metrics_list):
                 return "Remember", 0.2
         
         # Normalize features using Min-Max scaling
-        scaler = MinMaxScaler()
+        scaler = startup_profile.lazy_import("sklearn.preprocessing").MinMaxScaler()
         X_scaled = scaler.fit_transform(X)
         
         # Invert cost criteria (lower is better for costs)
@@ -1033,13 +1537,18 @@ def calculate_neural_network(metrics_list):
         return level, float(final_score)
         
     except Exception as e:
-        print(f"Neural network calculation error: {str(e)}")
+        logger.exception("Neural network calculation failed")
         return "Remember", 0.0
 
+# Scalar reference for fuzzy_engine.calculate_fuzzy_batch, which must produce identical scores
 def calculate_fuzzy_logic(metrics_list):
     try:
         if not metrics_list:
             return "Remember", 0.0
+        
+        # Decision matrix rows are lists in METRIC_COLUMNS order
+        metrics_list = [metrics if isinstance(metrics, dict) else dict(zip(METRIC_COLUMNS, metrics))
+                        for metrics in metrics_list]
             
         # Define variables to track for fuzzy logic
         avg_completion = 0.0
@@ -1169,7 +1678,7 @@ def calculate_fuzzy_logic(metrics_list):
         return level, float(fuzzy_score)
         
     except Exception as e:
-        print(f"Fuzzy logic calculation error: {str(e)}")
+        logger.exception("Fuzzy logic calculation failed")
         return "Remember", 0.0
 
 class TestCaseDebugInput(BaseModel):
@@ -1179,68 +1688,17 @@ class TestCaseDebugInput(BaseModel):
 
 @app.post("/debug-test-case")
 async def debug_test_case(input: TestCaseDebugInput):
-    # Properly indent all test case lines for method scope
-    test_case_lines = input.test_case_code.strip().split('\n')
-    # Filter out empty lines and properly indent each line
-    indented_lines = []
-    for line in test_case_lines:
-        if line.strip():  # Only process non-empty lines
-            # Add proper indentation for method scope (8 spaces)
-            indented_lines.append('        ' + line.strip())
-    indented_test_case = '\n'.join(indented_lines)
-
-    # Format the test code with unittest structure
-    test_code = f"""
-import unittest
-import io
-import sys
-
-# Store the student code as a string for test assertions
-student_code = '''
-{input.student_code}
-'''
-
-# Try to execute student code in global scope, but ignore errors
-try:
-    exec(student_code)
-except Exception as e:
-    # Print error but continue
-    print(f'Student code execution error: {{e}}')
-
-# Create test case class
-class TestUserCode(unittest.TestCase):
-    def setUp(self):
-        # Make student_code available as instance variable
-        self.student_code = student_code
-    def test_case(self):
-        # The student code is already executed in global scope
-        # so all functions and variables are available here
-        # Make student_code available in local scope for convenience
-        student_code = self.student_code
-{indented_test_case}
-
-# Run the test using a test runner instead of unittest.main()
-stream = io.StringIO()
-runner = unittest.TextTestRunner(stream=stream)
-result = runner.run(unittest.makeSuite(TestUserCode))
-
-# Print the results in a format we can parse
-print("TEST_RESULT:", "SUCCESS" if result.wasSuccessful() else "FAILURE")
-print("TEST_OUTPUT:", stream.getvalue())
-"""
-
-    # Execute the test code
-    outputs = kernel_mgr.execute_code_isolated(test_code, False, None)
-
-    # Process the test results
-    test_results = []
-    success = False
-
-    for output in outputs:
-        if output['type'] == 'text' and 'TEST_RESULT: SUCCESS' in output['content']:
-            success = True
-        # Add all outputs to results
-        test_results.append(output)
+    # Same path as a graded /test run: the student code cell, then the preloaded harness with the test case
+    test_code = build_test_code(input.student_code, [input.test_case_code])
+    try:
+        outputs, test_outputs = await execution_scheduler.run(None, execution_executor, kernel_mgr.execute_code_with_tests,
+                                                              input.student_code, test_code, False, None)
+    except SchedulerOverloaded as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+    # The harness reports the outcome as a structured test_result item, so no output is scraped
+    test_results = list(outputs) + list(test_outputs)
+    success = any(output['type'] == 'test_result' and output['status'] == 'passed' for output in test_outputs)
 
     return {
         "results": test_results,
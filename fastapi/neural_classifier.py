@@ -0,0 +1,127 @@
+"""Trained MLP classifier for classification_type="neural".
+
+Every (student, material) group is reduced to one fixed-size feature vector: the mean of
+each question metric plus the number of questions. A MinMaxScaler and an MLPClassifier
+are fitted offline on historical classifications (see train_neural_classifier.py) and
+saved with joblib. At request time all groups are scored with one batched predict_proba.
+"""
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from topsis_engine import LEVELS, pack_groups
+
+# Decision matrix column order used by classify_students
+METRIC_COLUMNS = ["compile_count", "coding_time", "completion_status", "trial_status",
+                  "variable_count", "function_count", "test_case_completion_rate"]
+FEATURE_NAMES = [f"mean_{name}" for name in METRIC_COLUMNS] + ["question_count"]
+
+# Score reported for each level: the middle of its closeness band, so scores map back to the same level
+LEVEL_CENTERS = {"Remember": 0.125, "Understand": 0.325, "Apply": 0.475,
+                 "Analyze": 0.625, "Evaluate": 0.775, "Create": 0.925}
+
+
+def features_matrix(groups: List[List[List[float]]]) -> np.ndarray:
+    """(groups, features) matrix of per-material metric means and question counts"""
+    if not groups:
+        return np.zeros((0, len(FEATURE_NAMES)))
+    values, mask, _ = pack_groups(groups, num_criteria=len(METRIC_COLUMNS))
+    counts = mask.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = values.sum(axis=1) / counts[:, None]
+    means[~np.isfinite(means)] = 0.0
+    return np.column_stack([means, counts])
+
+
+class NeuralClassifierModel:
+    """Fitted scaler + MLP with the metadata needed to explain its predictions"""
+
+    def __init__(self, scaler, mlp, metadata: Dict[str, Any]):
+        self.scaler = scaler
+        self.mlp = mlp
+        self.metadata = metadata
+
+    @property
+    def classes(self) -> List[str]:
+        return [str(label) for label in self.mlp.classes_]
+
+    def predict(self, features: np.ndarray) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        """Return (levels, scores, probabilities) for a batch of feature vectors.
+
+        The score is the probability-weighted mean of the level band centers, so it
+        reflects the model's confidence while staying on the usual 0-1 scale.
+        """
+        if len(features) == 0:
+            return [], np.zeros(0), np.zeros((0, len(self.classes)))
+        probabilities = self.mlp.predict_proba(self.scaler.transform(features))
+        classes = self.classes
+        levels = [classes[i] for i in probabilities.argmax(axis=1)]
+        centers = np.array([LEVEL_CENTERS.get(label, 0.0) for label in classes])
+        scores = probabilities @ centers
+        return levels, scores, probabilities
+
+
+def records_to_training_data(records: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+    """Turn exported student_cognitive_classifications rows into (features, labels).
+
+    Each record needs classification_level and raw_data.question_metrics, the shape
+    /classify returns and Laravel stores. raw_data may be the JSON text of the
+    database column. Course-level rows, rows without question metrics and rows
+    whose raw_data does not parse are skipped.
+    """
+    groups, labels = [], []
+    for record in records:
+        if record.get("is_course_level"):
+            continue
+        level = record.get("classification_level") or record.get("level")
+        raw_data = record.get("raw_data") or {}
+        if isinstance(raw_data, str):
+            try:
+                raw_data = json.loads(raw_data)
+            except ValueError:
+                continue
+        if not isinstance(raw_data, dict):
+            continue
+        question_metrics = raw_data.get("question_metrics") or []
+        if level not in LEVELS or not question_metrics:
+            continue
+        groups.append([[float(question.get(name, 0) or 0) for name in METRIC_COLUMNS] for question in question_metrics])
+        labels.append(level)
+    return features_matrix(groups), np.array(labels)
+
+
+def train_model(features: np.ndarray, labels: np.ndarray, hidden_layers: Tuple[int, ...] = (32, 16),
+                max_iter: int = 1000, random_state: int = 42) -> NeuralClassifierModel:
+    from sklearn.neural_network import MLPClassifier
+    from sklearn.preprocessing import MinMaxScaler
+
+    scaler = MinMaxScaler()
+    scaled = scaler.fit_transform(features)
+    mlp = MLPClassifier(hidden_layer_sizes=hidden_layers, max_iter=max_iter, random_state=random_state)
+    mlp.fit(scaled, labels)
+    metadata = {
+        "trained_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "samples": int(len(labels)),
+        "features": FEATURE_NAMES,
+        "classes": [str(label) for label in mlp.classes_],
+        "hidden_layers": list(hidden_layers),
+        "training_accuracy": float(mlp.score(scaled, labels)),
+    }
+    return NeuralClassifierModel(scaler, mlp, metadata)
+
+
+def save_model(model: NeuralClassifierModel, path: str):
+    import joblib
+    joblib.dump({"scaler": model.scaler, "mlp": model.mlp, "metadata": model.metadata}, path)
+
+
+def load_model(path: str) -> Optional[NeuralClassifierModel]:
+    """Load a saved model, or return None when no model has been trained yet"""
+    if not path or not os.path.exists(path):
+        return None
+    import joblib
+    payload = joblib.load(path)
+    return NeuralClassifierModel(payload["scaler"], payload["mlp"], payload["metadata"])
@@ -0,0 +1,184 @@
+"""Kernel-free pre-flight analysis of submitted code.
+
+The source is parsed once (after translating IPython syntax such as %magics) and a
+single AST walk yields the variable/function counts and whether input() is called.
+Code that does not compile gets a SyntaxError output in the same format the kernel
+produces, so /test can answer without leasing a kernel. Results are cached by code hash.
+"""
+import ast
+import hashlib
+import os
+import re
+import threading
+import traceback
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+PREFLIGHT_CACHE_SIZE = int(os.getenv("PREFLIGHT_CACHE_SIZE", "4096"))
+
+# Fallback when the code cannot be parsed at all (IPython unavailable)
+INPUT_CALL_PATTERN = re.compile(r'(?<![a-zA-Z0-9_])input\s*\(')
+
+_transformer = None
+
+
+class PreflightResult:
+    def __init__(self, variable_count: int = 0, function_count: int = 0, uses_input: bool = False,
+                 syntax_error: Optional[Dict[str, Any]] = None):
+        self.variable_count = variable_count
+        self.function_count = function_count
+        self.uses_input = uses_input
+        self.syntax_error = syntax_error  # error output item, None when the code compiles
+
+
+def _to_python(code: str) -> Optional[str]:
+    """Translate IPython-only syntax (magics, shell escapes) like the kernel does, None if IPython is missing"""
+    global _transformer
+    if _transformer is None:
+        try:
+            from IPython.core.inputtransformer2 import TransformerManager
+        except ImportError:
+            return None
+        _transformer = TransformerManager()
+    return _transformer.transform_cell(code)
+
+
+def _count_names(target, variable_names: set):
+    # Simple names (a = 1) and tuple unpacking (a, b = 1, 2)
+    if isinstance(target, ast.Name):
+        variable_names.add(target.id)
+    elif isinstance(target, ast.Tuple):
+        for elt in target.elts:
+            if isinstance(elt, ast.Name):
+                variable_names.add(elt.id)
+
+
+def _is_input_call(node: ast.Call) -> bool:
+    func = node.func
+    if isinstance(func, ast.Name):
+        return func.id == "input"
+    # builtins.input(...)
+    return (isinstance(func, ast.Attribute) and func.attr == "input"
+            and isinstance(func.value, ast.Name) and func.value.id == "builtins")
+
+
+def _syntax_error_output(error: SyntaxError) -> Dict[str, Any]:
+    lines = traceback.format_exception_only(type(error), error)
+    # Match the kernel's "Cell In[n], line x" header instead of the parser's "<unknown>" file name
+    content = "".join(lines).replace(f'File "{error.filename}", line', "Cell In[1], line", 1)
+    return {
+        "type": "error",
+        "content": "\n".join(line.rstrip() for line in content.split("\n") if line.rstrip()),
+        "error_type": type(error).__name__,
+        "error_msg": f"{error.msg} ({error.filename or '<unknown>'}, line {error.lineno})",
+    }
+
+
+def _analyze(code: str) -> PreflightResult:
+    source = _to_python(code)
+    if source is None:
+        # Without IPython, magics cannot be told apart from syntax errors: never reject, count what parses
+        try:
+            tree = ast.parse(code)
+        except SyntaxError:
+            return PreflightResult(uses_input=bool(INPUT_CALL_PATTERN.search(code)))
+    else:
+        try:
+            tree = ast.parse(source)
+        except (SyntaxError, ValueError) as e:
+            if not isinstance(e, SyntaxError):
+                e = SyntaxError(str(e))
+            return PreflightResult(syntax_error=_syntax_error_output(e))
+
+    variable_names = set()
+    function_count = 0
+    uses_input = False
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Assign):
+            for target in node.targets:
+                _count_names(target, variable_names)
+        elif isinstance(node, ast.For):
+            _count_names(node.target, variable_names)
+        elif isinstance(node, ast.FunctionDef):
+            function_count += 1
+        elif isinstance(node, ast.Call) and not uses_input:
+            uses_input = _is_input_call(node)
+    return PreflightResult(len(variable_names), function_count, uses_input)
+
+
+class _PreflightCache:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, PreflightResult]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, code: str) -> PreflightResult:
+        key = hashlib.sha256(code.encode("utf-8")).hexdigest()
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return result
+            self.misses += 1
+        result = _analyze(code)
+        with self._lock:
+            self._entries[key] = result
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+_cache = _PreflightCache(PREFLIGHT_CACHE_SIZE)
+
+
+def preflight(code: str) -> PreflightResult:
+    """Analyze code once; repeated submissions of the same source are served from the cache"""
+    return _cache.get(code)
+
+
+def warm_up():
+    """Import the IPython translation up front, before the kernel pool threads import IPython concurrently"""
+    _to_python("pass")
+
+
+def preflight_stats() -> Dict[str, Any]:
+    return _cache.stats()
+
+
+def skipped_test_outputs(testcases: List[str], reason: str,
+                         testcase_ids: Optional[List[int]] = None) -> List[Dict[str, Any]]:
+    """test_stats/test_result items for a suite that was not run because the code does not compile"""
+    ids = testcase_ids if testcase_ids else list(range(len(testcases)))
+    return [
+        {
+            "type": "test_stats",
+            "total_tests": len(testcases),
+            "success": 0,
+            "fail": len(testcases),
+            "not_run": len(testcases),
+            "passed_test_case_ids": [],
+            "test_case_timings": [
+                {"test_case_id": ids[i] if i < len(ids) else i, "status": "not_run", "duration_ms": None}
+                for i in range(len(testcases))
+            ]
+        },
+        {
+            "type": "test_result",
+            "status": "failed",
+            "content": f"Tests were not run: {reason}"
+        }
+    ]
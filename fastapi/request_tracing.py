@@ -0,0 +1,137 @@
+"""Structured, sampled per-request traces.
+
+A trace collects the identifiers of a request, a hash of its code, span durations and
+the outcome, and is emitted as one JSON log record when the request finishes. Records
+go through a QueueHandler, so the request thread never blocks on console or file I/O;
+a QueueListener thread formats and writes them. The full code and test cases are only
+attached for a sampled fraction of requests (TRACE_SAMPLE_RATE) and for failures.
+"""
+import atexit
+import contextvars
+import hashlib
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+try:
+    from pythonjsonlogger.json import JsonFormatter
+except ImportError:  # python-json-logger < 3
+    from pythonjsonlogger.jsonlogger import JsonFormatter
+
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "true").lower() in ("1", "true", "yes")
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.01"))
+TRACE_LOG_FILE = os.getenv("TRACE_LOG_FILE", "")
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("request_trace", default=None)
+_listener: Optional[logging.handlers.QueueListener] = None
+_listener_lock = threading.Lock()
+
+trace_logger = logging.getLogger("codeasy.trace")
+trace_logger.setLevel(logging.INFO)
+trace_logger.propagate = False
+
+
+def start_trace_logging():
+    """Attach the queue handler and start the writer thread (idempotent)"""
+    global _listener
+    with _listener_lock:
+        if _listener is not None:
+            return
+        if TRACE_LOG_FILE:
+            os.makedirs(os.path.dirname(os.path.abspath(TRACE_LOG_FILE)), exist_ok=True)
+            target = logging.FileHandler(TRACE_LOG_FILE)
+        else:
+            target = logging.StreamHandler(sys.stdout)
+        target.setFormatter(JsonFormatter("%(asctime)s %(levelname)s %(message)s", timestamp=False))
+        log_queue: queue.Queue = queue.Queue(-1)
+        trace_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+        _listener = logging.handlers.QueueListener(log_queue, target, respect_handler_level=False)
+        _listener.start()
+        atexit.register(stop_trace_logging)
+
+
+def stop_trace_logging():
+    """Flush pending records and stop the writer thread"""
+    global _listener
+    with _listener_lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        _listener = None
+        for handler in list(trace_logger.handlers):
+            trace_logger.removeHandler(handler)
+
+
+class RequestTrace:
+    def __init__(self, name: str, **attributes):
+        self.name = name
+        self.request_id = uuid.uuid4().hex
+        self.attributes: Dict[str, Any] = attributes
+        self.spans: Dict[str, float] = {}
+        self.sampled = random.random() < TRACE_SAMPLE_RATE
+        self._started = time.perf_counter()
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    @contextmanager
+    def span(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            # Repeated spans (e.g. several cells) accumulate
+            self.spans[name] = self.spans.get(name, 0.0) + (time.perf_counter() - started) * 1000
+
+    def finish(self, outcome: str, payload: Optional[Dict[str, Any]] = None):
+        """Emit the trace record; payload is attached when the request was sampled or failed"""
+        if not TRACE_ENABLED:
+            return
+        record = {
+            "event": self.name,
+            "request_id": self.request_id,
+            **self.attributes,
+            "outcome": outcome,
+            "total_ms": round((time.perf_counter() - self._started) * 1000, 2),
+            "spans_ms": {name: round(duration, 2) for name, duration in self.spans.items()},
+            "sampled": self.sampled,
+        }
+        if payload is not None and (self.sampled or outcome != "ok"):
+            record["payload"] = payload
+        start_trace_logging()
+        trace_logger.info(self.name, extra=record)
+
+
+def code_fingerprint(code: str) -> Dict[str, Any]:
+    encoded = code.encode("utf-8")
+    return {"code_sha256": hashlib.sha256(encoded).hexdigest(), "code_bytes": len(encoded)}
+
+
+@contextmanager
+def start_request_trace(name: str, **attributes):
+    """Make a new trace current for the duration of a request"""
+    trace = RequestTrace(name, **attributes)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def trace_span(name: str):
+    """Time a span of the current request trace; a no-op outside a traced request"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    with trace.span(name):
+        yield
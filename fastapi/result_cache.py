@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, List, Dict, Any
+
+# Errors caused by the execution environment rather than by the submitted code
+UNCACHEABLE_ERRORS = {"ExecutionTimeout", "ExecutionCancelled", "KernelDied", "TimeoutError", "Empty", "RuntimeError"}
+
+
+def normalize_code(code: str) -> str:
+    """Normalize code so formatting-only differences hash the same"""
+    lines = code.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    return '\n'.join(line.rstrip() for line in lines).strip('\n')
+
+
+def make_cache_key(code: str, testcases: Optional[List[str]], testcase_ids: Optional[List[int]],
+                   request_type: Optional[str]) -> str:
+    payload = json.dumps({
+        "code": normalize_code(code),
+        "testcases": [normalize_code(tc) for tc in (testcases or [])],
+        "testcase_ids": testcase_ids or [],
+        "type": request_type or "",
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def is_cacheable(request_type: Optional[str], outputs: List[Dict[str, Any]]) -> bool:
+    """Only deterministic results are cached: no sandbox runs, images, timeouts (also of single test cases) or infrastructure errors"""
+    if request_type == "sandbox":
+        return False
+    for output in outputs:
+        if output.get('type') == 'image':
+            return False
+        if output.get('truncated'):
+            return False
+        if output.get('type') == 'error' and output.get('error_type') in UNCACHEABLE_ERRORS:
+            return False
+        # Per-test-case timeouts depend on host load as much as on the code
+        if output.get('type') == 'test_stats' and any(
+                timing.get('status') == 'timeout' for timing in output.get('test_case_timings') or []):
+            return False
+    return True
+
+
+def without_durations(outputs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Copy of outputs without per-test-case durations, which describe one run and would be stale when served later"""
+    stripped = []
+    for output in outputs:
+        if output.get('type') == 'test_stats' and output.get('test_case_timings'):
+            output = {**output, "test_case_timings": [
+                {**timing, "duration_ms": None} for timing in output['test_case_timings']
+            ]}
+        stripped.append(output)
+    return stripped
+
+
+class ResultCache:
+    """LRU + TTL cache of /test results keyed by a content hash.
+
+    Entries live in memory and, when a path is given, in a SQLite file so the cache
+    survives restarts. The in-memory layer is checked first; disk hits are promoted.
+    """
+
+    def __init__(self, max_entries: int = 5000, ttl: float = 24 * 3600, path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self.hits = 0
+        self.misses = 0
+
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, outputs TEXT NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS results_accessed_at ON results (accessed_at)")
+            self._db.commit()
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created_at, outputs = entry
+                if now - created_at <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return json.loads(outputs)
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute("SELECT outputs, created_at FROM results WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    outputs, created_at = row
+                    if now - created_at <= self.ttl:
+                        self._db.execute("UPDATE results SET accessed_at = ? WHERE key = ?", (now, key))
+                        self._db.commit()
+                        self._remember(key, created_at, outputs)
+                        self.hits += 1
+                        return json.loads(outputs)
+                    self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+                    self._db.commit()
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, outputs: List[Dict[str, Any]]):
+        now = time.time()
+        # Stored serialized so callers can never mutate a cached result
+        serialized = json.dumps(without_durations(outputs))
+        with self._lock:
+            self._remember(key, now, serialized)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO results (key, outputs, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, serialized, now, now)
+                )
+                # Evict expired rows and keep the file within the size cap (least recently used first)
+                self._db.execute("DELETE FROM results WHERE created_at < ?", (now - self.ttl,))
+                self._db.execute(
+                    "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._memory),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "persistent": self._db is not None,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+    def _remember(self, key: str, created_at: float, serialized: str):
+        # Must be called with the lock held
+        self._memory[key] = (created_at, serialized)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
@@ -0,0 +1,93 @@
+"""Latest-wins tracking of sandbox runs per (student_id, question_id).
+
+Students hit "run" repeatedly and only the last result is shown. A new sandbox run with
+different code cancels the in-flight run for the same student and question: it is removed
+from the scheduler queue, or its kernel is interrupted, and its caller gets RunSuperseded.
+A run with the same code as the one in flight joins it instead of executing again.
+"""
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from service_metrics import SANDBOX_RUNS
+
+
+class RunSuperseded(Exception):
+    """A newer sandbox run of the same student and question replaced this one"""
+
+    def __init__(self):
+        super().__init__("This run was replaced by a newer run for the same question")
+
+
+class SandboxRun:
+    def __init__(self, fingerprint: str):
+        self.fingerprint = fingerprint
+        # Seen by the execution thread, which stops the session once it is set
+        self.cancel = threading.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.superseded = False
+
+    def supersede(self):
+        self.superseded = True
+        self.cancel.set()
+        # Leaves the scheduler queue right away; a running thread stops at its next poll of cancel
+        self.task.cancel()
+
+    async def result(self) -> Any:
+        """Wait for the run without cancelling it when the caller goes away (others may share it)"""
+        try:
+            return await asyncio.shield(self.task)
+        except asyncio.CancelledError:
+            if self.superseded:
+                raise RunSuperseded()
+            raise
+
+
+class SandboxRunTracker:
+    """In-flight sandbox runs by key; used from the event loop only"""
+
+    def __init__(self):
+        self._runs: Dict[Hashable, SandboxRun] = {}
+        self.executed = 0
+        self.coalesced = 0
+        self.superseded = 0
+
+    def submit(self, key: Hashable, fingerprint: str, start: Callable[[threading.Event], Awaitable[Any]],
+               coalesce: bool = True) -> Tuple[SandboxRun, bool]:
+        """Start start(cancel) as the latest run for key, returning (run, joined).
+
+        With coalesce, a run in flight with the same fingerprint is returned (joined=True)
+        instead of starting another one. Any other run in flight for key is superseded.
+        """
+        current = self._runs.get(key)
+        if current is not None and coalesce and current.fingerprint == fingerprint and not current.superseded:
+            self.coalesced += 1
+            SANDBOX_RUNS.labels("coalesced").inc()
+            return current, True
+        if current is not None and not current.task.done():
+            current.supersede()
+            self.superseded += 1
+            SANDBOX_RUNS.labels("superseded").inc()
+
+        run = SandboxRun(fingerprint)
+        run.task = asyncio.ensure_future(start(run.cancel))
+        run.task.add_done_callback(lambda _: self._finished(key, run))
+        self._runs[key] = run
+        self.executed += 1
+        SANDBOX_RUNS.labels("executed").inc()
+        return run, False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._runs),
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "superseded": self.superseded,
+        }
+
+    def _finished(self, key: Hashable, run: SandboxRun):
+        if self._runs.get(key) is run:
+            del self._runs[key]
+        # Retrieve the outcome so a run nobody waits for any more does not log "exception never retrieved"
+        if not run.task.cancelled():
+            run.task.exception()
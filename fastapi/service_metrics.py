@@ -0,0 +1,57 @@
+"""Prometheus metrics exported at /metrics.
+
+Execution metrics are labelled by request type (sandbox, test or sync; anything else
+counts as test, like the execution limits), classification metrics by method.
+"""
+from typing import Optional
+
+from prometheus_client import Counter, Gauge, Histogram
+
+REQUEST_TYPES = ("sandbox", "test", "sync")
+
+# Kernel start-up takes seconds, cell execution anything from milliseconds to the wall-clock limit
+KERNEL_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30, 60)
+EXECUTION_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 60)
+IMAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+SCHEDULER_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 60)
+CLASSIFY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+KERNEL_START_SECONDS = Histogram(
+    "codeasy_kernel_start_seconds", "Time to launch a kernel process and open its channels", buckets=KERNEL_BUCKETS)
+KERNEL_READY_SECONDS = Histogram(
+    "codeasy_kernel_wait_for_ready_seconds", "Time a new kernel took to answer wait_for_ready", buckets=KERNEL_BUCKETS)
+KERNEL_LEASE_SECONDS = Histogram(
+    "codeasy_kernel_lease_seconds", "Time a request waited to lease a kernel", ["type"], buckets=KERNEL_BUCKETS)
+EXECUTION_PHASE_SECONDS = Histogram(
+    "codeasy_execution_phase_seconds", "Time spent executing one phase (student code or test harness)",
+    ["phase", "type"], buckets=EXECUTION_BUCKETS)
+IMAGE_WRITE_SECONDS = Histogram(
+    "codeasy_image_write_seconds", "Time to decode, recompress and write one visualization", buckets=IMAGE_BUCKETS)
+CLASSIFY_SECONDS = Histogram(
+    "codeasy_classify_seconds", "Time to classify one request", ["method"], buckets=CLASSIFY_BUCKETS)
+
+EXECUTION_ERRORS = Counter(
+    "codeasy_execution_errors_total", "Error outputs returned to students", ["type", "error_type"])
+INPUT_REJECTIONS = Counter(
+    "codeasy_input_rejections_total", "Submissions rejected for calling input()", ["type"])
+EXECUTION_TIMEOUTS = Counter(
+    "codeasy_execution_timeouts_total", "Executions stopped at the wall-clock limit", ["type"])
+SCHEDULER_QUEUE_LENGTH = Gauge(
+    "codeasy_scheduler_queue_length", "Executions waiting in the scheduler for a slot", ["type"])
+SCHEDULER_RUNNING = Gauge(
+    "codeasy_scheduler_running", "Executions holding a scheduler slot", ["type"])
+SCHEDULER_WAIT_SECONDS = Histogram(
+    "codeasy_scheduler_wait_seconds", "Time an execution waited in the scheduler before it started",
+    ["type"], buckets=SCHEDULER_WAIT_BUCKETS)
+SCHEDULER_REJECTIONS = Counter(
+    "codeasy_scheduler_rejections_total", "Executions rejected with 429 because their queue was full", ["type"])
+SANDBOX_RUNS = Counter(
+    "codeasy_sandbox_runs_total",
+    "Sandbox runs tracked per student and question: executed, coalesced into an identical run, or superseded",
+    ["outcome"])
+EXECUTIONS_IN_FLIGHT = Gauge(
+    "codeasy_executions_in_flight", "Executions currently holding a kernel or waiting for one", ["type"])
+
+
+def request_type_label(request_type: Optional[str]) -> str:
+    return request_type if request_type in REQUEST_TYPES else "test"
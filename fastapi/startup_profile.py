@@ -0,0 +1,126 @@
+"""Cold-start accounting: process phases, lazily imported modules and an on-demand
+`python -X importtime` breakdown of `import main`."""
+import importlib
+import os
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+# Set for the `python -X importtime` subprocess: importing main must not touch the live caches there
+IMPORT_ONLY_ENV = "CODEASY_IMPORT_ONLY"
+
+# Imported only by the classification methods that need them
+HEAVY_MODULES = ["sklearn.preprocessing", "sklearn.neural_network"]
+
+
+def _process_start_time() -> Optional[float]:
+    """Wall-clock start of this process from /proc, so interpreter start-up is included"""
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open("/proc/stat") as f:
+            boot_time = next(int(line.split()[1]) for line in f if line.startswith("btime"))
+        return boot_time + start_ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError, StopIteration):
+        return None
+
+
+class StartupProfile:
+    def __init__(self):
+        self.process_started_at = _process_start_time()
+        self.created_at = time.time()
+        self.phases: Dict[str, float] = {}
+        self.imports: Dict[str, float] = {}
+        self.warmup: Dict[str, Any] = {"enabled": False, "status": "disabled"}
+        self._lock = threading.Lock()
+        self._importtime: Optional[Dict[str, Any]] = None
+
+    def mark(self, phase: str):
+        """Record the time since process start at which `phase` was reached"""
+        origin = self.process_started_at or self.created_at
+        with self._lock:
+            self.phases.setdefault(phase, round(time.time() - origin, 4))
+
+    def lazy_import(self, name: str):
+        """Import a module on first use, recording how long the first import took"""
+        module = sys.modules.get(name)
+        if module is not None:
+            return module
+        started = time.perf_counter()
+        module = importlib.import_module(name)
+        with self._lock:
+            self.imports.setdefault(name, round(time.perf_counter() - started, 4))
+        return module
+
+    def start_warmup(self, modules: List[str]):
+        """Import heavy modules in a background thread so the first classification does not pay for them"""
+        self.warmup = {"enabled": True, "status": "running", "modules": modules}
+
+        def run():
+            started = time.perf_counter()
+            try:
+                for name in modules:
+                    self.lazy_import(name)
+                self.warmup.update(status="done", seconds=round(time.perf_counter() - started, 4))
+            except Exception as e:
+                self.warmup.update(status="failed", error=str(e))
+
+        threading.Thread(target=run, name="classification-warmup", daemon=True).start()
+
+    def importtime_report(self, module: str = "main", top: int = 30, refresh: bool = False) -> Dict[str, Any]:
+        """Run `python -X importtime -c "import <module>"` in a fresh interpreter and summarize it.
+
+        Entries are sorted by cumulative microseconds; the result is cached until refresh is requested.
+        """
+        with self._lock:
+            if self._importtime is not None and not refresh:
+                return self._importtime
+
+        started = time.perf_counter()
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            env={**os.environ, IMPORT_ONLY_ENV: "1"},
+            capture_output=True, text=True, timeout=300
+        )
+        entries = []
+        for line in completed.stderr.splitlines():
+            if not line.startswith("import time:") or "self [us]" in line:
+                continue
+            try:
+                self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+                entries.append({
+                    "module": name.strip(),
+                    "depth": (len(name) - len(name.lstrip())) // 2,
+                    "self_us": int(self_us),
+                    "cumulative_us": int(cumulative_us),
+                })
+            except ValueError:
+                continue
+
+        top_level = [entry for entry in entries if entry["depth"] == 0]
+        report = {
+            "module": module,
+            "wall_seconds": round(time.perf_counter() - started, 4),
+            "returncode": completed.returncode,
+            "total_import_us": sum(entry["cumulative_us"] for entry in top_level),
+            "slowest": sorted(entries, key=lambda entry: entry["cumulative_us"], reverse=True)[:top],
+        }
+        with self._lock:
+            self._importtime = report
+        return report
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "process_started_at": self.process_started_at,
+                "phases_seconds_since_process_start": dict(self.phases),
+                "lazy_imports_seconds": dict(self.imports),
+                "heavy_modules_loaded": [name for name in HEAVY_MODULES if name in sys.modules],
+                "warmup": dict(self.warmup),
+            }
+
+
+startup_profile = StartupProfile()
@@ -0,0 +1,340 @@
+"""Test harness preloaded into execution kernels.
+
+The service sends a test run as one JSON payload (student code, and per test case its
+id, source and optionally its pre-compiled code) instead of generating unittest source
+for every request. The harness builds the TestCase from compiled test functions that
+run against the student's namespace and publishes the test_stats/test_result items as a
+display_data bundle of type RESULT_MIME_TYPE, so no output has to be parsed back.
+Every test case is timed, can be given its own time limit (payload "timeout") and the
+suite can stop at the first failure (payload "fail_fast").
+
+The same module compiles test cases on the service side (TestCaseCompiler), which keeps
+the compiled functions per (question_id, test case hash) and ships them marshalled, so
+the kernel only compiles when it runs a different interpreter than the service.
+
+The harness keeps its own references to the unittest classes it runs with, taken when it
+is preloaded, before any student code runs in the session. A test run first checks that
+the student code did not replace the harness or unittest in sys.modules nor patch them,
+and raises HarnessIntegrityError instead of reporting results it cannot trust.
+"""
+import base64
+import hashlib
+import io
+import json
+import linecache
+import marshal
+import os
+import signal
+import sys
+import textwrap
+import threading
+import time
+import types
+import unittest
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+RESULT_MIME_TYPE = "application/vnd.codeasy.test-result+json"
+
+# unittest leaves frames of modules defining __unittest out of failure tracebacks
+__unittest = True
+
+HARNESS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Run once in every new kernel (see KernelPool warmup_code) so the harness is imported before the lease
+PRELOAD_CODE = (f"import sys\nif {HARNESS_DIR!r} not in sys.path:\n    sys.path.append({HARNESS_DIR!r})\n"
+                "import test_harness\ntest_harness.guard_display_publisher(get_ipython().display_pub)")
+
+# Code objects are only portable between identical interpreters
+CODE_TAG = f"{sys.implementation.cache_tag}:{marshal.version}"
+
+_publisher: Optional[Callable[[Dict[str, Any]], None]] = None
+
+# The runner only uses these, so patching the public unittest names later does not reach it
+_unittest = unittest
+_TestCase = unittest.TestCase
+_TestSuite = unittest.TestSuite
+_TextTestRunner = unittest.TextTestRunner
+
+# unittest classes whose attributes (assert methods, run(), result bookkeeping) decide the outcome
+_CHECKED_UNITTEST_CLASSES = ("TestCase", "TestSuite", "TextTestRunner", "TestResult", "TextTestResult")
+
+
+def set_publisher(publisher: Optional[Callable[[Dict[str, Any]], None]]):
+    """Publish results through publisher(data) instead of IPython's display (used by the fork server)"""
+    global _publisher
+    _publisher = publisher
+
+
+def _wrap_source(source: str) -> str:
+    # The test case is the body of a method, so it can use self.assert*() and its own locals
+    body = textwrap.indent(textwrap.dedent(source).strip("\n"), "    ") if source.strip() else "    pass"
+    return f"def test_case(self):\n{body}\n"
+
+
+def compile_test_case(source: str, filename: str) -> types.CodeType:
+    """Compile a test case into the code object of a test_case(self) function"""
+    module = compile(_wrap_source(source), filename, "exec", dont_inherit=True)
+    return next(const for const in module.co_consts if isinstance(const, types.CodeType))
+
+
+class TestCaseCompiler:
+    """Service-side LRU of compiled test cases keyed by (question_id, test case hash)"""
+
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Any, Optional[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def build_payload(self, code: str, testcases: List[str], testcase_ids: Optional[List[int]] = None,
+                      question_id: Optional[int] = None, timeout: float = 0,
+                      fail_fast: bool = False) -> Dict[str, Any]:
+        test_case_ids = testcase_ids if testcase_ids else list(range(len(testcases)))
+        tests = []
+        for i, source in enumerate(testcases):
+            test_case_id = test_case_ids[i] if i < len(test_case_ids) else i
+            filename = f"<test case {test_case_id}>"
+            tests.append({
+                "id": test_case_id,
+                "source": source,
+                "filename": filename,
+                "compiled": self._compiled(question_id, source, filename),
+            })
+        return {"code": code, "code_tag": CODE_TAG, "tests": tests, "timeout": timeout, "fail_fast": fail_fast}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _compiled(self, question_id: Optional[int], source: str, filename: str) -> Optional[str]:
+        key = (question_id, hashlib.sha256(f"{filename}\0{source}".encode("utf-8")).hexdigest())
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+        try:
+            compiled = base64.b64encode(marshal.dumps(compile_test_case(source, filename))).decode("ascii")
+        except (SyntaxError, ValueError):
+            # Compiled (and reported) in the kernel, where it fails that test case only
+            compiled = None
+        with self._lock:
+            self._entries[key] = compiled
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return compiled
+
+
+def _load_test_function(test: Dict[str, Any], code_tag: str, namespace: Dict[str, Any], name: str):
+    linecache.cache[test["filename"]] = (None, None, _wrap_source(test["source"]).splitlines(True), test["filename"])
+    if test.get("compiled") and code_tag == CODE_TAG:
+        code = marshal.loads(base64.b64decode(test["compiled"]))
+    else:
+        code = compile_test_case(test["source"], test["filename"])
+    # Globals are the student's namespace, so the test sees their functions and variables
+    return types.FunctionType(code, namespace, name)
+
+
+class HarnessIntegrityError(Exception):
+    """The harness or unittest was replaced or patched after the harness was preloaded"""
+
+
+class TestCaseTimeout(BaseException):
+    """A test case ran past its time limit; not an Exception, so student code cannot catch it by accident"""
+
+
+@contextmanager
+def _time_limit(seconds: float):
+    # SIGALRM only reaches the main thread, where both the kernel and the fork server run cells
+    if not seconds or seconds <= 0 or not hasattr(signal, "setitimer") \
+            or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    def expired(signum, frame):
+        raise TestCaseTimeout(f"Test case exceeded its time limit of {seconds:g} seconds")
+
+    previous = signal.signal(signal.SIGALRM, expired)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def _make_test_method(function, test_case_id, timeout: float, passed_test_case_ids: List[Any],
+                      timings: Dict[int, Dict[str, Any]], index: int):
+    def test_method(self):
+        status = "error"
+        started = time.perf_counter()
+        try:
+            with _time_limit(timeout):
+                function(self)
+            # Only reached when the test case passed
+            status = "passed"
+            passed_test_case_ids.append(test_case_id)
+        except self.failureException:
+            status = "failed"
+            raise
+        except TestCaseTimeout:
+            status = "timeout"
+            raise
+        finally:
+            timings[index] = {
+                "test_case_id": test_case_id,
+                "status": status,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+            }
+    return test_method
+
+
+def _make_error_method(error: BaseException, test_case_id, timings: Dict[int, Dict[str, Any]], index: int):
+    def test_method(self):
+        timings[index] = {"test_case_id": test_case_id, "status": "error", "duration_ms": 0.0}
+        raise error
+    return test_method
+
+
+def run_tests(payload: Dict[str, Any], namespace: Dict[str, Any]) -> Dict[str, Any]:
+    """Run the payload's test cases against namespace, returning the test_stats and test_result items"""
+    # Tests may make string-based assertions on the raw code
+    namespace["student_code"] = payload["code"]
+    timeout = payload.get("timeout") or 0
+    passed_test_case_ids: List[Any] = []
+    timings: Dict[int, Dict[str, Any]] = {}
+    methods = {}
+    for i, test in enumerate(payload["tests"]):
+        name = f"test_{i}"
+        try:
+            function = _load_test_function(test, payload.get("code_tag"), namespace, name)
+            methods[name] = _make_test_method(function, test["id"], timeout, passed_test_case_ids, timings, i)
+        except Exception as e:
+            # Compile errors, but also a corrupt or mismatched marshalled payload, fail this test case only
+            methods[name] = _make_error_method(e, test["id"], timings, i)
+
+    # Reported as __main__.TestUserCode, like the test suites used to be named
+    test_class = type("TestUserCode", (_TestCase,), {"__module__": "__main__", **methods})
+    stream = io.StringIO()
+    runner = _TextTestRunner(stream=stream, failfast=bool(payload.get("fail_fast")))
+    # In payload order (the loader would sort test_10 before test_2), which is what fail_fast stops on
+    result = runner.run(_TestSuite(test_class(name) for name in methods))
+
+    # With fail_fast the suite stops at the first failure; the rest count as failed, not run
+    total = len(payload["tests"])
+    success = result.testsRun - len(result.failures) - len(result.errors)
+    test_case_timings = [
+        timings.get(i, {"test_case_id": test["id"], "status": "not_run", "duration_ms": None})
+        for i, test in enumerate(payload["tests"])
+    ]
+
+    return {
+        "stats": {
+            "type": "test_stats",
+            "total_tests": total,
+            "success": success,
+            "fail": total - success,
+            "not_run": total - result.testsRun,
+            "passed_test_case_ids": passed_test_case_ids,
+            "test_case_timings": test_case_timings
+        },
+        "results": {
+            "type": "test_result",
+            "status": "passed" if result.wasSuccessful() and result.testsRun == total else "failed",
+            "content": stream.getvalue()
+        }
+    }
+
+
+def run_and_publish(payload_json: str, namespace: Dict[str, Any]):
+    check_integrity()
+    result = run_tests(json.loads(payload_json), namespace)
+    stats = result["stats"]
+    data = {
+        RESULT_MIME_TYPE: result,
+        "text/plain": f"{stats['success']}/{stats['total_tests']} tests passed",
+    }
+    if _publisher is not None:
+        _publisher(data)
+    else:
+        from IPython.display import publish_display_data
+        publish_display_data(data)
+
+
+def guard_display_publisher(display_pub):
+    """Check integrity before the kernel publishes a test result, whoever publishes it (called by PRELOAD_CODE)"""
+    # Re-preloading after a namespace reset wraps the original publish again, not the previous guard
+    publish = getattr(display_pub, "_unguarded_publish", display_pub.publish)
+
+    def guarded_publish(*args, **kwargs):
+        data = kwargs.get("data", args[0] if args else None)
+        if isinstance(data, dict) and RESULT_MIME_TYPE in data:
+            check_integrity()
+        return publish(*args, **kwargs)
+
+    display_pub._unguarded_publish = publish
+    display_pub.publish = guarded_publish
+
+
+def build_test_cell(payload: Dict[str, Any]) -> str:
+    """Cell that runs a payload in the kernel; the payload travels as one string literal, so no quoting can break it"""
+    return f"__import__('test_harness').run_and_publish({json.dumps(payload)!r}, globals())"
+
+
+
+def _snapshot(cls) -> Dict[str, Any]:
+    # Functions are compared by code object too, since their __code__ can be swapped in place
+    return {name: (value, getattr(value, "__code__", None)) for name, value in vars(cls).items()}
+
+
+def _functions(module_globals: Dict[str, Any]) -> Dict[str, Any]:
+    return {name: (value, value.__code__) for name, value in module_globals.items()
+            if isinstance(value, types.FunctionType) and value.__module__ == __name__}
+
+
+def _same(current: Dict[str, Any], preloaded: Dict[str, Any]) -> bool:
+    # By identity: a replacement object could claim to be equal
+    return current.keys() == preloaded.keys() and all(
+        value is preloaded[name][0] and code is preloaded[name][1] for name, (value, code) in current.items()
+    )
+
+
+def integrity_problems() -> List[str]:
+    """What changed in the harness or unittest since the harness was preloaded; empty if nothing did"""
+    problems = []
+    if sys.modules.get(__name__) is not _self:
+        problems.append(f"sys.modules[{__name__!r}] was replaced")
+    if sys.modules.get("unittest") is not _unittest:
+        problems.append("sys.modules['unittest'] was replaced")
+    for name, cls in _unittest_classes.items():
+        if getattr(_unittest, name, None) is not cls:
+            problems.append(f"unittest.{name} was replaced")
+        elif not _same(_snapshot(cls), _unittest_snapshots[name]):
+            problems.append(f"unittest.{name} was modified")
+    if not _same(_functions(vars(_self)), _harness_functions):
+        problems.append("the test harness was modified")
+    return problems
+
+
+def check_integrity():
+    problems = integrity_problems()
+    if problems:
+        raise HarnessIntegrityError("Test results cannot be trusted: " + "; ".join(problems))
+
+
+# Taken last, once every function of the harness exists
+_self = sys.modules[__name__]
+_unittest_classes = {name: getattr(unittest, name) for name in _CHECKED_UNITTEST_CLASSES}
+_unittest_snapshots = {name: _snapshot(cls) for name, cls in _unittest_classes.items()}
+_harness_functions = _functions(globals())
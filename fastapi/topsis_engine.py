@@ -0,0 +1,374 @@
+"""Vectorized TOPSIS for a whole cohort.
+
+Every (student, material) pair is a group of question rows. Groups are packed into
+one zero-padded array of shape (groups, max_questions, criteria) with a validity
+mask, and normalization, ideal solutions, separations and closeness are computed
+for all groups at once. Results match calculate_topsis_by_material in main.py.
+
+calculate_topsis_cohort is the cohort-level variant: column norms and ideal
+solutions are computed once per material over every student's rows, and each
+student is scored against those shared references so scores are comparable.
+"""
+from typing import List, Dict, Any
+
+import numpy as np
+
+# Row layout used by classify_students:
+# compile_count, coding_time, completion_status, trial_status, variable_count, function_count, test_case_completion_rate
+BENEFIT_COLUMNS = [2, 3, 4, 5, 6]
+COST_COLUMNS = [0, 1]
+BENEFIT_NAMES = ["completion_status", "trial_status", "variable_count", "function_count", "test_case_completion_rate"]
+COST_NAMES = ["compile_count", "coding_time"]
+
+# Fixed amount subtracted from a lone question row to build the second TOPSIS alternative.
+# It is the mean of the uniform(0.01, 0.05) draw used before, so scores stay on the same
+# scale while becoming reproducible.
+SINGLE_ROW_VARIATION = 0.03
+
+# Lower bounds of the Bloom's Taxonomy levels, in increasing order
+LEVEL_THRESHOLDS = [0.25, 0.40, 0.55, 0.70, 0.85]
+LEVELS = ["Remember", "Understand", "Apply", "Analyze", "Evaluate", "Create"]
+
+
+class TopsisBatchResult:
+    """Per-group scores and levels plus the intermediate arrays needed to explain them"""
+
+    def __init__(self, values, mask, single_row, col_sums, weights, weighted,
+                 ideal_best, ideal_worst, separation_best, separation_worst, performance, scores):
+        self.values = values
+        self.mask = mask
+        self.single_row = single_row
+        self.col_sums = col_sums
+        self.weights = weights
+        self.weighted = weighted
+        self.ideal_best = ideal_best
+        self.ideal_worst = ideal_worst
+        self.separation_best = separation_best
+        self.separation_worst = separation_worst
+        self.performance = performance
+        self.scores = scores
+        self.levels = scores_to_levels(scores)
+
+    def __len__(self):
+        return len(self.scores)
+
+
+def scores_to_levels(scores) -> List[str]:
+    indices = np.searchsorted(LEVEL_THRESHOLDS, np.asarray(scores, dtype=float), side='right')
+    return [LEVELS[i] for i in indices]
+
+
+def pack_groups(groups: List[List[List[float]]], num_criteria: int = 7):
+    """Pack ragged decision matrices into a zero-padded (G, Q, C) array and a (G, Q) mask.
+
+    Also returns the row offset of each group in the flattened (unpadded) row order.
+    """
+    sizes = np.array([len(group) for group in groups], dtype=int)
+    max_rows = max(2, int(sizes.max()) if len(sizes) else 0)
+    values = np.zeros((len(groups), max_rows, num_criteria))
+    mask = np.arange(max_rows)[None, :] < sizes[:, None]
+    if len(groups):
+        flat = np.array([row for group in groups for row in group], dtype=float).reshape(-1, num_criteria)
+        values[mask] = flat
+    offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]]) if len(sizes) else np.zeros(0, dtype=int)
+    return values, mask, offsets
+
+
+def calculate_topsis_batch(groups: List[List[List[float]]]) -> TopsisBatchResult:
+    """Score many TOPSIS groups in a few vectorized passes.
+
+    groups[g] is the decision matrix of group g (one row per question). Empty groups
+    score 0.0. Single-question groups get a second copy of their row lowered by
+    SINGLE_ROW_VARIATION so the ideal solutions are defined, exactly like the
+    per-material implementation. The result is fully deterministic.
+    """
+    values, mask, _ = pack_groups(groups)
+    sizes = mask.sum(axis=1)
+
+    # Handle single row case: duplicate the row with a small fixed downward variation
+    single_row = sizes == 1
+    if single_row.any():
+        values[single_row, 1, :] = np.maximum(0, values[single_row, 0, :] - SINGLE_ROW_VARIATION)
+        mask = mask.copy()
+        mask[single_row, 1] = True
+
+    # Normalization step (square root of the sum of squares per column, padding rows are zero)
+    col_sums = np.sqrt(np.sum(values ** 2, axis=1))
+    col_sums[col_sums == 0] = 1
+    normalized = values / col_sums[:, None, :]
+
+    # Equal weights for all criteria
+    num_criteria = values.shape[2]
+    weights = np.ones(num_criteria) / num_criteria
+    weighted = normalized * weights
+
+    # Ideal solutions over the valid rows of each group
+    valid = mask[:, :, None]
+    column_max = np.where(valid, weighted, -np.inf).max(axis=1)
+    column_min = np.where(valid, weighted, np.inf).min(axis=1)
+    ideal_best = np.zeros((len(groups), num_criteria))
+    ideal_worst = np.zeros((len(groups), num_criteria))
+    ideal_best[:, BENEFIT_COLUMNS] = column_max[:, BENEFIT_COLUMNS]
+    ideal_worst[:, BENEFIT_COLUMNS] = column_min[:, BENEFIT_COLUMNS]
+    ideal_best[:, COST_COLUMNS] = column_min[:, COST_COLUMNS]
+    ideal_worst[:, COST_COLUMNS] = column_max[:, COST_COLUMNS]
+    # Groups without any rows have infinite extremes; they are scored 0 below
+    ideal_best[~np.isfinite(ideal_best)] = 0
+    ideal_worst[~np.isfinite(ideal_worst)] = 0
+
+    # Separation measures and relative closeness
+    separation_best = np.sqrt(np.sum((weighted - ideal_best[:, None, :]) ** 2, axis=2))
+    separation_worst = np.sqrt(np.sum((weighted - ideal_worst[:, None, :]) ** 2, axis=2))
+    total = separation_best + separation_worst
+    performance = np.zeros_like(total)
+    non_zero = (total > 0) & mask
+    performance[non_zero] = separation_worst[non_zero] / total[non_zero]
+
+    # Mean closeness over the original rows (only the original row for single row groups)
+    scoring_mask = mask.copy()
+    scoring_mask[single_row, 1] = False
+    counts = scoring_mask.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        scores = np.where(scoring_mask, performance, 0).sum(axis=1) / counts
+    scores[~np.isfinite(scores)] = 0.0
+
+    return TopsisBatchResult(values, mask, single_row, col_sums, weights, weighted,
+                             ideal_best, ideal_worst, separation_best, separation_worst, performance, scores)
+
+
+class TopsisCohortResult:
+    """Per-group scores plus the shared per-material references and per-row measures"""
+
+    def __init__(self, rows, row_group, row_material, material_keys, material_rows, col_sums, weights,
+                 ideal_best, ideal_worst, separation_best, separation_worst, performance, scores, group_material):
+        self.rows = rows
+        self.row_group = row_group
+        self.row_material = row_material
+        self.material_keys = material_keys
+        self.material_rows = material_rows
+        self.col_sums = col_sums
+        self.weights = weights
+        self.ideal_best = ideal_best
+        self.ideal_worst = ideal_worst
+        self.separation_best = separation_best
+        self.separation_worst = separation_worst
+        self.performance = performance
+        self.scores = scores
+        self.group_material = group_material
+        self.levels = scores_to_levels(scores)
+
+    def __len__(self):
+        return len(self.scores)
+
+
+def calculate_topsis_cohort(groups: List[List[List[float]]], material_keys: List[Any],
+                            num_criteria: int = 7) -> TopsisCohortResult:
+    """Score every group against ideal solutions shared by all groups of the same material.
+
+    groups[g] is the decision matrix of group g and material_keys[g] the material it
+    belongs to. All rows are stacked once; column norms, ideal best and ideal worst are
+    reduced per material in a single pass, then every row's closeness is computed against
+    its material's references and averaged per group. Work is O(total rows).
+
+    A material answered by a single question row cohort-wide has no spread, so a copy
+    lowered by SINGLE_ROW_VARIATION joins its references, like the per-material engine.
+    """
+    sizes = np.array([len(group) for group in groups], dtype=int)
+    keys, group_material = np.unique(np.array([str(key) for key in material_keys]), return_inverse=True) \
+        if len(groups) else (np.array([]), np.zeros(0, dtype=int))
+    num_materials = len(keys)
+
+    rows = np.array([row for group in groups for row in group], dtype=float).reshape(-1, num_criteria)
+    row_group = np.repeat(np.arange(len(groups)), sizes)
+    row_material = group_material[row_group]
+    material_rows = np.bincount(row_material, minlength=num_materials)
+
+    # References include the lowered copy for materials with a single row cohort-wide
+    lone = material_rows[row_material] == 1
+    reference_rows = np.vstack([rows, np.maximum(0, rows[lone] - SINGLE_ROW_VARIATION)])
+    reference_material = np.concatenate([row_material, row_material[lone]])
+
+    # Column norms per material (square root of the sum of squares over the cohort)
+    squares = np.zeros((num_materials, num_criteria))
+    np.add.at(squares, reference_material, reference_rows ** 2)
+    col_sums = np.sqrt(squares)
+    col_sums[col_sums == 0] = 1
+
+    # Equal weights for all criteria
+    weights = np.ones(num_criteria) / num_criteria
+    reference_weighted = reference_rows / col_sums[reference_material] * weights
+    weighted = reference_weighted[:len(rows)]
+
+    # Shared ideal solutions per material
+    column_max = np.full((num_materials, num_criteria), -np.inf)
+    column_min = np.full((num_materials, num_criteria), np.inf)
+    np.maximum.at(column_max, reference_material, reference_weighted)
+    np.minimum.at(column_min, reference_material, reference_weighted)
+    ideal_best = np.zeros((num_materials, num_criteria))
+    ideal_worst = np.zeros((num_materials, num_criteria))
+    ideal_best[:, BENEFIT_COLUMNS] = column_max[:, BENEFIT_COLUMNS]
+    ideal_worst[:, BENEFIT_COLUMNS] = column_min[:, BENEFIT_COLUMNS]
+    ideal_best[:, COST_COLUMNS] = column_min[:, COST_COLUMNS]
+    ideal_worst[:, COST_COLUMNS] = column_max[:, COST_COLUMNS]
+
+    # Separation measures and relative closeness of every row
+    separation_best = np.sqrt(np.sum((weighted - ideal_best[row_material]) ** 2, axis=1))
+    separation_worst = np.sqrt(np.sum((weighted - ideal_worst[row_material]) ** 2, axis=1))
+    total = separation_best + separation_worst
+    performance = np.zeros_like(total)
+    non_zero = total > 0
+    performance[non_zero] = separation_worst[non_zero] / total[non_zero]
+
+    # Mean closeness per group
+    with np.errstate(invalid='ignore', divide='ignore'):
+        scores = np.bincount(row_group, weights=performance, minlength=len(groups)) / sizes
+    scores[~np.isfinite(scores)] = 0.0
+
+    return TopsisCohortResult(rows, row_group, row_material, keys, material_rows, col_sums, weights,
+                              ideal_best, ideal_worst, separation_best, separation_worst, performance,
+                              scores, group_material)
+
+
+def cohort_calculation_details(result: TopsisCohortResult, g: int) -> Dict[str, Any]:
+    """Step-by-step calculation_details of one group scored in cohort mode"""
+    rows = result.row_group == g
+    if not rows.any():
+        return {}
+
+    m = result.group_material[g]
+    score = float(result.scores[g])
+    return {
+        "criteria": {
+            "benefits": BENEFIT_NAMES,
+            "costs": COST_NAMES
+        },
+        "decision_matrix": result.rows[rows].tolist(),
+        "steps": [
+            {
+                "name": "Cohort References",
+                "description": "Column sums and ideal solutions computed once per material over all students",
+                "cohort_rows": int(result.material_rows[m]),
+                "column_sums": result.col_sums[m].tolist(),
+                "weights": result.weights.tolist(),
+                "ideal_best": result.ideal_best[m].tolist(),
+                "ideal_worst": result.ideal_worst[m].tolist()
+            },
+            {
+                "name": "Calculate Separation Measures",
+                "description": "Euclidean distance from each of the student's rows to the shared ideal solutions",
+                "separation_best": result.separation_best[rows].tolist(),
+                "separation_worst": result.separation_worst[rows].tolist()
+            },
+            {
+                "name": "Calculate Performance Score",
+                "description": "Relative closeness to the ideal solution: S- / (S+ + S-)",
+                "performance_scores": result.performance[rows].tolist()
+            },
+            {
+                "name": "Calculate Average Performance",
+                "description": "Mean of the student's performance scores",
+                "final_score": score
+            },
+            {
+                "name": "Map to Bloom's Taxonomy",
+                "description": "Mapping performance score to cognitive level",
+                "final_level": result.levels[g],
+                "final_score": score
+            }
+        ]
+    }
+
+
+def topsis_calculation_details(result: TopsisBatchResult, g: int) -> Dict[str, Any]:
+    """Rebuild the step-by-step calculation_details dict of one group"""
+    if not result.mask[g].any():
+        return {}
+
+    rows = result.mask[g]
+    original_rows = rows.copy()
+    if result.single_row[g]:
+        original_rows[1] = False
+    score = float(result.scores[g])
+    level = result.levels[g]
+
+    details = {
+        "criteria": {
+            "benefits": BENEFIT_NAMES,
+            "costs": COST_NAMES
+        },
+        "decision_matrix": result.values[g][original_rows].tolist(),
+        "steps": []
+    }
+    steps = details["steps"]
+
+    if result.single_row[g]:
+        steps.append({
+            "name": "Handle Single Row Case",
+            "description": f"Duplicated the single row lowered by a fixed {SINGLE_ROW_VARIATION} to enable TOPSIS calculation",
+            "duplicated_matrix": result.values[g][rows].tolist()
+        })
+
+    steps.append({
+        "name": "Calculate Column Sums",
+        "description": "Square root of sum of squares for each column",
+        "column_sums": result.col_sums[g].tolist()
+    })
+    steps.append({
+        "name": "Normalize Decision Matrix",
+        "description": "Divide each value by its column sum",
+        "normalized_matrix": (result.values[g][rows] / result.col_sums[g]).tolist()
+    })
+    steps.append({
+        "name": "Define Weights",
+        "description": "Equal weights for all criteria",
+        "weights": result.weights.tolist()
+    })
+    steps.append({
+        "name": "Apply Weights",
+        "description": "Multiply normalized matrix by weights",
+        "weighted_matrix": result.weighted[g][rows].tolist()
+    })
+    steps.append({
+        "name": "Determine Ideal Solutions",
+        "description": "Best values (max for benefits, min for costs) and worst values (min for benefits, max for costs)",
+        "ideal_best": result.ideal_best[g].tolist(),
+        "ideal_worst": result.ideal_worst[g].tolist()
+    })
+    steps.append({
+        "name": "Calculate Separation Measures",
+        "description": "Euclidean distance from each alternative to ideal best and ideal worst solutions",
+        "separation_best": result.separation_best[g][rows].tolist(),
+        "separation_worst": result.separation_worst[g][rows].tolist()
+    })
+    steps.append({
+        "name": "Calculate Performance Score",
+        "description": "Relative closeness to the ideal solution: S- / (S+ + S-)",
+        "performance_scores": result.performance[g][rows].tolist()
+    })
+    if result.single_row[g]:
+        steps.append({
+            "name": "Single Row Handling",
+            "description": "Using only the original row's performance score",
+            "final_score": score
+        })
+    else:
+        steps.append({
+            "name": "Calculate Average Performance",
+            "description": "Mean of all performance scores",
+            "final_score": score
+        })
+    steps.append({
+        "name": "Map to Bloom's Taxonomy",
+        "description": "Mapping performance score to cognitive level",
+        "rules": {
+            "Create": "CC >= 0.85",
+            "Evaluate": "0.70 <= CC < 0.85",
+            "Analyze": "0.55 <= CC < 0.70",
+            "Apply": "0.40 <= CC < 0.55",
+            "Understand": "0.25 <= CC < 0.40",
+            "Remember": "CC < 0.25"
+        },
+        "final_level": level,
+        "final_score": score
+    })
+    return details
@@ -0,0 +1,59 @@
+"""Train the classification_type="neural" model from historical classifications.
+
+The input is an export of the student_cognitive_classifications table as a JSON array
+or JSON lines; each row needs classification_level and raw_data.question_metrics.
+The fitted scaler and MLP are written with joblib to the path the service loads at
+startup (NEURAL_MODEL_PATH, default models/neural_classifier.joblib).
+
+Usage:
+    python train_neural_classifier.py --input classifications.json
+    python train_neural_classifier.py --input classifications.jsonl --hidden 64,32 --output /srv/models/neural.joblib
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+from neural_classifier import records_to_training_data, train_model, save_model
+
+DEFAULT_MODEL_PATH = os.getenv("NEURAL_MODEL_PATH", "models/neural_classifier.joblib")
+
+
+def read_records(path):
+    with open(path) as f:
+        content = f.read().strip()
+    if content.startswith("["):
+        return json.loads(content)
+    return [json.loads(line) for line in content.splitlines() if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", required=True, help="JSON or JSON lines export of past classifications")
+    parser.add_argument("--output", default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--hidden", default="32,16", help="Comma separated hidden layer sizes")
+    parser.add_argument("--max-iter", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    records = read_records(args.input)
+    features, labels = records_to_training_data(records)
+    if len(labels) == 0:
+        print(f"No usable rows in {args.input} (need classification_level and raw_data.question_metrics)")
+        sys.exit(1)
+    classes, counts = np.unique(labels, return_counts=True)
+    print(f"training on {len(labels)} of {len(records)} rows: " +
+          ", ".join(f"{label}={count}" for label, count in zip(classes, counts)))
+
+    hidden_layers = tuple(int(size) for size in args.hidden.split(",") if size)
+    model = train_model(features, labels, hidden_layers=hidden_layers, max_iter=args.max_iter, random_state=args.seed)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    save_model(model, args.output)
+    print(f"training accuracy {model.metadata['training_accuracy']:.3f}, saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()